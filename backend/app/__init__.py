@@ -1,3 +1,9 @@
+import time
+
+# Measured from the first import of the package so cold-start time covers
+# the framework imports as well as create_app()
+_BOOT_STARTED = time.perf_counter()
+
 import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -21,7 +27,23 @@ jwt = JWTManager()
 BROKER_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 
 # Celery instance with Redis as both broker and backend
-celery = Celery(__name__, broker=BROKER_URL, backend=BROKER_URL)
+celery = Celery(__name__, broker=BROKER_URL, backend=BROKER_URL, include=['app.tasks'])
+
+celery.conf.update(
+    # Ingest jobs are long; don't let a worker hoard queued jobs it can't
+    # start yet, otherwise the scheduler's fairness is lost
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_default_queue='ingest-fast',
+    broker_transport_options={
+        'priority_steps': list(range(10)),
+        'queue_order_strategy': 'priority'
+    },
+    task_always_eager=os.getenv('CELERY_TASK_ALWAYS_EAGER', 'false').lower() == 'true',
+    # Recycle children so large pandas jobs don't leave workers bloated
+    worker_max_tasks_per_child=int(os.getenv('CELERY_MAX_TASKS_PER_CHILD', 50)),
+    worker_max_memory_per_child=int(os.getenv('CELERY_MAX_MEMORY_PER_CHILD_KB', 1500000))
+)
 
 
 def init_celery(app: Flask):
@@ -48,6 +70,9 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-flask-secret-key')
     app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_FILE_SIZE', 104857600))  # 100MB
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
+    app.config['PROFILE_FOLDER'] = os.getenv('PROFILE_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'profiles'))
+    app.config['SCORE_CACHE_FOLDER'] = os.getenv('SCORE_CACHE_FOLDER', os.path.join(app.config['UPLOAD_FOLDER'], 'scores'))
+    app.config['COLD_START_TARGET_MS'] = int(os.getenv('COLD_START_TARGET_MS', 1500))
     
     # Logging configuration
     log_level = os.getenv('LOG_LEVEL', 'INFO')
@@ -57,6 +82,12 @@ def create_app():
     db.init_app(app)
     jwt.init_app(app)
     
+    # Every protected request resolves its user through a cached lookup, so
+    # deactivated or deleted users are rejected without a query per request
+    from app.services.identity import load_jwt_user, install_invalidation_listeners
+    jwt.user_lookup_loader(load_jwt_user)
+    install_invalidation_listeners()
+    
     # Configure CORS
     CORS(app, origins=[os.getenv('FRONTEND_URL', 'http://localhost:3000')])
     
@@ -72,15 +103,23 @@ def create_app():
         doc='/docs/',
         prefix='/api'
     )
+    
+    # orjson encodes API payloads (hot list endpoints hand it raw row values)
+    from app.services.serialization import output_json
+    api.representation('application/json')(output_json)
 
     # ---- JWT Error Handling ----
     # Ensure authentication errors propagate as 401 instead of generic 500
-    from flask_jwt_extended.exceptions import NoAuthorizationError, JWTExtendedException
+    from flask_jwt_extended.exceptions import NoAuthorizationError, JWTExtendedException, UserLookupError
 
     @api.errorhandler(NoAuthorizationError)  # Missing token / auth header
     def handle_no_auth(err):
         return {'message': str(err) or 'Authorization token is missing'}, 401
 
+    @api.errorhandler(UserLookupError)  # Token of a deactivated or deleted user
+    def handle_user_lookup_error(err):
+        return {'message': 'Account is deactivated or no longer exists'}, 401
+
     @api.errorhandler(JWTExtendedException)  # Any other JWT-related error (including expired, invalid)
     def handle_jwt_error(err):
         # err.message may differ; use generic for security
@@ -97,7 +136,8 @@ def create_app():
     def handle_pyjwt_invalid(err):
         return {'message': 'Invalid authentication token'}, 401
     
-    # Import and register routes
+    # Import and register routes. Route modules must not import the parsing
+    # or ML stack (pandas, scikit-learn); that only loads in Celery workers.
     from app.routes.auth import auth_ns
     from app.routes.logs import logs_ns
     from app.routes.anomalies import anomalies_ns
@@ -109,27 +149,36 @@ def create_app():
     # Tie Celery to this Flask app context (only once per process)
     init_celery(app)
 
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-        
-        # Create default admin user if it doesn't exist
-        from app.models import User
-        admin_user = User.query.filter_by(email='admin@logsight.com').first()
-        if not admin_user:
-            admin_user = User(
-                email='admin@logsight.com',
-                username='admin'
-            )
-            admin_user.set_password('admin123')
-            db.session.add(admin_user)
-            db.session.commit()
-            app.logger.info('Created default admin user: admin@logsight.com / admin123')
+    # Schema setup and seeding run once per deployment via `flask bootstrap`
+    from app.commands import register_commands
+    register_commands(app)
+
+    # Prometheus /metrics plus per-request latency and SQL accounting
+    from app.services.metrics import init_metrics
+    init_metrics(app)
+
+    # gzip/Brotli for JSON responses, negotiated per request
+    from app.services.compression import init_compression
+    init_compression(app)
     
     @app.route('/health')
     def health_check():
         """Health check endpoint"""
-        return {'status': 'healthy', 'version': '1.0.0'}
+        return {
+            'status': 'healthy',
+            'version': '1.0.0',
+            'cold_start_ms': app.config['COLD_START_MS']
+        }
+    
+    # Cold-start budget: workers are recycled regularly, so startup must stay cheap
+    cold_start_ms = round((time.perf_counter() - _BOOT_STARTED) * 1000, 1)
+    app.config['COLD_START_MS'] = cold_start_ms
+    if cold_start_ms > app.config['COLD_START_TARGET_MS']:
+        app.logger.warning(
+            f"Cold start took {cold_start_ms} ms (target {app.config['COLD_START_TARGET_MS']} ms)"
+        )
+    else:
+        app.logger.info(f'Cold start took {cold_start_ms} ms')
     
     return app
 
@@ -0,0 +1,159 @@
+import os
+import click
+from flask import Flask
+
+from app import db
+
+# Entry columns interned into dimension tables (see services.dimensions)
+DIMENSION_TABLES = {
+    'dest_host': 'dest_hosts',
+    'method': 'http_methods',
+    'user_agent': 'user_agents',
+    'referer': 'referers'
+}
+
+# Rows per transaction when moving legacy entry strings into dimension tables
+BACKFILL_BATCH_ROWS = int(os.getenv('BACKFILL_BATCH_ROWS', 50000))
+
+
+def _legacy_dimension_columns():
+    """Dimension string columns still present on log_entries from older versions"""
+    rows = db.session.execute(db.text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_name = 'log_entries' AND column_name = ANY(:columns)"
+    ), {'columns': list(DIMENSION_TABLES)}).scalars()
+    return [column for column in DIMENSION_TABLES if column in set(rows)]
+
+
+def _pending_backfill(column: str):
+    """Id range of entries whose legacy string has no dimension id yet"""
+    return db.session.execute(db.text(
+        f"SELECT min(id), max(id), count(*) FROM log_entries "
+        f"WHERE {column} IS NOT NULL AND {column}_id IS NULL"
+    )).one()
+
+
+def backfill_dimension_column(column: str, batch_rows: int = BACKFILL_BATCH_ROWS) -> int:
+    """Intern a legacy entry column into its dimension table, one id range per transaction
+
+    The string column is left in place (see ``drop-legacy-entry-columns``),
+    so an interrupted backfill resumes where it stopped. Returns the
+    number of entries updated.
+    """
+    table = DIMENSION_TABLES[column]
+    # The ORM no longer writes the legacy column
+    db.session.execute(db.text(f'ALTER TABLE log_entries ALTER COLUMN {column} DROP NOT NULL'))
+    db.session.commit()
+
+    first_id, last_id, _ = _pending_backfill(column)
+    if first_id is None:
+        return 0
+
+    updated = 0
+    for start in range(first_id, last_id + 1, batch_rows):
+        bounds = {'start': start, 'end': start + batch_rows}
+        db.session.execute(db.text(
+            f"INSERT INTO {table} (value, digest) "
+            f"SELECT DISTINCT {column}, sha256(convert_to({column}, 'UTF8')) FROM log_entries "
+            f"WHERE id >= :start AND id < :end AND {column} IS NOT NULL AND {column}_id IS NULL "
+            f"ON CONFLICT DO NOTHING"
+        ), bounds)
+        updated += db.session.execute(db.text(
+            f"UPDATE log_entries SET {column}_id = {table}.id FROM {table} "
+            f"WHERE log_entries.id >= :start AND log_entries.id < :end "
+            f"AND log_entries.{column} IS NOT NULL AND log_entries.{column}_id IS NULL "
+            f"AND {table}.digest = sha256(convert_to(log_entries.{column}, 'UTF8'))"
+        ), bounds).rowcount
+        db.session.commit()
+    return updated
+
+
+# Idempotent column additions for databases created by older versions
+SCHEMA_UPGRADES = [
+    'ALTER TABLE log_files ADD COLUMN IF NOT EXISTS profile JSONB',
+    'ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS repeat_count INTEGER NOT NULL DEFAULT 1',
+    'ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS last_timestamp TIMESTAMP',
+    'ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS raw_offset BIGINT',
+    'ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS raw_length INTEGER',
+    'ALTER TABLE log_entries ALTER COLUMN raw_log DROP NOT NULL',
+    'ALTER TABLE log_files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)',
+    'ALTER TABLE log_files ADD COLUMN IF NOT EXISTS pipeline_key VARCHAR(100)',
+    'CREATE INDEX IF NOT EXISTS ix_log_files_content_hash ON log_files (content_hash)'
+] + [
+    f'ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS {column}_id INTEGER REFERENCES {table} (id)'
+    for column, table in DIMENSION_TABLES.items()
+] + [
+    'CREATE INDEX IF NOT EXISTS ix_log_entries_dest_host_id ON log_entries (dest_host_id)',
+    'CREATE INDEX IF NOT EXISTS ix_log_entries_method_id ON log_entries (method_id)'
+]
+
+
+def register_commands(app: Flask):
+    """Register one-off management commands on the Flask CLI"""
+
+    @app.cli.command('bootstrap')
+    def bootstrap():
+        """Create database tables and seed the default admin user"""
+        from app.models import User
+
+        db.create_all()
+
+        # create_all only adds missing tables; add columns introduced since
+        for statement in SCHEMA_UPGRADES:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+
+        for column in _legacy_dimension_columns():
+            updated = backfill_dimension_column(column)
+            click.echo(f'Interned {updated} legacy {column} values')
+        click.echo('Database tables ready')
+
+        # Create default admin user if it doesn't exist
+        admin_email = os.getenv('ADMIN_EMAIL', 'admin@logsight.com')
+        admin_user = User.query.filter_by(email=admin_email).first()
+        if not admin_user:
+            admin_user = User(
+                email=admin_email,
+                username='admin'
+            )
+            admin_user.set_password(os.getenv('ADMIN_PASSWORD', 'admin123'))
+            db.session.add(admin_user)
+            db.session.commit()
+            click.echo(f'Created default admin user: {admin_email}')
+
+    @app.cli.command('deactivate-user')
+    @click.argument('email')
+    @click.option('--reactivate', is_flag=True, help='Re-enable the account instead')
+    def deactivate_user(email, reactivate):
+        """Disable (or re-enable) an account; its tokens stop working right away"""
+        from app.models import User
+
+        user = User.query.filter_by(email=email.strip().lower()).first()
+        if not user:
+            raise click.ClickException(f'No user with email {email}')
+
+        # Committing through the ORM also drops the cached identity
+        user.is_active = reactivate
+        db.session.commit()
+        click.echo(f"{'Reactivated' if reactivate else 'Deactivated'} {user.email}")
+
+    @app.cli.command('drop-legacy-entry-columns')
+    @click.confirmation_option(prompt='Drop the legacy string columns of log_entries?')
+    def drop_legacy_entry_columns():
+        """Drop entry string columns replaced by dimension ids once every row is backfilled"""
+        columns = _legacy_dimension_columns()
+        if not columns:
+            click.echo('No legacy entry columns left')
+            return
+
+        for column in columns:
+            _, _, pending = _pending_backfill(column)
+            if pending:
+                raise click.ClickException(
+                    f'{pending} entries still have a {column} without {column}_id; run bootstrap first'
+                )
+
+        for column in columns:
+            db.session.execute(db.text(f'ALTER TABLE log_entries DROP COLUMN {column}'))
+        db.session.commit()
+        click.echo(f"Dropped {', '.join(columns)}")
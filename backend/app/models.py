@@ -55,7 +55,7 @@ class LogFile(db.Model):
     content_type = db.Column(db.String(100))
     
     # Processing status
-    status = db.Column(db.String(50), default='uploaded')  # uploaded, processing, ready, error
+    status = db.Column(db.String(50), default='uploaded')  # uploaded, processing, preview, ready, error
     processing_progress = db.Column(db.Integer, default=0)  # 0-100
     error_message = db.Column(db.Text)
     
@@ -66,6 +66,11 @@ class LogFile(db.Model):
     date_range_end = db.Column(db.DateTime)
     summary = db.Column(JSONB)  # JSON summary of analysis
     
+    # Reuse of processed results for identical uploads (see services.dedup)
+    content_hash = db.Column(db.String(64), index=True)  # sha256 of the uploaded bytes
+    pipeline_key = db.Column(db.String(100))  # detector version and options the stored results came from
+    profile = db.deferred(db.Column(JSONB))  # Per-stage timings of the latest job per task
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
@@ -73,6 +78,7 @@ class LogFile(db.Model):
     # Relationships
     log_entries = db.relationship('LogEntry', backref='log_file', lazy=True, cascade='all, delete-orphan')
     anomalies = db.relationship('Anomaly', backref='log_file', lazy=True, cascade='all, delete-orphan')
+    rollups = db.relationship('LogRollup', backref='log_file', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self, include_summary=True):
         """Convert log file to dictionary"""
@@ -108,43 +114,85 @@ class LogEntry(db.Model):
     # Common fields across log formats
     timestamp = db.Column(db.DateTime, nullable=False, index=True)
     src_ip = db.Column(INET, index=True)
-    dest_host = db.Column(db.String(255), index=True)
-    method = db.Column(db.String(10), index=True)
     url = db.Column(db.Text)
     status_code = db.Column(db.SmallInteger, index=True)
     response_size = db.Column(db.BigInteger)
-    user_agent = db.Column(db.Text)
-    referer = db.Column(db.Text)
     
-    # Raw log data and parsed fields
-    raw_log = db.Column(db.Text, nullable=False)
+    # High-repetition strings are interned in dimension tables (see
+    # services.dimensions); entries keep their ids
+    dest_host_id = db.Column(db.Integer, db.ForeignKey('dest_hosts.id'), index=True)
+    method_id = db.Column(db.Integer, db.ForeignKey('http_methods.id'), index=True)
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agents.id'))
+    referer_id = db.Column(db.Integer, db.ForeignKey('referers.id'))
+    
+    # Raw log data and parsed fields; with RAW_LOG_STORAGE=offsets the line
+    # is read from the log's block store instead (see services.raw_store)
+    raw_log = db.Column(db.Text)
+    raw_offset = db.Column(db.BigInteger)
+    raw_length = db.Column(db.Integer)
     parsed_fields = db.Column(JSONB)  # Additional parsed fields specific to log format
     
     # Processing metadata
     line_number = db.Column(db.Integer, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Duplicate lines collapsed into this entry at ingest (see services.collapse);
+    # timestamp is the first occurrence and last_timestamp the last one
+    repeat_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    last_timestamp = db.Column(db.DateTime)
+    
     # Relationships
     anomalies = db.relationship('Anomaly', backref='log_entry', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convert log entry to dictionary"""
-        return {
+    def resolve_values(self, include_raw=True):
+        """Dimension values (and the raw line) of this entry alone
+        
+        List serializers resolve these in bulk instead, see
+        ``services.serialization.resolve_entry_values``.
+        """
+        from app.services.dimensions import DIMENSION_MODELS, lookup_value
+        
+        resolved = {name: lookup_value(name, getattr(self, f'{name}_id')) for name in DIMENSION_MODELS}
+        if include_raw:
+            resolved['raw_log'] = self.raw_log
+            if self.raw_log is None and self.raw_offset is not None:
+                from app.services.raw_store import read_raw_lines
+                resolved['raw_log'] = read_raw_lines(self.log_id, [(self.raw_offset, self.raw_length)])[0]
+        return resolved
+    
+    def to_dict(self, include_raw=True, include_parsed=True, anomalies=None, resolved=None):
+        """Convert log entry to dictionary
+        
+        Heavy columns can be left out (and deferred in the query) with
+        include_raw/include_parsed; pass pre-serialized ``anomalies`` and
+        ``resolved`` values to avoid per-entry lookups.
+        """
+        if resolved is None:
+            resolved = self.resolve_values(include_raw)
+        
+        result = {
             'id': self.id,
             'timestamp': self.timestamp.isoformat(),
             'src_ip': str(self.src_ip) if self.src_ip else None,
-            'dest_host': self.dest_host,
-            'method': self.method,
+            'dest_host': resolved['dest_host'],
+            'method': resolved['method'],
             'url': self.url,
             'status_code': self.status_code,
             'response_size': self.response_size,
-            'user_agent': self.user_agent,
-            'referer': self.referer,
-            'raw_log': self.raw_log,
-            'parsed_fields': self.parsed_fields,
+            'user_agent': resolved['user_agent'],
+            'referer': resolved['referer'],
             'line_number': self.line_number,
-            'anomalies': [anomaly.to_dict() for anomaly in self.anomalies]
+            'repeat_count': self.repeat_count,
+            'last_timestamp': self.last_timestamp.isoformat() if self.last_timestamp else None,
+            'anomalies': anomalies if anomalies is not None else [anomaly.to_dict() for anomaly in self.anomalies]
         }
+        
+        if include_raw:
+            result['raw_log'] = resolved['raw_log']
+        if include_parsed:
+            result['parsed_fields'] = self.parsed_fields
+        
+        return result
 
 
 class Anomaly(db.Model):
@@ -191,6 +239,62 @@ class Anomaly(db.Model):
         }
 
 
+class LogRollup(db.Model):
+    """Per-minute traffic rollups maintained at ingest time"""
+    __tablename__ = 'log_rollups'
+    __table_args__ = (
+        db.Index('idx_log_rollups_log_dimension_bucket', 'log_id', 'dimension', 'bucket'),
+    )
+    
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    log_id = db.Column(UUID(as_uuid=True), db.ForeignKey('log_files.id'), nullable=False)
+    
+    # Rollup key: minute bucket plus one dimension value
+    bucket = db.Column(db.DateTime, nullable=False)
+    dimension = db.Column(db.String(20), nullable=False)  # total, status_class, method, host
+    value = db.Column(db.String(255), nullable=False, default='')
+    
+    # Aggregates
+    request_count = db.Column(db.BigInteger, nullable=False, default=0)
+    bytes_total = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class DestHost(db.Model):
+    """Interned destination host"""
+    __tablename__ = 'dest_hosts'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    value = db.Column(db.Text, nullable=False)
+    digest = db.Column(db.LargeBinary(32), nullable=False, unique=True)  # sha256 of value
+
+
+class HttpMethod(db.Model):
+    """Interned HTTP method"""
+    __tablename__ = 'http_methods'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    value = db.Column(db.Text, nullable=False)
+    digest = db.Column(db.LargeBinary(32), nullable=False, unique=True)
+
+
+class UserAgent(db.Model):
+    """Interned user agent string"""
+    __tablename__ = 'user_agents'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    value = db.Column(db.Text, nullable=False)
+    digest = db.Column(db.LargeBinary(32), nullable=False, unique=True)
+
+
+class Referer(db.Model):
+    """Interned referer"""
+    __tablename__ = 'referers'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    value = db.Column(db.Text, nullable=False)
+    digest = db.Column(db.LargeBinary(32), nullable=False, unique=True)
+
+
 # Database indexes for performance
 def create_indexes():
     """Create additional database indexes for performance"""
@@ -1,10 +1,18 @@
+import os
 from flask import request, current_app
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import desc
+from werkzeug.exceptions import HTTPException
 
 from app import db
 from app.models import User, LogFile, Anomaly, LogEntry
+from app.services.anomaly_stats import AnomalyStatsService
+from app.services.serialization import serialize_anomalies_with_entries, ANOMALY_COLUMNS, anomaly_rows_payload, project
+from app.services.response_cache import cached_response, mark_cacheable
+from app.services.export import ExportService, EXPORT_FORMATS, export_response
+from app.services.identity import get_owned_log
+from app.services.dimensions import decode_rows
 
 # Create namespace for anomaly operations
 anomalies_ns = Namespace('anomalies', description='Anomaly detection operations')
@@ -53,44 +61,61 @@ anomalies_response_model = anomalies_ns.model('AnomaliesResponse', {
 })
 
 
+def anomaly_filters(log_id, args):
+    """Build the anomaly filter criteria shared by the list and export endpoints"""
+    criteria = [Anomaly.log_id == log_id]
+    
+    severity = args.get('severity', None)
+    if severity:
+        criteria.append(Anomaly.severity == severity)
+    
+    anomaly_type = args.get('type', None)
+    if anomaly_type:
+        criteria.append(Anomaly.anomaly_type == anomaly_type)
+    
+    min_confidence = args.get('min_confidence', type=float)
+    if min_confidence is not None:
+        criteria.append(Anomaly.confidence >= min_confidence)
+    
+    return criteria
+
+
 @anomalies_ns.route('/<string:log_id>')
 class LogAnomaliesResource(Resource):
     @jwt_required()
-    @anomalies_ns.marshal_with(anomalies_response_model)
+    @cached_response
+    @anomalies_ns.response(200, 'Success', anomalies_response_model)
     @anomalies_ns.doc(responses={
-        200: 'Success',
         401: 'Authentication required',
         404: 'Log file not found'
     })
     def get(self, log_id):
-        """Get anomalies for a specific log file with statistics"""
+        """Get anomalies for a specific log file with statistics
+
+        Rows are read as tuples and encoded by orjson without ``marshal``;
+        the payload keeps the shape of ``AnomaliesResponse``.
+        """
         try:
             user_id = get_jwt_identity()
             
-            # Verify log file ownership
-            log_file = LogFile.query.filter_by(id=log_id, user_id=user_id).first()
-            if not log_file:
+            # Statistics come back with the log's owner and status (cached per
+            # log once detection has finished)
+            owned = AnomalyStatsService().get_owned_stats(log_id, user_id)
+            if not owned:
                 anomalies_ns.abort(404, 'Log file not found')
             
+            mark_cacheable(owned['status'])
+            
             # Get query parameters
             page = request.args.get('page', 1, type=int)
             per_page = min(request.args.get('per_page', 20, type=int), 100)
-            severity = request.args.get('severity', None)
-            anomaly_type = request.args.get('type', None)
-            min_confidence = request.args.get('min_confidence', type=float)
-            
-            # Build query for anomalies
-            query = Anomaly.query.filter_by(log_id=log_id)
+            include_raw = request.args.get('include_raw', 'true').lower() == 'true'
             
-            # Apply filters
-            if severity:
-                query = query.filter_by(severity=severity)
-            
-            if anomaly_type:
-                query = query.filter_by(anomaly_type=anomaly_type)
-            
-            if min_confidence is not None:
-                query = query.filter(Anomaly.confidence >= min_confidence)
+            # Build query for anomalies with severity/type/confidence filters,
+            # restricted to logs of the user
+            query = Anomaly.query.with_entities(*ANOMALY_COLUMNS)\
+                .join(LogFile, LogFile.id == Anomaly.log_id)\
+                .filter(LogFile.user_id == user_id, *anomaly_filters(log_id, request.args))
             
             # Order by confidence (highest first) and detection time
             query = query.order_by(desc(Anomaly.confidence), desc(Anomaly.detected_at))
@@ -102,17 +127,8 @@ class LogAnomaliesResource(Resource):
                 error_out=False
             )
             
-            # Get associated log entries
-            anomalies_with_entries = []
-            for anomaly in paginated.items:
-                log_entry = LogEntry.query.get(anomaly.entry_id)
-                anomalies_with_entries.append({
-                    'anomaly': anomaly.to_dict(),
-                    'log_entry': log_entry.to_dict() if log_entry else None
-                })
-            
-            # Calculate statistics
-            stats = self._calculate_anomaly_stats(log_id)
+            # Batch-load associated log entries and their anomalies
+            anomalies_with_entries = anomaly_rows_payload(paginated.items, include_raw)
             
             return {
                 'anomalies': anomalies_with_entries,
@@ -122,108 +138,87 @@ class LogAnomaliesResource(Resource):
                     'total': paginated.total,
                     'pages': paginated.pages
                 },
-                'stats': stats
+                'stats': project(owned['stats'], anomaly_stats_model)
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             current_app.logger.error(f'Anomalies fetch error: {str(e)}')
             anomalies_ns.abort(500, 'Internal server error')
+
+
+@anomalies_ns.route('/<string:log_id>/export')
+class LogAnomaliesExportResource(Resource):
+    # Anomaly columns plus the key fields of the flagged entry, in output order
+    EXPORT_COLUMNS = (
+        (Anomaly.id, 'id'),
+        (Anomaly.entry_id, 'entry_id'),
+        (Anomaly.anomaly_type, 'anomaly_type'),
+        (Anomaly.severity, 'severity'),
+        (Anomaly.confidence, 'confidence'),
+        (Anomaly.reason, 'reason'),
+        (Anomaly.model_used, 'model_used'),
+        (Anomaly.feature_contributions, 'feature_contributions'),
+        (Anomaly.detected_at, 'detected_at'),
+        (LogEntry.timestamp, 'entry_timestamp'),
+        (LogEntry.src_ip, 'src_ip'),
+        (LogEntry.method_id, 'method'),
+        (LogEntry.url, 'url'),
+        (LogEntry.status_code, 'status_code')
+    )
     
-    def _calculate_anomaly_stats(self, log_id):
-        """Calculate anomaly statistics for a log file"""
+    @jwt_required()
+    @anomalies_ns.doc(params={
+        'format': 'ndjson (default) or csv',
+        'gzip': 'Compress the export with gzip (default false)',
+        'severity': 'Filter by severity',
+        'type': 'Filter by anomaly type',
+        'min_confidence': 'Minimum confidence score'
+    }, responses={
+        200: 'Streamed export',
+        400: 'Invalid format',
+        401: 'Authentication required',
+        404: 'Log file not found'
+    })
+    def get(self, log_id):
+        """Stream all (filtered) anomalies of a log file as NDJSON or CSV"""
         try:
-            # Total anomalies
-            total_anomalies = Anomaly.query.filter_by(log_id=log_id).count()
-            
-            # Group by type
-            type_stats = db.session.query(
-                Anomaly.anomaly_type,
-                db.func.count(Anomaly.id).label('count')
-            ).filter_by(log_id=log_id).group_by(Anomaly.anomaly_type).all()
-            
-            by_type = {stat.anomaly_type: stat.count for stat in type_stats}
-            
-            # Group by severity
-            severity_stats = db.session.query(
-                Anomaly.severity,
-                db.func.count(Anomaly.id).label('count')
-            ).filter_by(log_id=log_id).group_by(Anomaly.severity).all()
-            
-            by_severity = {stat.severity: stat.count for stat in severity_stats}
-            
-            # Timeline data (anomalies per hour)
-            timeline_stats = db.session.query(
-                db.func.date_trunc('hour', Anomaly.detected_at).label('hour'),
-                db.func.count(Anomaly.id).label('count')
-            ).filter_by(log_id=log_id).group_by('hour').order_by('hour').all()
+            user_id = get_jwt_identity()
             
-            timeline = [
-                {
-                    'timestamp': stat.hour.isoformat(),
-                    'count': stat.count
-                }
-                for stat in timeline_stats
-            ]
+            # Verify log file ownership
+            log_file = get_owned_log(log_id, user_id)
+            if not log_file:
+                anomalies_ns.abort(404, 'Log file not found')
             
-            # Top source IPs with anomalies
-            top_ips_stats = db.session.query(
-                LogEntry.src_ip,
-                db.func.count(Anomaly.id).label('anomaly_count')
-            ).join(Anomaly, LogEntry.id == Anomaly.entry_id)\
-             .filter(Anomaly.log_id == log_id)\
-             .group_by(LogEntry.src_ip)\
-             .order_by(desc('anomaly_count'))\
-             .limit(10).all()
+            fmt = request.args.get('format', 'ndjson').lower()
+            compress = request.args.get('gzip', 'false').lower() == 'true'
             
-            top_ips = [
-                {
-                    'ip': str(stat.src_ip) if stat.src_ip else 'Unknown',
-                    'anomaly_count': stat.anomaly_count
-                }
-                for stat in top_ips_stats
-            ]
+            if fmt not in EXPORT_FORMATS:
+                anomalies_ns.abort(400, f'Unsupported format. Allowed: {", ".join(EXPORT_FORMATS)}')
             
-            # Confidence score distribution
-            confidence_ranges = [
-                (0.0, 0.2, 'Very Low'),
-                (0.2, 0.4, 'Low'),
-                (0.4, 0.6, 'Medium'),
-                (0.6, 0.8, 'High'),
-                (0.8, 1.0, 'Very High')
-            ]
+            statement = db.select(*[column for column, _ in self.EXPORT_COLUMNS])\
+                .join(LogEntry, LogEntry.id == Anomaly.entry_id)\
+                .where(*anomaly_filters(log_id, request.args))\
+                .order_by(desc(Anomaly.confidence), Anomaly.id)
             
-            confidence_distribution = {}
-            for min_conf, max_conf, label in confidence_ranges:
-                count = Anomaly.query.filter_by(log_id=log_id)\
-                    .filter(Anomaly.confidence >= min_conf)\
-                    .filter(Anomaly.confidence < max_conf if max_conf < 1.0 else Anomaly.confidence <= max_conf)\
-                    .count()
-                confidence_distribution[label] = count
+            columns = [name for _, name in self.EXPORT_COLUMNS]
+            chunks = ExportService().stream(statement, columns, fmt, compress,
+                                            transform=lambda rows: decode_rows(rows, {columns.index('method'): 'method'}))
             
-            return {
-                'total_anomalies': total_anomalies,
-                'by_type': by_type,
-                'by_severity': by_severity,
-                'timeline': timeline,
-                'top_ips': top_ips,
-                'confidence_distribution': confidence_distribution
-            }
+            return export_response(chunks, f'{os.path.splitext(log_file.original_filename)[0]}_anomalies', fmt, compress)
             
+        except HTTPException:
+            raise
         except Exception as e:
-            current_app.logger.error(f'Stats calculation error: {str(e)}')
-            return {
-                'total_anomalies': 0,
-                'by_type': {},
-                'by_severity': {},
-                'timeline': [],
-                'top_ips': [],
-                'confidence_distribution': {}
-            }
+            current_app.logger.error(f'Anomalies export error: {str(e)}')
+            anomalies_ns.abort(500, 'Internal server error')
 
 
 @anomalies_ns.route('/<string:log_id>/summary')
 class AnomalySummaryResource(Resource):
     @jwt_required()
+    @cached_response
     @anomalies_ns.marshal_with(anomaly_stats_model)
     @anomalies_ns.doc(responses={
         200: 'Success',
@@ -235,15 +230,17 @@ class AnomalySummaryResource(Resource):
         try:
             user_id = get_jwt_identity()
             
-            # Verify log file ownership
-            log_file = LogFile.query.filter_by(id=log_id, user_id=user_id).first()
-            if not log_file:
+            # Cached statistics (computed in a single query on a miss) carry
+            # the log's owner, which stands in for a separate ownership check
+            owned = AnomalyStatsService().get_owned_stats(log_id, user_id)
+            if not owned:
                 anomalies_ns.abort(404, 'Log file not found')
             
-            # Calculate and return statistics
-            stats = LogAnomaliesResource()._calculate_anomaly_stats(log_id)
-            return stats
+            mark_cacheable(owned['status'])
+            return owned['stats']
             
+        except HTTPException:
+            raise
         except Exception as e:
             current_app.logger.error(f'Anomaly summary error: {str(e)}')
             anomalies_ns.abort(500, 'Internal server error')
@@ -273,12 +270,7 @@ class AnomalyDetailResource(Resource):
                 anomalies_ns.abort(404, 'Anomaly not found')
             
             # Get associated log entry
-            log_entry = LogEntry.query.get(anomaly.entry_id)
-            
-            return {
-                'anomaly': anomaly.to_dict(),
-                'log_entry': log_entry.to_dict() if log_entry else None
-            }
+            return serialize_anomalies_with_entries([anomaly])[0]
             
         except Exception as e:
             current_app.logger.error(f'Anomaly detail error: {str(e)}')
@@ -297,21 +289,16 @@ class AnomalyTypesResource(Resource):
         try:
             user_id = get_jwt_identity()
             
-            # Get unique anomaly types for user's logs
-            types = db.session.query(Anomaly.anomaly_type.distinct())\
-                .join(LogFile)\
-                .filter(LogFile.user_id == user_id)\
-                .all()
-            
-            # Get unique severities
-            severities = db.session.query(Anomaly.severity.distinct())\
+            # Unique type/severity pairs of the user's anomalies in one query
+            pairs = db.session.query(Anomaly.anomaly_type, Anomaly.severity)\
                 .join(LogFile)\
                 .filter(LogFile.user_id == user_id)\
+                .distinct()\
                 .all()
             
             return {
-                'types': [t[0] for t in types],
-                'severities': [s[0] for s in severities]
+                'types': list(dict.fromkeys(anomaly_type for anomaly_type, _ in pairs)),
+                'severities': list(dict.fromkeys(severity for _, severity in pairs))
             }
             
         except Exception as e:
@@ -1,6 +1,6 @@
 from flask import request, current_app
 from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import jwt_required, create_access_token, get_jwt_identity
+from flask_jwt_extended import jwt_required, create_access_token, get_current_user
 from werkzeug.exceptions import BadRequest, Unauthorized
 
 from app import db
@@ -152,13 +152,8 @@ class ProfileResource(Resource):
     def get(self):
         """Get current user profile"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            
-            if not user:
-                auth_ns.abort(404, 'User not found')
-            
-            return user.to_dict()
+            # Served from the cached JWT user lookup
+            return get_current_user()
             
         except Exception as e:
             current_app.logger.error(f'Profile error: {str(e)}')
@@ -176,18 +171,15 @@ class RefreshResource(Resource):
     def post(self):
         """Refresh JWT token"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            
-            if not user or not user.is_active:
-                auth_ns.abort(401, 'Invalid user')
+            # The JWT user lookup already rejected missing or inactive users
+            user = get_current_user()
             
             # Create new JWT token
-            access_token = create_access_token(identity=str(user.id))
+            access_token = create_access_token(identity=user['id'])
             
             return {
                 'access_token': access_token,
-                'user': user.to_dict()
+                'user': user
             }
             
         except Exception as e:
@@ -205,13 +197,7 @@ class ValidateResource(Resource):
     def get(self):
         """Validate JWT token"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            
-            if not user or not user.is_active:
-                auth_ns.abort(401, 'Invalid token')
-            
-            return {'valid': True, 'user_id': str(user.id)}
+            return {'valid': True, 'user_id': get_current_user()['id']}
             
         except Exception as e:
             current_app.logger.error(f'Token validation error: {str(e)}')
@@ -1,15 +1,29 @@
 import os
+import time
 import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from flask import request, current_app, send_file
+from werkzeug.exceptions import HTTPException
+from flask import request, current_app, send_file, Response, stream_with_context
 from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
+from sqlalchemy.orm import defer
 
 from app import db
-from app.models import User, LogFile, LogEntry, Anomaly
-from app.services.parser import LogParserService
-from app.services.anomaly import AnomalyDetectionService
+from app.models import LogFile, LogEntry, Anomaly, DestHost
+from app.services.rollup import RollupService
+from app.services.serialization import entry_columns, entry_rows_payload, project
+from app.services.response_cache import cached_response, mark_cacheable, bump_log_version
+from app.services.export import ExportService, EXPORT_FORMATS, export_response
+from app.services.progress import get_progress_snapshot, progress_event_stream, ProgressPublisher
+from app.services.scheduler import IngestScheduler, AdmissionError
+from app.services.detection_config import DETECTORS, THRESHOLD_DETECTORS, resolve_detection_config
+from app.services.anomaly_store import store_anomalies
+from app.services.identity import get_owned_log, load_owned_log
+from app.services.collapse import COLLAPSE_MODES, resolve_collapse_mode
+from app.services.dedup import save_upload, pipeline_key, find_processed_duplicate
+from app.services.raw_store import block_store_path, has_block_store, is_block_store, open_block_store, read_raw_lines
+from app.services.dimensions import DIMENSION_MODELS, decode_rows
 
 # Create namespace for log operations
 logs_ns = Namespace('logs', description='Log file operations')
@@ -47,6 +61,8 @@ log_entry_model = logs_ns.model('LogEntry', {
     'status_code': fields.Integer(description='HTTP status code'),
     'response_size': fields.Integer(description='Response size in bytes'),
     'user_agent': fields.String(description='User agent string'),
+    'repeat_count': fields.Integer(description='Identical lines collapsed into this entry'),
+    'last_timestamp': fields.String(description='Timestamp of the last collapsed line'),
     'raw_log': fields.String(description='Original log line'),
     'anomalies': fields.List(fields.Raw, description='Associated anomalies')
 })
@@ -64,6 +80,50 @@ log_entries_response_model = logs_ns.model('LogEntriesResponse', {
     'log_file': fields.Nested(log_file_model)
 })
 
+series_point_model = logs_ns.model('SeriesPoint', {
+    'timestamp': fields.String(description='Bucket start timestamp'),
+    'request_count': fields.Integer(description='Requests in bucket'),
+    'bytes_total': fields.Integer(description='Response bytes in bucket'),
+    'values': fields.Raw(description='Request counts per dimension value')
+})
+
+series_response_model = logs_ns.model('SeriesResponse', {
+    'dimension': fields.String(description='Dimension the series is split by'),
+    'interval': fields.String(description='Bucket size'),
+    'series': fields.List(fields.Nested(series_point_model))
+})
+
+reanalyze_model = logs_ns.model('ReanalyzeRequest', {
+    'detectors': fields.List(fields.String, description=f'Detectors to rerun (default: all of {", ".join(DETECTORS)})'),
+    'thresholds': fields.Raw(description='Threshold overrides, e.g. {"temporal_z_score": 3.0}'),
+    'profile': fields.Boolean(description='Also dump cProfile stats for this job', default=False)
+})
+
+reanalyze_response_model = logs_ns.model('ReanalyzeResponse', {
+    'log_id': fields.String(description='Log file ID'),
+    'status': fields.String(description='Job status'),
+    'detectors': fields.List(fields.String, description='Detectors being rerun'),
+    'thresholds': fields.Raw(description='Effective thresholds'),
+    'message': fields.String(description='Status message')
+})
+
+retune_model = logs_ns.model('RetuneRequest', {
+    'detectors': fields.List(fields.String, description=f'Detectors to re-tune (default: {", ".join(THRESHOLD_DETECTORS)})'),
+    'thresholds': fields.Raw(description='Threshold overrides, e.g. {"volume_contamination": 0.01}'),
+    'apply': fields.Boolean(description='Replace the stored anomalies (default: preview only)', default=False)
+})
+
+retune_response_model = logs_ns.model('RetuneResponse', {
+    'log_id': fields.String(description='Log file ID'),
+    'applied': fields.Boolean(description='Whether stored anomalies were replaced'),
+    'detectors': fields.List(fields.String, description='Detectors re-tuned from cached scores'),
+    'missing': fields.List(fields.String, description='Detectors without cached scores'),
+    'thresholds': fields.Raw(description='Effective thresholds'),
+    'counts': fields.Raw(description='Anomalies per detector'),
+    'total': fields.Integer(description='Total anomalies'),
+    'elapsed_ms': fields.Float(description='Selection time in milliseconds')
+})
+
 
 def allowed_file(filename):
     """Check if uploaded file has allowed extension"""
@@ -71,24 +131,65 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
 
+# What ``search`` is matched against: 'all' includes the raw line
+SEARCH_SCOPES = ('all', 'fields')
+
+
+def entry_filters(log_id, args):
+    """Build the entry filter criteria shared by the list and export endpoints
+    
+    Raises ValueError for a raw line search on a log whose lines are kept
+    in its block store (RAW_LOG_STORAGE=offsets); SQL can't match those.
+    """
+    criteria = [LogEntry.log_id == log_id]
+    
+    search = args.get('search', '').strip()
+    if search:
+        search_in = args.get('search_in', 'all').lower()
+        if search_in not in SEARCH_SCOPES:
+            raise ValueError(f'search_in must be one of: {", ".join(SEARCH_SCOPES)}')
+        
+        matches = [
+            LogEntry.src_ip.cast(db.String).ilike(f'%{search}%'),
+            LogEntry.dest_host_id.in_(db.select(DestHost.id).where(DestHost.value.ilike(f'%{search}%'))),
+            LogEntry.url.ilike(f'%{search}%')
+        ]
+        if search_in == 'all':
+            if has_block_store(log_id):
+                raise ValueError('Raw lines of this log are stored as offsets and can\'t be searched; '
+                                 'use search_in=fields to match IP, host and URL')
+            matches.insert(0, LogEntry.raw_log.ilike(f'%{search}%'))
+        criteria.append(db.or_(*matches))
+    
+    # Filter for anomalies only
+    if args.get('anomalies_only', 'false').lower() == 'true':
+        criteria.append(LogEntry.anomalies.any())
+    
+    return criteria
+
+
 @logs_ns.route('/upload')
 class LogUploadResource(Resource):
     @jwt_required()
     @logs_ns.marshal_with(upload_response_model)
-    @logs_ns.doc(responses={
+    @logs_ns.doc(params={
+        'profile': 'Also dump cProfile stats for the processing job (default false)',
+        'collapse': f'Collapse duplicate lines into counted entries: {", ".join(COLLAPSE_MODES)} '
+                    '(default INGEST_COLLAPSE)',
+        'preview': 'Show approximate results from a sample within seconds while the file is processed '
+                   '(default true for files of at least INGEST_PREVIEW_MIN_BYTES)'
+    }, responses={
         200: 'File uploaded successfully',
         400: 'Invalid file or request',
         401: 'Authentication required',
-        413: 'File too large'
+        413: 'File too large',
+        429: 'Processing backlog full, retry later'
     })
     def post(self):
         """Upload a log file for analysis"""
         try:
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            
-            if not user:
-                logs_ns.abort(401, 'Invalid user')
+            # Loaded (and checked to be active) by the cached JWT user lookup
+            user = get_current_user()
             
             # Check if file is present in request
             if 'file' not in request.files:
@@ -102,39 +203,66 @@ class LogUploadResource(Resource):
             if not allowed_file(file.filename):
                 logs_ns.abort(400, 'File type not supported. Allowed: .log, .txt, .csv, .tsv')
             
+            collapse = request.args.get('collapse')
+            if collapse is not None and collapse not in COLLAPSE_MODES:
+                logs_ns.abort(400, f'Unknown collapse mode: {collapse}. Use one of {", ".join(COLLAPSE_MODES)}')
+            
+            # Admission control: refuse work before storing anything when
+            # the ingest backlog is too deep
+            scheduler = IngestScheduler()
+            try:
+                scheduler.check_admission(user['id'])
+            except AdmissionError as e:
+                return {
+                    'status': 'rejected',
+                    'message': str(e)
+                }, 429, {'Retry-After': str(e.retry_after)}
+            
             # Generate unique filename
             log_id = str(uuid.uuid4())
             original_filename = secure_filename(file.filename)
             filename = f"{log_id}_{original_filename}"
             
-            # Save file to upload directory
+            # Save file to upload directory, hashing it on the way
             upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(upload_path)
-            
-            # Get file size
-            file_size = os.path.getsize(upload_path)
+            file_size, content_hash = save_upload(file.stream, upload_path)
             
             # Create log file record
             log_file = LogFile(
                 id=log_id,
-                user_id=user.id,
+                user_id=uuid.UUID(user['id']),
                 filename=filename,
                 original_filename=original_filename,
                 file_path=upload_path,
                 file_size=file_size,
                 content_type=file.content_type,
+                content_hash=content_hash,
                 status='uploaded'
             )
             
             db.session.add(log_file)
             db.session.commit()
             
-            current_app.logger.info(f'File uploaded: {original_filename} by user {user.email}')
+            current_app.logger.info(f'File uploaded: {original_filename} by user {user["email"]}')
             
-            # Start background processing
+            # Queue background processing on the fair ingest scheduler
             try:
-                log_parser = LogParserService()
-                log_parser.process_log_file_async(log_id)
+                ProgressPublisher(log_id).stage('queued', 0)
+                options = {}
+                if request.args.get('profile', 'false').lower() == 'true':
+                    options['cprofile'] = True
+                if collapse is not None:
+                    options['collapse'] = collapse
+                
+                # A preview job samples the file first and queues the exact pass itself
+                preview_min_bytes = int(os.getenv('INGEST_PREVIEW_MIN_BYTES', 0))
+                preview_default = 'true' if preview_min_bytes and file_size >= preview_min_bytes else 'false'
+                preview = request.args.get('preview', preview_default).lower() == 'true'
+                # Duplicates of a processed upload are cloned within seconds anyway
+                if preview and find_processed_duplicate(log_file, pipeline_key(resolve_collapse_mode(collapse))):
+                    preview = False
+                scheduler.submit(log_id, user['id'], file_size, task='preview' if preview else 'process',
+                                 options=options or None)
             except Exception as e:
                 current_app.logger.error(f'Failed to start log processing: {str(e)}')
                 log_file.status = 'error'
@@ -145,9 +273,11 @@ class LogUploadResource(Resource):
                 'log_id': log_id,
                 'filename': original_filename,
                 'status': log_file.status,
-                'message': 'File uploaded successfully and processing started'
+                'message': 'File uploaded successfully and queued for processing'
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             current_app.logger.error(f'Upload error: {str(e)}')
             logs_ns.abort(500, 'Internal server error')
@@ -170,10 +300,14 @@ class LogListResource(Resource):
             page = request.args.get('page', 1, type=int)
             per_page = min(request.args.get('per_page', 10, type=int), 100)
             status = request.args.get('status', None)
+            include_summary = request.args.get('include_summary', 'false').lower() == 'true'
             
-            # Build query
+            # Build query (the summary JSONB is only loaded when requested)
             query = LogFile.query.filter_by(user_id=user_id)
             
+            if not include_summary:
+                query = query.options(defer(LogFile.summary))
+            
             if status:
                 query = query.filter_by(status=status)
             
@@ -187,7 +321,7 @@ class LogListResource(Resource):
                 error_out=False
             )
             
-            return [log_file.to_dict() for log_file in paginated.items]
+            return [log_file.to_dict(include_summary=include_summary) for log_file in paginated.items]
             
         except Exception as e:
             current_app.logger.error(f'Log list error: {str(e)}')
@@ -197,6 +331,7 @@ class LogListResource(Resource):
 @logs_ns.route('/<string:log_id>')
 class LogDetailResource(Resource):
     @jwt_required()
+    @cached_response
     @logs_ns.marshal_with(log_file_model)
     @logs_ns.doc(responses={
         200: 'Success',
@@ -213,6 +348,7 @@ class LogDetailResource(Resource):
             if not log_file:
                 logs_ns.abort(404, 'Log file not found')
             
+            mark_cacheable(log_file.status)
             return log_file.to_dict()
             
         except Exception as e:
@@ -235,10 +371,11 @@ class LogDetailResource(Resource):
             if not log_file:
                 logs_ns.abort(404, 'Log file not found')
             
-            # Delete physical file
+            # Delete physical file (and the block store of a failed job)
             try:
-                if os.path.exists(log_file.file_path):
-                    os.remove(log_file.file_path)
+                for path in {log_file.file_path, block_store_path(log_id)}:
+                    if os.path.exists(path):
+                        os.remove(path)
             except Exception as e:
                 current_app.logger.warning(f'Failed to delete physical file: {str(e)}')
             
@@ -246,6 +383,11 @@ class LogDetailResource(Resource):
             db.session.delete(log_file)
             db.session.commit()
             
+            bump_log_version(log_id)
+            
+            from app.services.score_cache import DetectorScoreCache
+            DetectorScoreCache(log_id).delete()
+            
             current_app.logger.info(f'Log file deleted: {log_id}')
             
             return '', 204
@@ -255,48 +397,236 @@ class LogDetailResource(Resource):
             logs_ns.abort(500, 'Internal server error')
 
 
-@logs_ns.route('/<string:log_id>/entries')
-class LogEntriesResource(Resource):
+@logs_ns.route('/<string:log_id>/reanalyze')
+class LogReanalyzeResource(Resource):
     @jwt_required()
-    @logs_ns.marshal_with(log_entries_response_model)
+    @logs_ns.expect(reanalyze_model)
     @logs_ns.doc(responses={
-        200: 'Success',
+        202: 'Re-analysis queued',
+        400: 'Unknown detector or invalid threshold',
+        401: 'Authentication required',
+        404: 'Log file not found',
+        409: 'Log file is not ready',
+        429: 'Processing backlog full, retry later'
+    })
+    def post(self, log_id):
+        """Rerun anomaly detection on stored entries without re-parsing"""
+        try:
+            user_id = get_jwt_identity()
+            
+            log_file = get_owned_log(log_id, user_id)
+            
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            if log_file.status != 'ready':
+                logs_ns.abort(409, f'Log file is {log_file.status}, only ready logs can be re-analyzed')
+            
+            data = request.get_json(silent=True) or {}
+            try:
+                detectors, thresholds = resolve_detection_config(data.get('detectors'), data.get('thresholds'))
+            except (ValueError, AttributeError) as e:
+                logs_ns.abort(400, str(e))
+            
+            scheduler = IngestScheduler()
+            try:
+                scheduler.check_admission(user_id)
+            except AdmissionError as e:
+                return {
+                    'status': 'rejected',
+                    'message': str(e)
+                }, 429, {'Retry-After': str(e.retry_after)}
+            
+            # Old anomalies stay visible until the job swaps in the new set
+            scheduler.submit(
+                log_id, user_id, log_file.file_size,
+                task='reanalyze',
+                options={
+                    'detectors': detectors,
+                    'thresholds': data.get('thresholds') or {},
+                    'cprofile': bool(data.get('profile', False))
+                }
+            )
+            
+            current_app.logger.info(f'Re-analysis queued for log {log_id}: {", ".join(detectors)}')
+            
+            return {
+                'log_id': log_id,
+                'status': 'queued',
+                'detectors': detectors,
+                'thresholds': thresholds,
+                'message': 'Re-analysis queued; current anomalies remain until it finishes'
+            }, 202
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Reanalyze error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
+@logs_ns.route('/<string:log_id>/retune')
+class LogRetuneResource(Resource):
+    @jwt_required()
+    @logs_ns.expect(retune_model)
+    @logs_ns.marshal_with(retune_response_model)
+    @logs_ns.doc(responses={
+        200: 'Anomalies selected with the new thresholds',
+        400: 'Unknown detector or invalid threshold',
+        401: 'Authentication required',
+        404: 'Log file not found',
+        409: 'Log file is not ready or has no cached scores'
+    })
+    def post(self, log_id):
+        """Re-apply thresholds to cached detector scores without refitting"""
+        try:
+            user_id = get_jwt_identity()
+            
+            log_file = get_owned_log(log_id, user_id)
+            
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            if log_file.status != 'ready':
+                logs_ns.abort(409, f'Log file is {log_file.status}, only ready logs can be re-tuned')
+            
+            data = request.get_json(silent=True) or {}
+            try:
+                detectors, thresholds = resolve_detection_config(
+                    data.get('detectors') or THRESHOLD_DETECTORS, data.get('thresholds')
+                )
+            except (ValueError, AttributeError) as e:
+                logs_ns.abort(400, str(e))
+            
+            fixed = [name for name in detectors if name not in THRESHOLD_DETECTORS]
+            if fixed:
+                logs_ns.abort(400, f"Detectors without thresholds cannot be re-tuned: {', '.join(fixed)}")
+            
+            # numpy only, loaded on first use so API cold start stays lean
+            from app.services.score_cache import DetectorScoreCache
+            
+            started = time.perf_counter()
+            anomalies, counts, missing = DetectorScoreCache(log_id).select(detectors, thresholds)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            selected = list(counts)
+            
+            if not selected:
+                logs_ns.abort(409, 'No cached detector scores for this log, re-analyze it first')
+            
+            apply = bool(data.get('apply', False))
+            if apply:
+                store_anomalies(log_id, anomalies, selected)
+            
+            current_app.logger.info(
+                f'Re-tuned log {log_id} ({", ".join(selected)}): {len(anomalies)} anomalies '
+                f'in {elapsed_ms:.1f} ms{" (applied)" if apply else ""}'
+            )
+            
+            return {
+                'log_id': log_id,
+                'applied': apply,
+                'detectors': selected,
+                'missing': missing,
+                'thresholds': thresholds,
+                'counts': counts,
+                'total': len(anomalies),
+                'elapsed_ms': round(elapsed_ms, 2)
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Retune error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
+@logs_ns.route('/<string:log_id>/events')
+class LogEventsResource(Resource):
+    # EventSource cannot set headers, so the token may also come as ?jwt=
+    @jwt_required(locations=['headers', 'query_string'])
+    @logs_ns.doc(responses={
+        200: 'text/event-stream of progress events',
         401: 'Authentication required',
         404: 'Log file not found'
     })
     def get(self, log_id):
-        """Get paginated log entries for a specific log file"""
+        """Stream processing progress as Server-Sent Events"""
         try:
             user_id = get_jwt_identity()
             
-            log_file = LogFile.query.filter_by(id=log_id, user_id=user_id).first()
+            log_file = LogFile.query.options(defer(LogFile.summary))\
+                .filter_by(id=log_id, user_id=user_id).first()
             
             if not log_file:
                 logs_ns.abort(404, 'Log file not found')
             
+            # Start from the live Redis snapshot; fall back to the database row
+            initial = get_progress_snapshot(log_id)
+            if not initial or log_file.status in ('ready', 'error'):
+                initial = {
+                    'log_id': log_id,
+                    'stage': log_file.status,
+                    'progress': log_file.processing_progress,
+                    'error': log_file.error_message
+                }
+            
+            # Release the DB connection before holding the stream open
+            db.session.remove()
+            
+            response = Response(progress_event_stream(log_id, initial), mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Log events error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
+@logs_ns.route('/<string:log_id>/entries')
+class LogEntriesResource(Resource):
+    @jwt_required()
+    @cached_response
+    @logs_ns.response(200, 'Success', log_entries_response_model)
+    @logs_ns.doc(params={
+        'page': 'Page number',
+        'per_page': 'Entries per page (max 200)',
+        'search': 'Substring matched against raw line, IP, host and URL',
+        'search_in': 'all (default) or fields to skip the raw line; logs stored as offsets need fields',
+        'anomalies_only': 'Only return entries with anomalies',
+        'include_raw': 'Include the raw log line (default true)'
+    }, responses={
+        400: 'Invalid search',
+        401: 'Authentication required',
+        404: 'Log file not found'
+    })
+    def get(self, log_id):
+        """Get paginated log entries for a specific log file
+
+        Rows are read as tuples and encoded by orjson without ``marshal``;
+        the payload keeps the shape of ``LogEntriesResponse``.
+        """
+        try:
+            user_id = get_jwt_identity()
+            
             # Get query parameters
             page = request.args.get('page', 1, type=int)
             per_page = min(request.args.get('per_page', 50, type=int), 200)
-            search = request.args.get('search', '').strip()
-            filter_anomalies = request.args.get('anomalies_only', 'false').lower() == 'true'
-            
-            # Build query
-            query = LogEntry.query.filter_by(log_id=log_id)
-            
-            # Apply search filter
-            if search:
-                query = query.filter(
-                    db.or_(
-                        LogEntry.raw_log.ilike(f'%{search}%'),
-                        LogEntry.src_ip.cast(db.String).ilike(f'%{search}%'),
-                        LogEntry.dest_host.ilike(f'%{search}%'),
-                        LogEntry.url.ilike(f'%{search}%')
-                    )
-                )
+            include_raw = request.args.get('include_raw', 'true').lower() == 'true'
+            
+            try:
+                criteria = entry_filters(log_id, request.args)
+            except ValueError as e:
+                logs_ns.abort(400, str(e))
             
-            # Filter for anomalies only
-            if filter_anomalies:
-                query = query.join(Anomaly).distinct()
+            # Build query (parsed_fields is not part of the response model); the
+            # join on the owner checks ownership and loads the log row with the page
+            query = LogEntry.query.with_entities(LogFile, *entry_columns(include_raw))\
+                .join(LogFile, LogFile.id == LogEntry.log_id)\
+                .options(defer(LogFile.summary))\
+                .filter(LogFile.user_id == user_id, *criteria)
             
             # Order by timestamp
             query = query.order_by(LogEntry.timestamp.desc())
@@ -308,22 +638,237 @@ class LogEntriesResource(Resource):
                 error_out=False
             )
             
+            # An empty page carries no log row; look it up to tell empty from not owned
+            log_file = paginated.items[0][0] if paginated.items else load_owned_log(log_id, user_id)
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            mark_cacheable(log_file.status)
+            
             return {
-                'entries': [entry.to_dict() for entry in paginated.items],
+                'entries': entry_rows_payload(paginated.items, include_raw, start=1),
                 'pagination': {
                     'page': paginated.page,
                     'per_page': paginated.per_page,
                     'total': paginated.total,
                     'pages': paginated.pages
                 },
-                'log_file': log_file.to_dict(include_summary=False)
+                'log_file': project(log_file.to_dict(include_summary=False), log_file_model)
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             current_app.logger.error(f'Log entries error: {str(e)}')
             logs_ns.abort(500, 'Internal server error')
 
 
+@logs_ns.route('/<string:log_id>/entries/export')
+class LogEntriesExportResource(Resource):
+    # Columns streamed by the export, in output order
+    EXPORT_COLUMNS = (
+        'id', 'timestamp', 'src_ip', 'dest_host', 'method', 'url', 'status_code',
+        'response_size', 'user_agent', 'referer', 'line_number', 'repeat_count',
+        'last_timestamp', 'raw_log'
+    )
+    
+    @staticmethod
+    def _resolve_raw_logs(log_id, rows):
+        """Export rows with raw_log read from the block store where it was not kept inline"""
+        spans = [(row[-2], row[-1]) for row in rows if row[-3] is None and row[-2] is not None]
+        lines = iter(read_raw_lines(log_id, spans)) if spans else None
+        return [
+            tuple(row[:-3]) + (next(lines) if row[-3] is None and row[-2] is not None else row[-3],)
+            for row in rows
+        ]
+    
+    @jwt_required()
+    @logs_ns.doc(params={
+        'format': 'ndjson (default) or csv',
+        'gzip': 'Compress the export with gzip (default false)',
+        'search': 'Substring matched against raw line, IP, host and URL',
+        'search_in': 'all (default) or fields to skip the raw line; logs stored as offsets need fields',
+        'anomalies_only': 'Only export entries with anomalies'
+    }, responses={
+        200: 'Streamed export',
+        400: 'Invalid format or search',
+        401: 'Authentication required',
+        404: 'Log file not found'
+    })
+    def get(self, log_id):
+        """Stream all (filtered) entries of a log file as NDJSON or CSV"""
+        try:
+            user_id = get_jwt_identity()
+            
+            log_file = get_owned_log(log_id, user_id)
+            
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            fmt = request.args.get('format', 'ndjson').lower()
+            compress = request.args.get('gzip', 'false').lower() == 'true'
+            
+            if fmt not in EXPORT_FORMATS:
+                logs_ns.abort(400, f'Unsupported format. Allowed: {", ".join(EXPORT_FORMATS)}')
+            
+            try:
+                criteria = entry_filters(log_id, request.args)
+            except ValueError as e:
+                logs_ns.abort(400, str(e))
+            
+            # Dimensions are exported as ids and decoded per partition; offsets
+            # of lines kept in the block store follow the exported columns
+            statement = db.select(*[getattr(LogEntry, f'{column}_id' if column in DIMENSION_MODELS else column)
+                                    for column in self.EXPORT_COLUMNS],
+                                  LogEntry.raw_offset, LogEntry.raw_length)\
+                .where(*criteria)\
+                .order_by(LogEntry.timestamp, LogEntry.id)
+            
+            dimensions = {index: column for index, column in enumerate(self.EXPORT_COLUMNS) if column in DIMENSION_MODELS}
+            chunks = ExportService().stream(
+                statement, list(self.EXPORT_COLUMNS), fmt, compress,
+                transform=lambda rows: self._resolve_raw_logs(log_id, decode_rows(rows, dimensions))
+            )
+            
+            return export_response(chunks, f'{os.path.splitext(log_file.original_filename)[0]}_entries', fmt, compress)
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Log entries export error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
+@logs_ns.route('/<string:log_id>/stats/series')
+class LogStatsSeriesResource(Resource):
+    @jwt_required()
+    @logs_ns.marshal_with(series_response_model)
+    @logs_ns.doc(params={
+        'dimension': 'One of total, status_class, method, host (default total)',
+        'interval': 'Bucket size: 1m, 5m, 15m, 1h, 6h, 1d (default 5m)',
+        'start': 'ISO timestamp lower bound (inclusive)',
+        'end': 'ISO timestamp upper bound (exclusive)',
+        'top': 'Number of dimension values kept before folding into "other" (default 10)'
+    }, responses={
+        200: 'Success',
+        400: 'Invalid parameters',
+        401: 'Authentication required',
+        404: 'Log file not found'
+    })
+    def get(self, log_id):
+        """Get time-bucketed traffic series built from precomputed rollups"""
+        try:
+            user_id = get_jwt_identity()
+            
+            log_file = get_owned_log(log_id, user_id)
+            
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            # Get query parameters
+            dimension = request.args.get('dimension', 'total')
+            interval = request.args.get('interval', '5m')
+            top = min(request.args.get('top', 10, type=int), 50)
+            
+            try:
+                start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+                end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+            except ValueError:
+                logs_ns.abort(400, 'start and end must be ISO timestamps')
+            
+            try:
+                return RollupService().get_series(log_id, dimension, interval, start, end, top)
+            except ValueError as e:
+                logs_ns.abort(400, str(e))
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Log series error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
+@logs_ns.route('/<string:log_id>/profile')
+class LogProfileResource(Resource):
+    @jwt_required()
+    @logs_ns.doc(params={
+        'task': 'Only return the profile of this task (preview, process, reanalyze)'
+    }, responses={
+        200: 'Per-stage timings of the latest job per task',
+        401: 'Authentication required',
+        404: 'Log file or profile not found'
+    })
+    def get(self, log_id):
+        """Get wall/CPU time, rows and peak memory per processing stage and detector"""
+        try:
+            user_id = get_jwt_identity()
+            
+            log_file = LogFile.query.filter_by(id=log_id, user_id=user_id).first()
+            
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            profile = log_file.profile or {}
+            task = request.args.get('task')
+            if task:
+                if task not in profile:
+                    logs_ns.abort(404, f'No profile recorded for {task}')
+                profile = {task: profile[task]}
+            
+            return {
+                'log_id': log_id,
+                'status': log_file.status,
+                'profile': profile
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Log profile error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
+@logs_ns.route('/<string:log_id>/profile/cprofile')
+class LogCProfileResource(Resource):
+    @jwt_required()
+    @logs_ns.doc(params={
+        'task': 'Task whose dump to download (default: process)'
+    }, responses={
+        200: 'cProfile stats file (load with pstats or snakeviz)',
+        401: 'Authentication required',
+        404: 'No cProfile dump for this log'
+    })
+    def get(self, log_id):
+        """Download the cProfile dump of an opt-in profiled job"""
+        try:
+            user_id = get_jwt_identity()
+            
+            log_file = LogFile.query.filter_by(id=log_id, user_id=user_id).first()
+            
+            if not log_file:
+                logs_ns.abort(404, 'Log file not found')
+            
+            task_profile = (log_file.profile or {}).get(request.args.get('task', 'process')) or {}
+            dump_name = task_profile.get('cprofile')
+            dump_path = os.path.join(current_app.config['PROFILE_FOLDER'], dump_name) if dump_name else None
+            
+            if not dump_path or not os.path.exists(dump_path):
+                logs_ns.abort(404, 'No cProfile dump for this log; upload or re-analyze with profiling enabled')
+            
+            return send_file(
+                dump_path,
+                as_attachment=True,
+                download_name=dump_name,
+                mimetype='application/octet-stream'
+            )
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            current_app.logger.error(f'Log cProfile download error: {str(e)}')
+            logs_ns.abort(500, 'Internal server error')
+
+
 @logs_ns.route('/<string:log_id>/download')
 class LogDownloadResource(Resource):
     @jwt_required()
@@ -345,6 +890,15 @@ class LogDownloadResource(Resource):
             if not os.path.exists(log_file.file_path):
                 logs_ns.abort(404, 'Physical file not found')
             
+            # Originals replaced by their block store are decompressed on the fly
+            if is_block_store(log_file.file_path):
+                response = Response(
+                    stream_with_context(open_block_store(log_file.file_path).iter_blocks()),
+                    mimetype=log_file.content_type or 'text/plain'
+                )
+                response.headers['Content-Disposition'] = f'attachment; filename="{log_file.original_filename}"'
+                return response
+            
             return send_file(
                 log_file.file_path,
                 as_attachment=True,
@@ -1,3 +1,4 @@
+import re
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -9,57 +10,117 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 import ipaddress
 
 from app import db
-from app.models import LogFile, LogEntry, Anomaly
+from app.models import LogFile, LogEntry
+from app.services.anomaly_store import store_anomalies
+from app.services.detection_config import DETECTORS, resolve_detection_config, calculate_severity
+from app.services.score_cache import DetectorScoreCache, ENTRIES, select_anomalies
+from app.services.profiling import JobProfiler, profile_stage, save_profile
+from app.services.dimensions import DIMENSION_MODELS, lookup_values
 
 logger = logging.getLogger(__name__)
 
+# Entry columns detectors work on; dimension fields are read as their ids
+ENTRY_FRAME_COLUMNS = (
+    LogEntry.id, LogEntry.timestamp, LogEntry.src_ip, LogEntry.url, LogEntry.status_code,
+    LogEntry.response_size, LogEntry.repeat_count, LogEntry.dest_host_id, LogEntry.method_id,
+    LogEntry.user_agent_id, LogEntry.referer_id
+)
+
+# Injection rule pack, compiled once per process (preloaded by Celery workers)
+INJECTION_RULES = [
+    (re.compile(pattern, re.IGNORECASE), pattern, attack_type)
+    for pattern, attack_type in [
+        (r'union\s+select', 'SQL injection'),
+        (r'<script', 'XSS attempt'),
+        (r'javascript:', 'JavaScript injection'),
+        (r'\.\./.*\.\./.*\.\./', 'Path traversal'),
+        (r'exec\s*\(', 'Code execution attempt'),
+        (r'eval\s*\(', 'Code evaluation attempt')
+    ]
+]
+
 
 class AnomalyDetectionService:
     """Machine learning-based anomaly detection for log analysis"""
     
     def __init__(self):
-        self.contamination = 0.1  # Expected proportion of anomalies
         self.min_samples = 10     # Minimum samples needed for ML
         
-    def detect_anomalies(self, log_id: str):
-        """Main method to detect anomalies in a log file"""
+    def detect_anomalies(self, log_id: str, progress=None, detectors: Optional[List[str]] = None,
+                         thresholds: Optional[Dict] = None, profiler: Optional[JobProfiler] = None):
+        """Main method to detect anomalies in a log file
+        
+        ``detectors`` limits the run to some detectors (default: all) and
+        ``thresholds`` overrides DEFAULT_THRESHOLDS. The results of the
+        selected detectors replace their previous results atomically; a
+        detector that fails keeps its previous results.
+        Raw scores are cached per log (see DetectorScoreCache) so thresholds
+        can later be re-tuned without rerunning this. ``progress`` is an
+        optional ProgressPublisher that receives the current detector stage
+        and ``profiler`` an optional JobProfiler that times each step.
+        """
+        detectors, thresholds = resolve_detection_config(detectors, thresholds)
+        
         try:
-            logger.info(f"Starting anomaly detection for log {log_id}")
+            logger.info(f"Starting anomaly detection for log {log_id} ({', '.join(detectors)})")
             
-            # Get log entries
-            log_entries = LogEntry.query.filter_by(log_id=log_id).all()
+            # Get log entries (in id order, which cached score columns follow)
+            with profile_stage(profiler, 'load_entries') as stage:
+                df = self._load_entries(log_id)
+                stage['rows_out'] = len(df)
             
-            if len(log_entries) < self.min_samples:
-                logger.warning(f"Too few entries ({len(log_entries)}) for anomaly detection")
+            if len(df) < self.min_samples:
+                logger.warning(f"Too few entries ({len(df)}) for anomaly detection")
                 return
             
-            # Convert to DataFrame for easier processing
-            df = self._entries_to_dataframe(log_entries)
-            
             # Feature engineering
-            features_df = self._engineer_features(df)
-            
-            # Detect different types of anomalies
+            if progress:
+                progress.update(force=True, detector='features')
+            with profile_stage(profiler, 'features', rows_in=len(df)):
+                features_df = self._engineer_features(df)
+                base = self._score_entries(df)
+            score_cache = DetectorScoreCache(log_id)
+            self._cache_scores(score_cache, ENTRIES, base)
+            
+            # Score, then apply thresholds; injection rules have no scores
             anomalies = []
-            
-            # Volume-based anomalies
-            volume_anomalies = self._detect_volume_anomalies(df, features_df)
-            anomalies.extend(volume_anomalies)
-            
-            # Behavioral anomalies
-            behavioral_anomalies = self._detect_behavioral_anomalies(df, features_df)
-            anomalies.extend(behavioral_anomalies)
-            
-            # Temporal anomalies
-            temporal_anomalies = self._detect_temporal_anomalies(df, features_df)
-            anomalies.extend(temporal_anomalies)
-            
-            # Pattern-based anomalies
-            pattern_anomalies = self._detect_pattern_anomalies(df, features_df)
-            anomalies.extend(pattern_anomalies)
+            scorers = {
+                'volume': lambda: self._score_volume(df, features_df, base),
+                'behavioral': lambda: self._score_behavioral(df, features_df, base),
+                'temporal': lambda: self._score_temporal(df, features_df, base),
+                'scanning': lambda: self._score_scanning(df, base),
+                'error_rate': lambda: self._score_error_rate(df, base)
+            }
+            
+            failed = []
+            for i, name in enumerate(detectors):
+                if progress:
+                    progress.update(force=True, progress=80 + int(15 * i / len(detectors)), detector=name)
+                try:
+                    with profile_stage(profiler, name, rows_in=len(df)) as stage:
+                        if name == 'injection':
+                            found = self._detect_injection_patterns(df)
+                        else:
+                            scores = scorers[name]()
+                            self._cache_scores(score_cache, name, scores)
+                            found = select_anomalies(name, base, scores, thresholds, self.min_samples)
+                        stage['rows_out'] = len(found)
+                    anomalies.extend(found)
+                except Exception as e:
+                    logger.error(f"Error in {name} anomaly detection: {str(e)}")
+                    failed.append(name)
+            
+            # Failed detectors keep their previous results
+            stored = [name for name in detectors if name not in failed]
+            if not stored:
+                logger.error(f"All detectors failed for log {log_id}; previous anomalies kept")
+                return
             
             # Store anomalies in database
-            self._store_anomalies(log_id, anomalies)
+            if progress:
+                progress.update(force=True, progress=96, detector='storing', anomalies_found=len(anomalies))
+            with profile_stage(profiler, 'store_anomalies', rows_in=len(anomalies)):
+                self._store_anomalies(log_id, anomalies, stored)
             
             logger.info(f"Detected {len(anomalies)} anomalies for log {log_id}")
             
@@ -67,28 +128,88 @@ class AnomalyDetectionService:
             logger.error(f"Error in anomaly detection for log {log_id}: {str(e)}")
             raise
     
-    def _entries_to_dataframe(self, log_entries: List[LogEntry]) -> pd.DataFrame:
-        """Convert log entries to pandas DataFrame"""
-        data = []
-        for entry in log_entries:
-            data.append({
-                'id': entry.id,
-                'timestamp': entry.timestamp,
-                'src_ip': str(entry.src_ip) if entry.src_ip else None,
-                'dest_host': entry.dest_host,
-                'method': entry.method,
-                'url': entry.url,
-                'status_code': entry.status_code,
-                'response_size': entry.response_size or 0,
-                'user_agent': entry.user_agent,
-                'referer': entry.referer,
-                'raw_log': entry.raw_log
-            })
-        
-        df = pd.DataFrame(data)
+    def reanalyze(self, log_id: str, detectors: Optional[List[str]] = None,
+                  thresholds: Optional[Dict] = None, cprofile: bool = False):
+        """Rerun detection on stored entries without re-parsing the file
+        
+        The log stays 'ready' throughout; if detection fails the previous
+        anomalies are left untouched. The run's profile is saved under
+        ``LogFile.profile['reanalyze']``.
+        """
+        from app.services.progress import ProgressPublisher
+        
+        log_file = LogFile.query.get(log_id)
+        if not log_file:
+            raise ValueError(f"Log file not found: {log_id}")
+        
+        progress = ProgressPublisher(log_id)
+        progress.stage('reanalyzing', 80, detector=None, detectors=detectors or list(DETECTORS))
+        profiler = JobProfiler(log_id, 'reanalyze', cprofile=cprofile).start()
+        
+        try:
+            with profiler.stage('detect_anomalies', rows_in=log_file.total_entries):
+                self.detect_anomalies(log_id, progress, detectors, thresholds, profiler=profiler)
+            save_profile(log_file, profiler.stop())
+            db.session.commit()
+            progress.stage('ready', 100, total_entries=log_file.total_entries)
+        except Exception as e:
+            db.session.rollback()
+            save_profile(log_file, profiler.stop(), error=str(e))
+            db.session.commit()
+            progress.stage('ready', 100, total_entries=log_file.total_entries, reanalysis_error=str(e))
+            raise
+    
+    def _cache_scores(self, score_cache: DetectorScoreCache, name: str, scores: Dict[str, np.ndarray]):
+        """Persist raw scores for re-tuning; detection doesn't depend on it"""
+        try:
+            score_cache.save(name, scores)
+        except Exception as e:
+            logger.warning(f"Could not cache {name} scores for log {score_cache.log_id}: {str(e)}")
+    
+    def _load_entries(self, log_id: str) -> pd.DataFrame:
+        """Load the entries of a log in id order as a DataFrame"""
+        rows = db.session.query(*ENTRY_FRAME_COLUMNS)\
+            .filter(LogEntry.log_id == log_id)\
+            .order_by(LogEntry.id)\
+            .all()
+        return self._entries_to_dataframe(rows)
+    
+    def _entries_to_dataframe(self, rows: List) -> pd.DataFrame:
+        """Convert ``ENTRY_FRAME_COLUMNS`` rows to a pandas DataFrame
+        
+        Dimension fields become categoricals over the log's distinct values,
+        so string features are computed once per value (see ``_per_value``).
+        """
+        df = pd.DataFrame.from_records(rows, columns=[column.key for column in ENTRY_FRAME_COLUMNS])
         df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df['src_ip'] = [str(ip) if ip else None for ip in df['src_ip']]
+        df['response_size'] = df['response_size'].fillna(0)
+        df['weight'] = df.pop('repeat_count').fillna(1).astype(np.int64)
+        for name in DIMENSION_MODELS:
+            df[name] = self._dimension_column(name, df.pop(f'{name}_id'))
         return df
     
+    @staticmethod
+    def _dimension_column(name: str, ids: pd.Series) -> pd.Series:
+        """Categorical of a dimension's values from entry ids, categories sorted by value"""
+        distinct = ids.dropna().unique().astype(np.int64)
+        values = lookup_values(name, distinct.tolist())
+        categories = sorted(set(values.values()))
+        code_of_value = {value: code for code, value in enumerate(categories)}
+        code_of_id = {value_id: code_of_value[value] for value_id, value in values.items()}
+        codes = ids.map(code_of_id).fillna(-1).astype(np.int32)
+        return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=ids.index)
+    
+    @staticmethod
+    def _per_value(column: pd.Series, feature, missing) -> np.ndarray:
+        """Evaluate ``feature`` on the distinct values of a categorical column and map it to rows
+        
+        ``missing`` is used for null values.
+        """
+        values = feature(pd.Series(column.cat.categories, dtype=object)).to_numpy()
+        # Code -1 (null) picks the appended ``missing``
+        return np.append(values, missing)[column.cat.codes.to_numpy()]
+    
     def _engineer_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Engineer features for anomaly detection"""
         features_df = df.copy()
@@ -111,10 +232,10 @@ class AnomalyDetectionService:
         features_df['is_error_status'] = (df['status_code'] >= 400).fillna(False)
         features_df['is_server_error'] = (df['status_code'] >= 500).fillna(False)
         
-        # User agent features
-        features_df['ua_length'] = df['user_agent'].str.len().fillna(0)
-        features_df['is_bot'] = df['user_agent'].str.contains(
-            'bot|crawler|spider|scraper', case=False, na=False
+        # User agent features, once per distinct user agent
+        features_df['ua_length'] = self._per_value(df['user_agent'], lambda agents: agents.str.len(), 0)
+        features_df['is_bot'] = self._per_value(
+            df['user_agent'], lambda agents: agents.str.contains('bot|crawler|spider|scraper', case=False), False
         )
         
         # Response size features
@@ -150,278 +271,135 @@ class AnomalyDetectionService:
         except:
             return 'unknown'
     
-    def _detect_volume_anomalies(self, df: pd.DataFrame, features_df: pd.DataFrame) -> List[Dict]:
-        """Detect volume-based anomalies (unusual request frequencies)"""
-        anomalies = []
-        
-        try:
-            # Group by IP and time windows
-            time_window = '5T'  # 5-minute windows
-            
-            # Requests per IP per time window
-            ip_counts = df.groupby([
-                df['src_ip'], 
-                pd.Grouper(key='timestamp', freq=time_window)
-            ]).size().reset_index(name='request_count')
-            
-            if len(ip_counts) < self.min_samples:
-                return anomalies
-            
-            # Use Isolation Forest for volume anomaly detection
-            model = IsolationForest(contamination=0.05, random_state=42)
-            ip_counts['anomaly_score'] = model.fit_predict(ip_counts[['request_count']])
-            
-            # Get decision function scores (lower = more anomalous)
-            scores = model.decision_function(ip_counts[['request_count']])
-            ip_counts['confidence'] = 1 - ((scores - scores.min()) / (scores.max() - scores.min()))
-            
-            # Filter anomalies
-            volume_anomalies = ip_counts[ip_counts['anomaly_score'] == -1]
-            
-            for _, anomaly in volume_anomalies.iterrows():
-                # Find log entries in this time window for this IP
-                window_start = anomaly['timestamp']
-                window_end = window_start + pd.Timedelta(time_window)
-                
-                matching_entries = df[
-                    (df['src_ip'] == anomaly['src_ip']) &
-                    (df['timestamp'] >= window_start) &
-                    (df['timestamp'] < window_end)
-                ]
-                
-                for _, entry in matching_entries.iterrows():
-                    anomalies.append({
-                        'entry_id': entry['id'],
-                        'anomaly_type': 'volume',
-                        'reason': f"Unusual request volume: {anomaly['request_count']} requests from {anomaly['src_ip']} in 5 minutes",
-                        'confidence': min(anomaly['confidence'], 1.0),
-                        'severity': self._calculate_severity(anomaly['confidence'], anomaly['request_count']),
-                        'model_used': 'isolation_forest',
-                        'feature_contributions': {
-                            'request_count': float(anomaly['request_count']),
-                            'time_window': time_window
-                        },
-                        'context_window_start': window_start,
-                        'context_window_end': window_end,
-                        'related_entries_count': len(matching_entries)
-                    })
-            
-        except Exception as e:
-            logger.error(f"Error in volume anomaly detection: {str(e)}")
+    def _score_entries(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Columns shared by all detectors: entry ids, encoded IP/status/method and weights
+
+        ``weight`` is the number of log lines behind each entry (its
+        ``repeat_count``); detectors count lines, not rows.
+        """
+        ip_codes, ips = pd.factorize(df['src_ip'], sort=True)
         
-        return anomalies
+        return {
+            'entry_id': df['id'].to_numpy(dtype=np.int64),
+            'ip': ip_codes.astype(np.int32),
+            'status': df['status_code'].fillna(-1).to_numpy(dtype=np.int32),
+            'method': df['method'].cat.codes.to_numpy(dtype=np.int32),
+            'ips': np.asarray(ips, dtype=str),
+            'methods': np.asarray(df['method'].cat.categories, dtype=str),
+            'weight': df['weight'].to_numpy(dtype=np.int64)
+        }
     
-    def _detect_behavioral_anomalies(self, df: pd.DataFrame, features_df: pd.DataFrame) -> List[Dict]:
-        """Detect behavioral anomalies (unusual HTTP methods, status codes, etc.)"""
-        anomalies = []
+    def _score_volume(self, df: pd.DataFrame, features_df: pd.DataFrame,
+                      base: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Score request volume per IP and 5-minute window (lower = more anomalous)"""
+        time_window = '5min'
         
-        try:
-            # Prepare features for behavioral analysis
-            behavioral_features = []
-            feature_names = []
-            
-            # Status code frequency features
-            status_dist = df['status_code'].value_counts(normalize=True)
-            for _, row in df.iterrows():
-                features = []
-                
-                # Status code rarity
-                status_freq = status_dist.get(row['status_code'], 0)
-                features.append(status_freq)
-                
-                # Response size relative to status code
-                same_status_sizes = df[df['status_code'] == row['status_code']]['response_size']
-                if len(same_status_sizes) > 1:
-                    size_zscore = (row['response_size'] - same_status_sizes.mean()) / same_status_sizes.std()
-                    features.append(abs(size_zscore) if not np.isnan(size_zscore) else 0)
-                else:
-                    features.append(0)
-                
-                # Method rarity
-                method_freq = df['method'].value_counts(normalize=True).get(row['method'], 0)
-                features.append(method_freq)
-                
-                # URL length relative to others
-                url_lengths = df['url'].str.len()
-                if url_lengths.std() > 0:
-                    url_zscore = (len(row['url']) - url_lengths.mean()) / url_lengths.std()
-                    features.append(abs(url_zscore) if not np.isnan(url_zscore) else 0)
-                else:
-                    features.append(0)
-                
-                behavioral_features.append(features)
-            
-            if not behavioral_features:
-                return anomalies
-            
-            # Detect anomalies using Isolation Forest
-            features_array = np.array(behavioral_features)
-            model = IsolationForest(contamination=0.05, random_state=42)
-            anomaly_scores = model.fit_predict(features_array)
-            
-            # Get confidence scores
-            decision_scores = model.decision_function(features_array)
-            confidences = 1 - ((decision_scores - decision_scores.min()) / (decision_scores.max() - decision_scores.min()))
-            
-            # Create anomaly records
-            for i, (_, row) in enumerate(df.iterrows()):
-                if anomaly_scores[i] == -1:  # Anomaly detected
-                    confidence = min(confidences[i], 1.0)
-                    
-                    # Generate reason based on features
-                    reasons = []
-                    if behavioral_features[i][0] < 0.01:  # Rare status code
-                        reasons.append(f"rare status code {row['status_code']}")
-                    if behavioral_features[i][2] < 0.01:  # Rare method
-                        reasons.append(f"unusual HTTP method {row['method']}")
-                    if behavioral_features[i][3] > 2:  # Very long URL
-                        reasons.append("unusually long URL")
-                    
-                    reason = f"Behavioral anomaly: {', '.join(reasons) if reasons else 'unusual request pattern'}"
-                    
-                    anomalies.append({
-                        'entry_id': row['id'],
-                        'anomaly_type': 'behavioral',
-                        'reason': reason,
-                        'confidence': confidence,
-                        'severity': self._calculate_severity(confidence),
-                        'model_used': 'isolation_forest',
-                        'feature_contributions': {
-                            'status_frequency': behavioral_features[i][0],
-                            'response_size_zscore': behavioral_features[i][1],
-                            'method_frequency': behavioral_features[i][2],
-                            'url_length_zscore': behavioral_features[i][3]
-                        }
-                    })
-            
-        except Exception as e:
-            logger.error(f"Error in behavioral anomaly detection: {str(e)}")
+        # Requests per IP per time window
+        keys = pd.DataFrame({'ip': base['ip'], 'timestamp': df['timestamp'].dt.floor(time_window),
+                             'weight': base['weight']})
+        windows = keys[keys['ip'] >= 0].groupby(['ip', 'timestamp'])['weight'].sum().reset_index(name='request_count')
+        windows['window'] = np.arange(len(windows), dtype=np.int32)
         
-        return anomalies
-    
-    def _detect_temporal_anomalies(self, df: pd.DataFrame, features_df: pd.DataFrame) -> List[Dict]:
-        """Detect temporal anomalies (unusual time patterns)"""
-        anomalies = []
+        # Contamination only moves the decision offset, so the forest is
+        # fitted once and thresholds are applied to its raw scores
+        scores = np.empty(0)
+        if len(windows) >= self.min_samples:
+            model = IsolationForest(random_state=42)
+            model.fit(windows[['request_count']])
+            scores = model.score_samples(windows[['request_count']])
         
-        try:
-            # Analyze hourly patterns
-            hourly_counts = df.groupby(df['timestamp'].dt.hour).size()
-            hourly_mean = hourly_counts.mean()
-            hourly_std = hourly_counts.std()
-            
-            # Analyze per-IP hourly patterns
-            for ip in df['src_ip'].dropna().unique():
-                ip_data = df[df['src_ip'] == ip]
-                if len(ip_data) < 5:  # Skip IPs with too few requests
-                    continue
-                
-                ip_hourly = ip_data.groupby(ip_data['timestamp'].dt.hour).size()
-                
-                for hour, count in ip_hourly.items():
-                    # Check if this IP's activity in this hour is unusual
-                    expected_count = hourly_mean * (len(ip_data) / len(df))
-                    z_score = abs((count - expected_count) / max(hourly_std, 1))
-                    
-                    if z_score > 2:  # Significant deviation
-                        confidence = min(z_score / 5, 1.0)  # Normalize to 0-1
-                        
-                        # Find entries for this IP in this hour
-                        hour_entries = ip_data[ip_data['timestamp'].dt.hour == hour]
-                        
-                        for _, entry in hour_entries.iterrows():
-                            anomalies.append({
-                                'entry_id': entry['id'],
-                                'anomaly_type': 'temporal',
-                                'reason': f"Unusual activity time: {count} requests from {ip} at hour {hour} (expected ~{expected_count:.1f})",
-                                'confidence': confidence,
-                                'severity': self._calculate_severity(confidence),
-                                'model_used': 'statistical_analysis',
-                                'feature_contributions': {
-                                    'hour': hour,
-                                    'actual_count': int(count),
-                                    'expected_count': float(expected_count),
-                                    'z_score': float(z_score)
-                                }
-                            })
-            
-        except Exception as e:
-            logger.error(f"Error in temporal anomaly detection: {str(e)}")
+        entry_window = keys.merge(windows[['ip', 'timestamp', 'window']], on=['ip', 'timestamp'], how='left')['window']
         
-        return anomalies
+        return {
+            'window_ip': windows['ip'].to_numpy(dtype=np.int32),
+            'window_start': windows['timestamp'].to_numpy(dtype='datetime64[ns]'),
+            'window_count': windows['request_count'].to_numpy(dtype=np.int64),
+            'score': scores,
+            'entry_window': entry_window.fillna(-1).to_numpy(dtype=np.int32)
+        }
     
-    def _detect_pattern_anomalies(self, df: pd.DataFrame, features_df: pd.DataFrame) -> List[Dict]:
-        """Detect pattern-based anomalies (scanning, injection attempts, etc.)"""
-        anomalies = []
+    def _score_behavioral(self, df: pd.DataFrame, features_df: pd.DataFrame,
+                          base: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Score each request's status/method rarity and size/URL length deviation"""
+        weight = pd.Series(base['weight'], index=df.index)
         
-        try:
-            # Detect potential scanning behavior
-            scanning_anomalies = self._detect_scanning_patterns(df)
-            anomalies.extend(scanning_anomalies)
-            
-            # Detect potential injection attempts
-            injection_anomalies = self._detect_injection_patterns(df)
-            anomalies.extend(injection_anomalies)
-            
-            # Detect error rate anomalies
-            error_anomalies = self._detect_error_patterns(df)
-            anomalies.extend(error_anomalies)
-            
-        except Exception as e:
-            logger.error(f"Error in pattern anomaly detection: {str(e)}")
+        # Status code rarity
+        status_freq = df['status_code'].map(self._weighted_share(df['status_code'], weight)).fillna(0)
         
-        return anomalies
+        # Response size relative to status code
+        size_zscore = self._weighted_zscore(df['response_size'], weight, df['status_code'])
+        
+        # Method rarity, on the method codes
+        methods = pd.Series(base['method'], index=df.index).where(lambda codes: codes >= 0)
+        method_freq = methods.map(self._weighted_share(methods, weight)).fillna(0)
+        
+        # URL length relative to others
+        url_zscore = self._weighted_zscore(df['url'].str.len(), weight)
+        
+        features = np.column_stack([status_freq, size_zscore, method_freq, url_zscore]).astype(np.float64)
+        
+        scores = np.empty(0)
+        if len(features):
+            model = IsolationForest(random_state=42)
+            # Collapsed entries stand for several identical requests
+            model.fit(features, sample_weight=base['weight'] if (base['weight'] > 1).any() else None)
+            scores = model.score_samples(features)
+        
+        return {'score': scores, 'features': features}
     
-    def _detect_scanning_patterns(self, df: pd.DataFrame) -> List[Dict]:
-        """Detect potential port/directory scanning patterns"""
-        anomalies = []
+    def _score_temporal(self, df: pd.DataFrame, features_df: pd.DataFrame,
+                        base: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Score each IP's hourly activity against its expected share of traffic"""
+        hours = df['timestamp'].dt.hour.to_numpy()
+        weight = base['weight']
         
-        # Look for IPs accessing many different URLs with 404s
-        scanning_threshold = 10  # Number of 404s that might indicate scanning
+        # Analyze hourly patterns
+        hourly_counts = pd.Series(weight).groupby(hours).sum()
+        hourly_mean = hourly_counts.mean()
+        hourly_std = hourly_counts.std()
+        denominator = 1 if hourly_std < 1 else hourly_std
         
-        ip_404_counts = df[df['status_code'] == 404].groupby('src_ip').size()
-        potential_scanners = ip_404_counts[ip_404_counts >= scanning_threshold]
+        # Analyze per-IP hourly patterns
+        has_ip = base['ip'] >= 0
+        ip_requests = np.bincount(base['ip'][has_ip], weights=weight[has_ip], minlength=len(base['ips']))
+        keys = pd.DataFrame({'ip': base['ip'], 'hour': hours, 'weight': weight})
+        groups = keys[has_ip].groupby(['ip', 'hour'])['weight'].sum().reset_index(name='count')
+        groups['group'] = np.arange(len(groups), dtype=np.int32)
         
-        for ip, count in potential_scanners.items():
-            scanner_entries = df[(df['src_ip'] == ip) & (df['status_code'] == 404)]
-            
-            # Check if URLs are diverse (indicating scanning)
-            unique_urls = scanner_entries['url'].nunique()
-            if unique_urls >= scanning_threshold * 0.8:  # Most 404s are different URLs
-                confidence = min(count / 50, 1.0)  # Scale confidence
-                
-                for _, entry in scanner_entries.iterrows():
-                    anomalies.append({
-                        'entry_id': entry['id'],
-                        'anomaly_type': 'pattern',
-                        'reason': f"Potential scanning activity: {count} 404 errors from {ip} across {unique_urls} different URLs",
-                        'confidence': confidence,
-                        'severity': 'high' if count > 50 else 'medium',
-                        'model_used': 'pattern_analysis',
-                        'feature_contributions': {
-                            'total_404s': int(count),
-                            'unique_urls': int(unique_urls),
-                            'scanning_ratio': float(unique_urls / count)
-                        }
-                    })
+        expected = hourly_mean * (ip_requests[groups['ip'].to_numpy()] / weight.sum())
+        z_scores = np.abs((groups['count'].to_numpy() - expected) / denominator)
         
-        return anomalies
+        entry_group = keys.merge(groups[['ip', 'hour', 'group']], on=['ip', 'hour'], how='left')['group']
+        
+        return {
+            'group_ip': groups['ip'].to_numpy(dtype=np.int32),
+            'group_hour': groups['hour'].to_numpy(dtype=np.int32),
+            'group_count': groups['count'].to_numpy(dtype=np.int64),
+            'group_expected': np.asarray(expected, dtype=np.float64),
+            'group_z': np.asarray(z_scores, dtype=np.float64),
+            'ip_requests': ip_requests.astype(np.int64),
+            'entry_group': entry_group.fillna(-1).to_numpy(dtype=np.int32)
+        }
+    
+    def _score_scanning(self, df: pd.DataFrame, base: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Count 404s and distinct 404 URLs per IP"""
+        ip_count = len(base['ips'])
+        not_found = (base['status'] == 404) & (base['ip'] >= 0)
+        
+        unique_urls = df.loc[not_found, 'url'].groupby(base['ip'][not_found]).nunique()
+        
+        return {
+            'ip_404': np.bincount(base['ip'][not_found], weights=base['weight'][not_found],
+                                  minlength=ip_count).astype(np.int64),
+            'ip_404_unique': unique_urls.reindex(range(ip_count), fill_value=0).to_numpy(dtype=np.int64)
+        }
     
     def _detect_injection_patterns(self, df: pd.DataFrame) -> List[Dict]:
         """Detect potential injection attack patterns"""
         anomalies = []
         
-        # Common injection patterns
-        injection_patterns = [
-            (r'union\s+select', 'SQL injection'),
-            (r'<script', 'XSS attempt'),
-            (r'javascript:', 'JavaScript injection'),
-            (r'\.\./.*\.\./.*\.\./', 'Path traversal'),
-            (r'exec\s*\(', 'Code execution attempt'),
-            (r'eval\s*\(', 'Code evaluation attempt')
-        ]
-        
-        for pattern, attack_type in injection_patterns:
-            matches = df[df['url'].str.contains(pattern, case=False, na=False)]
+        for regex, pattern, attack_type in INJECTION_RULES:
+            matches = df[df['url'].str.contains(regex, na=False)]
             
             for _, entry in matches.iterrows():
                 anomalies.append({
@@ -440,92 +418,47 @@ class AnomalyDetectionService:
         
         return anomalies
     
-    def _detect_error_patterns(self, df: pd.DataFrame) -> List[Dict]:
-        """Detect unusual error rate patterns"""
-        anomalies = []
+    def _score_error_rate(self, df: pd.DataFrame, base: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Count requests with a status code and error responses per IP"""
+        ip_count = len(base['ips'])
+        has_ip = base['ip'] >= 0
+        with_status = has_ip & (base['status'] >= 0)
+        errors = has_ip & (base['status'] >= 400)
         
-        # Group by IP and calculate error rates
-        ip_stats = df.groupby('src_ip').agg({
-            'status_code': ['count', lambda x: (x >= 400).sum()]
-        }).reset_index()
-        
-        ip_stats.columns = ['src_ip', 'total_requests', 'error_requests']
-        ip_stats['error_rate'] = ip_stats['error_requests'] / ip_stats['total_requests']
+        return {
+            'ip_status_total': np.bincount(base['ip'][with_status], weights=base['weight'][with_status],
+                                           minlength=ip_count).astype(np.int64),
+            'ip_errors': np.bincount(base['ip'][errors], weights=base['weight'][errors],
+                                     minlength=ip_count).astype(np.int64)
+        }
+    
+    @staticmethod
+    def _weighted_share(values: pd.Series, weight: pd.Series) -> pd.Series:
+        """Share of lines per distinct value (``value_counts(normalize=True)`` by weight)"""
+        totals = weight.groupby(values).sum()
+        return totals / totals.sum()
+    
+    @staticmethod
+    def _weighted_zscore(values: pd.Series, weight: pd.Series, groups: Optional[pd.Series] = None) -> pd.Series:
+        """Absolute z-score against the (per group) weighted mean and std; 0 where undefined"""
+        if groups is None:
+            groups = pd.Series(0, index=values.index)
+        weight = weight.where(values.notna(), 0)
+        filled = values.fillna(0)
         
-        # Find IPs with unusually high error rates
-        high_error_ips = ip_stats[
-            (ip_stats['error_rate'] > 0.5) & 
-            (ip_stats['total_requests'] >= 5)
-        ]
+        def group_sum(series: pd.Series) -> pd.Series:
+            return series.groupby(groups).transform('sum')
         
-        for _, ip_stat in high_error_ips.iterrows():
-            ip_entries = df[df['src_ip'] == ip_stat['src_ip']]
-            error_entries = ip_entries[ip_entries['status_code'] >= 400]
-            
-            confidence = min(ip_stat['error_rate'], 1.0)
-            
-            for _, entry in error_entries.iterrows():
-                anomalies.append({
-                    'entry_id': entry['id'],
-                    'anomaly_type': 'pattern',
-                    'reason': f"High error rate: {ip_stat['error_rate']:.1%} errors from {ip_stat['src_ip']} ({ip_stat['error_requests']}/{ip_stat['total_requests']})",
-                    'confidence': confidence,
-                    'severity': self._calculate_severity(confidence),
-                    'model_used': 'statistical_analysis',
-                    'feature_contributions': {
-                        'error_rate': float(ip_stat['error_rate']),
-                        'total_requests': int(ip_stat['total_requests']),
-                        'error_requests': int(ip_stat['error_requests'])
-                    }
-                })
-        
-        return anomalies
+        total = group_sum(weight)
+        mean = group_sum(filled * weight) / total
+        std = np.sqrt(group_sum((filled - mean) ** 2 * weight) / (total - 1))
+        zscore = ((values - mean) / std).abs()
+        return zscore.where((total > 1) & (std > 0), 0).fillna(0)
     
     def _calculate_severity(self, confidence: float, additional_factor: Optional[float] = None) -> str:
         """Calculate severity level based on confidence and optional additional factors"""
-        if additional_factor is not None:
-            # Incorporate additional factors (like request count)
-            severity_score = confidence * 0.7 + min(additional_factor / 100, 0.3)
-        else:
-            severity_score = confidence
-        
-        if severity_score >= 0.8:
-            return 'critical'
-        elif severity_score >= 0.6:
-            return 'high'
-        elif severity_score >= 0.4:
-            return 'medium'
-        else:
-            return 'low'
+        return calculate_severity(confidence, additional_factor)
     
-    def _store_anomalies(self, log_id: str, anomalies: List[Dict]):
-        """Store detected anomalies in the database"""
-        try:
-            anomaly_objects = []
-            
-            for anomaly_data in anomalies:
-                anomaly = Anomaly(
-                    log_id=log_id,
-                    entry_id=anomaly_data['entry_id'],
-                    anomaly_type=anomaly_data['anomaly_type'],
-                    reason=anomaly_data['reason'],
-                    confidence=anomaly_data['confidence'],
-                    severity=anomaly_data['severity'],
-                    model_used=anomaly_data['model_used'],
-                    feature_contributions=anomaly_data.get('feature_contributions'),
-                    context_window_start=anomaly_data.get('context_window_start'),
-                    context_window_end=anomaly_data.get('context_window_end'),
-                    related_entries_count=anomaly_data.get('related_entries_count')
-                )
-                anomaly_objects.append(anomaly)
-            
-            # Batch insert
-            db.session.bulk_save_objects(anomaly_objects)
-            db.session.commit()
-            
-            logger.info(f"Stored {len(anomaly_objects)} anomalies for log {log_id}")
-            
-        except Exception as e:
-            logger.error(f"Error storing anomalies: {str(e)}")
-            db.session.rollback()
-            raise 
\ No newline at end of file
+    def _store_anomalies(self, log_id: str, anomalies: List[Dict], detectors: Optional[List[str]] = None):
+        """Store detected anomalies, replacing earlier results of the same detectors"""
+        store_anomalies(log_id, anomalies, detectors)
@@ -0,0 +1,122 @@
+import os
+from typing import Dict, Optional
+import logging
+
+from sqlalchemy import text
+
+from app import db
+from app.services.cache import cache_get_json, cache_set_json, cache_delete
+
+logger = logging.getLogger(__name__)
+
+
+# All statistics are computed from a single materialized scan of the log's
+# anomalies; confidence buckets use width_bucket with FILTER clauses instead
+# of one COUNT per range. The log's owner and status come back with them so
+# callers can check ownership without a separate lookup.
+ANOMALY_STATS_SQL = text("""
+    WITH lf AS (
+        SELECT id, user_id, status FROM log_files WHERE id = :log_id
+    ),
+    a AS MATERIALIZED (
+        SELECT entry_id, anomaly_type, severity, confidence, detected_at
+        FROM anomalies
+        WHERE log_id = (SELECT id FROM lf)
+    )
+    SELECT
+        (SELECT user_id FROM lf) AS user_id,
+        (SELECT status FROM lf) AS status,
+        (SELECT count(*) FROM a) AS total_anomalies,
+        (SELECT coalesce(json_object_agg(anomaly_type, c), '{}'::json)
+           FROM (SELECT anomaly_type, count(*) AS c FROM a GROUP BY anomaly_type) t) AS by_type,
+        (SELECT coalesce(json_object_agg(severity, c), '{}'::json)
+           FROM (SELECT severity, count(*) AS c FROM a GROUP BY severity) t) AS by_severity,
+        (SELECT coalesce(json_agg(json_build_object('timestamp', hour, 'count', c) ORDER BY hour), '[]'::json)
+           FROM (SELECT date_trunc('hour', detected_at) AS hour, count(*) AS c FROM a GROUP BY 1) t) AS timeline,
+        (SELECT coalesce(json_agg(json_build_object('ip', ip, 'anomaly_count', c) ORDER BY c DESC), '[]'::json)
+           FROM (SELECT coalesce(host(e.src_ip), 'Unknown') AS ip, count(*) AS c
+                   FROM a JOIN log_entries e ON e.id = a.entry_id
+                  GROUP BY e.src_ip
+                  ORDER BY c DESC
+                  LIMIT 10) t) AS top_ips,
+        (SELECT json_build_object(
+                    'Very Low', count(*) FILTER (WHERE b = 1),
+                    'Low', count(*) FILTER (WHERE b = 2),
+                    'Medium', count(*) FILTER (WHERE b = 3),
+                    'High', count(*) FILTER (WHERE b = 4),
+                    'Very High', count(*) FILTER (WHERE b = 5))
+           FROM (SELECT least(width_bucket(confidence, 0.0, 1.0, 5), 5) AS b FROM a) t) AS confidence_distribution
+""")
+
+
+class AnomalyStatsService:
+    """Anomaly statistics for a log file, cached until detection reruns"""
+
+    CACHE_KEY = 'anomaly_stats:{log_id}'
+
+    # Keys of calculated statistics that are not part of the API payload
+    INTERNAL_KEYS = ('error', 'user_id', 'status')
+
+    def __init__(self):
+        self.cache_ttl = int(os.getenv('ANOMALY_STATS_CACHE_TTL', 86400))
+
+    def get_owned_stats(self, log_id: str, user_id: str) -> Optional[Dict]:
+        """Statistics and status of a log if ``user_id`` owns it, else None
+
+        Cached statistics keep the owner's id, so hits are checked without a
+        query. Only logs whose detection has finished are cached, otherwise a
+        read racing the detector could pin stale numbers. Returns the
+        payload under ``stats`` and the log's status under ``status``.
+        """
+        cache_key = self.CACHE_KEY.format(log_id=log_id)
+
+        stats = cache_get_json(cache_key)
+        if stats is None or 'user_id' not in stats:
+            stats = self.calculate_stats(log_id)
+            if stats['status'] == 'ready' and 'error' not in stats:
+                cache_set_json(cache_key, stats, ttl=self.cache_ttl)
+
+        if stats['user_id'] != str(user_id):
+            if 'error' in stats:
+                raise RuntimeError(stats['error'])
+            return None
+
+        return {
+            'status': stats['status'],
+            'stats': {key: value for key, value in stats.items() if key not in self.INTERNAL_KEYS}
+        }
+
+    def calculate_stats(self, log_id: str) -> Dict:
+        """Calculate anomaly statistics, owner and status of a log file in one query"""
+        try:
+            row = db.session.execute(ANOMALY_STATS_SQL, {'log_id': str(log_id)}).mappings().one()
+
+            return {
+                'user_id': str(row['user_id']) if row['user_id'] is not None else None,
+                'status': row['status'],
+                'total_anomalies': row['total_anomalies'],
+                'by_type': row['by_type'],
+                'by_severity': row['by_severity'],
+                'timeline': row['timeline'],
+                'top_ips': row['top_ips'],
+                'confidence_distribution': row['confidence_distribution']
+            }
+
+        except Exception as e:
+            logger.error(f"Stats calculation error: {str(e)}")
+            db.session.rollback()
+            return {
+                'user_id': None,
+                'status': None,
+                'total_anomalies': 0,
+                'by_type': {},
+                'by_severity': {},
+                'timeline': [],
+                'top_ips': [],
+                'confidence_distribution': {},
+                'error': str(e)
+            }
+
+    def invalidate(self, log_id: str):
+        """Drop cached statistics after anomalies were (re)written"""
+        cache_delete(self.CACHE_KEY.format(log_id=log_id))
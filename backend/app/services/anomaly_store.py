@@ -0,0 +1,74 @@
+import logging
+from typing import Dict, List, Optional
+
+from app import db
+from app.models import LogFile, Anomaly
+from app.services.anomaly_stats import AnomalyStatsService
+from app.services.detection_config import DETECTORS, DETECTOR_SIGNATURES
+from app.services.response_cache import bump_log_version
+
+logger = logging.getLogger(__name__)
+
+
+def store_anomalies(log_id: str, anomalies: List[Dict], detectors: Optional[List[str]] = None) -> int:
+    """Store detected anomalies, replacing earlier results of the same detectors
+
+    The new rows are inserted and the previous rows of the selected
+    detectors deleted in a single transaction, so readers see either the
+    old or the new result set, never a mix or an empty one. Kept free of
+    pandas/sklearn so the API can apply re-tuned results directly.
+    """
+    try:
+        # Serialize swaps for this log, then treat every row that exists
+        # now as the "old" set; everything inserted below is newer
+        db.session.query(LogFile.id).filter(LogFile.id == log_id).with_for_update().one()
+        watermark = db.session.query(db.func.max(Anomaly.id)).filter(Anomaly.log_id == log_id).scalar()
+
+        # Results now differ from a plain processing run until process_log_file
+        # records its pipeline again, so duplicate uploads don't reuse them
+        db.session.query(LogFile).filter(LogFile.id == log_id)\
+            .update({LogFile.pipeline_key: None}, synchronize_session=False)
+
+        anomaly_objects = []
+
+        for anomaly_data in anomalies:
+            anomaly = Anomaly(
+                log_id=log_id,
+                entry_id=anomaly_data['entry_id'],
+                anomaly_type=anomaly_data['anomaly_type'],
+                reason=anomaly_data['reason'],
+                confidence=anomaly_data['confidence'],
+                severity=anomaly_data['severity'],
+                model_used=anomaly_data['model_used'],
+                feature_contributions=anomaly_data.get('feature_contributions'),
+                context_window_start=anomaly_data.get('context_window_start'),
+                context_window_end=anomaly_data.get('context_window_end'),
+                related_entries_count=anomaly_data.get('related_entries_count')
+            )
+            anomaly_objects.append(anomaly)
+
+        # Batch insert
+        db.session.bulk_save_objects(anomaly_objects)
+
+        replaced = 0
+        if watermark is not None:
+            signatures = {DETECTOR_SIGNATURES[name] for name in (detectors or DETECTORS)}
+            replaced = Anomaly.query.filter(
+                Anomaly.log_id == log_id,
+                Anomaly.id <= watermark,
+                db.tuple_(Anomaly.anomaly_type, Anomaly.model_used).in_(signatures)
+            ).delete(synchronize_session=False)
+
+        db.session.commit()
+
+        # Detection (re)ran, so cached statistics and responses are stale
+        AnomalyStatsService().invalidate(log_id)
+        bump_log_version(log_id)
+
+        logger.info(f"Stored {len(anomaly_objects)} anomalies for log {log_id} (replaced {replaced})")
+        return len(anomaly_objects)
+
+    except Exception as e:
+        logger.error(f"Error storing anomalies: {str(e)}")
+        db.session.rollback()
+        raise
@@ -0,0 +1,46 @@
+import json
+import logging
+from typing import Any, Optional
+
+import redis
+
+from app import BROKER_URL
+
+logger = logging.getLogger(__name__)
+
+# Shared Redis client (same instance Celery uses as broker/backend)
+_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    """Return the process-wide Redis client, creating it on first use"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(BROKER_URL, socket_timeout=2, socket_connect_timeout=2)
+    return _redis_client
+
+
+def cache_get_json(key: str) -> Optional[Any]:
+    """Read a JSON value from the cache; cache failures count as a miss"""
+    try:
+        raw = get_redis().get(key)
+        return json.loads(raw) if raw is not None else None
+    except Exception as e:
+        logger.warning(f"Cache read failed for {key}: {str(e)}")
+        return None
+
+
+def cache_set_json(key: str, value: Any, ttl: Optional[int] = None):
+    """Write a JSON value to the cache, ignoring cache failures"""
+    try:
+        get_redis().set(key, json.dumps(value, default=str), ex=ttl)
+    except Exception as e:
+        logger.warning(f"Cache write failed for {key}: {str(e)}")
+
+
+def cache_delete(*keys: str):
+    """Remove keys from the cache, ignoring cache failures"""
+    try:
+        get_redis().delete(*keys)
+    except Exception as e:
+        logger.warning(f"Cache delete failed for {keys}: {str(e)}")
@@ -0,0 +1,80 @@
+import os
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# off: one entry per line; consecutive: runs of identical lines;
+# window: identical lines anywhere within the window
+COLLAPSE_MODES = ('off', 'consecutive', 'window')
+
+# Everything that makes two parsed lines the same request except when it happened
+COLLAPSE_KEY_FIELDS = (
+    'src_ip', 'dest_host', 'method', 'url', 'status_code', 'response_size',
+    'user_agent', 'referer'
+)
+
+
+def resolve_collapse_mode(mode: Optional[str] = None) -> str:
+    """Requested collapse mode, falling back to ``INGEST_COLLAPSE``"""
+    mode = (mode or os.getenv('INGEST_COLLAPSE', 'off')).strip().lower()
+    if mode not in COLLAPSE_MODES:
+        raise ValueError(f"Unknown collapse mode: {mode}")
+    return mode
+
+
+def _collapse_key(entry: Dict) -> tuple:
+    parsed_fields = entry.get('parsed_fields')
+    return tuple(entry.get(field) for field in COLLAPSE_KEY_FIELDS) + (
+        orjson.dumps(parsed_fields, option=orjson.OPT_SORT_KEYS) if parsed_fields else None,
+    )
+
+
+def collapse_duplicates(entries: List[Dict], mode: str = 'off',
+                        window_seconds: Optional[float] = None) -> List[Dict]:
+    """Merge duplicate parsed lines into one entry with a ``repeat_count``
+
+    Lines are duplicates when all fields but the timestamp match. The first
+    line is kept (timestamp, raw_log, line_number) and ``last_timestamp``
+    records the latest duplicate. A merged entry never spans more than
+    ``window_seconds`` (``INGEST_COLLAPSE_WINDOW``, default 60) from its
+    first line, so per-minute rollups stay close to the uncollapsed ones.
+    """
+    if mode == 'off' or not entries:
+        return entries
+    if window_seconds is None:
+        window_seconds = float(os.getenv('INGEST_COLLAPSE_WINDOW', 60))
+    window = timedelta(seconds=window_seconds)
+
+    collapsed = []
+    open_entries = {}  # key -> entry still accepting duplicates (window mode)
+    previous_key = None
+
+    for entry in entries:
+        key = _collapse_key(entry)
+        if mode == 'window':
+            target = open_entries.get(key)
+        else:
+            target = collapsed[-1] if key == previous_key else None
+
+        timestamp = entry['timestamp']
+        if target is not None and abs(timestamp - target['timestamp']) <= window:
+            target['repeat_count'] = target.get('repeat_count', 1) + 1
+            target['last_timestamp'] = max(target.get('last_timestamp', target['timestamp']), timestamp)
+            continue
+
+        collapsed.append(entry)
+        previous_key = key
+        if mode == 'window':
+            open_entries[key] = entry
+
+    logger.info(f"Collapsed {len(entries)} lines into {len(collapsed)} entries ({mode}, {window_seconds:g}s window)")
+    return collapsed
+
+
+def entry_weight(entry: Dict) -> int:
+    """Number of log lines a parsed entry stands for"""
+    return entry.get('repeat_count', 1)
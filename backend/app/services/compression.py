@@ -0,0 +1,81 @@
+import os
+import gzip
+import logging
+
+from flask import Flask, request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = ('application/json',)
+
+
+def negotiate_encoding(accept_encoding) -> str:
+    """Best content coding the client accepts: br, then gzip, else identity"""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return 'identity'
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with levels tuned for per-request latency, not size"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=int(os.getenv('BROTLI_QUALITY', 4)))
+    return gzip.compress(body, compresslevel=int(os.getenv('GZIP_LEVEL', 5)))
+
+
+def response_encoding(body_size: int) -> str:
+    """Content coding a JSON body of ``body_size`` bytes is sent with in this request"""
+    if body_size < int(os.getenv('COMPRESS_MIN_BYTES', 1024)):
+        return 'identity'
+    return negotiate_encoding(request.accept_encodings)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Strong ETag of one content coding of a body: ``<etag>-br``, ``<etag>-gzip``"""
+    return etag if encoding == 'identity' else f'{etag}-{encoding}'
+
+
+def base_etag(etag: str) -> str:
+    """The body's ETag without the content coding suffix"""
+    for encoding in ('br', 'gzip'):
+        if etag.endswith(f'-{encoding}'):
+            return etag[:-len(encoding) - 1]
+    return etag
+
+
+def init_compression(app: Flask):
+    """Compress JSON API responses the client can decode (Accept-Encoding)
+
+    Streamed responses (exports, progress events) and files are left alone.
+    A strong ETag gets the coding appended (``encoded_etag``) because the
+    bytes differ per encoding; the response cache matches on the base.
+    """
+    @app.after_request
+    def _compress_response(response):
+        if (response.status_code != 200
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = response_encoding(len(body))
+        if encoding == 'identity':
+            return response
+
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(encoded_etag(etag, encoding))
+        return response
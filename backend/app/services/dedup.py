@@ -0,0 +1,177 @@
+import os
+import shutil
+import hashlib
+import logging
+from typing import BinaryIO, Optional, Tuple
+
+from app import db
+from app.models import LogFile, LogEntry, Anomaly, LogRollup
+from app.services.detection_config import DETECTOR_VERSION
+from app.services.raw_store import block_store_path, is_block_store
+from app.services.anomaly_stats import AnomalyStatsService
+from app.services.response_cache import bump_log_version
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Per-transaction map from a source log's entry ids to freshly drawn ids,
+# so cloned anomalies can point at the cloned entries
+ENTRY_ID_MAP = db.table('entry_id_map', db.column('old_id'), db.column('new_id'))
+
+
+def save_upload(stream: BinaryIO, path: str) -> Tuple[int, str]:
+    """Write an upload to disk while hashing it; returns its size and sha256 hex digest"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def pipeline_key(collapse: str) -> str:
+    """What a log's stored results depend on besides its content and format"""
+    return f'detectors-v{DETECTOR_VERSION}:collapse-{collapse}'
+
+
+def find_processed_duplicate(log_file: LogFile, key: str, log_format: Optional[str] = None) -> Optional[LogFile]:
+    """Latest ready log of the same user with identical content and pipeline
+
+    Only the uploader's own logs are considered, so reuse never reveals
+    what other users uploaded.
+    """
+    if not log_file.content_hash:
+        return None
+
+    query = LogFile.query.filter(
+        LogFile.user_id == log_file.user_id,
+        LogFile.content_hash == log_file.content_hash,
+        LogFile.pipeline_key == key,
+        LogFile.status == 'ready',
+        LogFile.id != log_file.id
+    )
+    if log_format is not None:
+        query = query.filter(LogFile.log_format == log_format)
+    return query.order_by(LogFile.processed_at.desc()).first()
+
+
+def _copy_columns(model, *excluded):
+    return [column for column in model.__table__.columns if column.name not in excluded]
+
+
+def _map_entry_ids(source_id: str):
+    """Fill ``entry_id_map`` with new sequence ids for a log's entries, in id order"""
+    db.session.execute(db.text(
+        "CREATE TEMP TABLE entry_id_map ON COMMIT DROP AS "
+        "SELECT old_id, nextval(pg_get_serial_sequence('log_entries', 'id')) AS new_id "
+        "FROM (SELECT id AS old_id FROM log_entries WHERE log_id = :source_id ORDER BY id) AS source_entries"
+    ), {'source_id': source_id})
+    # Temp tables get no autovacuum statistics; the joins below need them
+    db.session.execute(db.text("ALTER TABLE entry_id_map ADD PRIMARY KEY (old_id)"))
+    db.session.execute(db.text("ANALYZE entry_id_map"))
+
+
+def clone_results(source: LogFile, target: LogFile) -> int:
+    """Copy the entries, anomalies and rollups of a processed log to another log
+
+    Rows are copied inside Postgres (INSERT ... SELECT) without going
+    through Python. Entry ids are drawn from the sequence in source id
+    order, so the clone orders like the original. Replaces any results the
+    target already had and commits; returns the number of entries copied.
+    Cached detector scores are copied with the new entry ids, so the clone
+    can be re-tuned like the original.
+    """
+    source_id, target_id = str(source.id), str(target.id)
+    try:
+        Anomaly.query.filter_by(log_id=target_id).delete(synchronize_session=False)
+        LogEntry.query.filter_by(log_id=target_id).delete(synchronize_session=False)
+        LogRollup.query.filter_by(log_id=target_id).delete(synchronize_session=False)
+
+        _map_entry_ids(source_id)
+        clone_id = db.cast(db.literal(target.id, LogFile.id.type), LogFile.id.type)
+
+        entry_columns = _copy_columns(LogEntry, 'id', 'log_id')
+        copied = db.session.execute(
+            db.insert(LogEntry.__table__).from_select(
+                ['id', 'log_id'] + [column.name for column in entry_columns],
+                db.select(ENTRY_ID_MAP.c.new_id, clone_id, *entry_columns)
+                .select_from(LogEntry.__table__.join(ENTRY_ID_MAP, ENTRY_ID_MAP.c.old_id == LogEntry.id))
+            )
+        ).rowcount
+
+        anomaly_columns = _copy_columns(Anomaly, 'id', 'log_id', 'entry_id')
+        db.session.execute(
+            db.insert(Anomaly.__table__).from_select(
+                ['log_id', 'entry_id'] + [column.name for column in anomaly_columns],
+                db.select(clone_id, ENTRY_ID_MAP.c.new_id, *anomaly_columns)
+                .select_from(Anomaly.__table__.join(ENTRY_ID_MAP, ENTRY_ID_MAP.c.old_id == Anomaly.entry_id))
+                .where(Anomaly.log_id == source_id)
+            )
+        )
+
+        rollup_columns = _copy_columns(LogRollup, 'id', 'log_id')
+        db.session.execute(
+            db.insert(LogRollup.__table__).from_select(
+                ['log_id'] + [column.name for column in rollup_columns],
+                db.select(clone_id, *rollup_columns).where(LogRollup.log_id == source_id)
+            )
+        )
+
+        # The map is dropped with the transaction
+        id_map = db.session.execute(
+            db.select(ENTRY_ID_MAP.c.old_id, ENTRY_ID_MAP.c.new_id).order_by(ENTRY_ID_MAP.c.old_id)
+        ).all()
+
+        db.session.commit()
+
+        _copy_scores(source_id, target_id, id_map)
+
+        # The target's cached statistics and responses describe its old results
+        AnomalyStatsService().invalidate(target_id)
+        bump_log_version(target_id)
+
+        logger.info(f"Cloned {copied} entries of log {source_id} into log {target_id}")
+        return copied
+
+    except Exception as e:
+        logger.error(f"Error cloning results of log {source_id}: {str(e)}")
+        db.session.rollback()
+        raise
+
+
+def _copy_scores(source_id: str, target_id: str, id_map):
+    """Copy a log's cached detector scores to its clone; the clone works without them"""
+    # numpy only, loaded on first use so API cold start stays lean
+    import numpy as np
+    from app.services.score_cache import DetectorScoreCache
+
+    try:
+        old_ids = np.array([old_id for old_id, _ in id_map], dtype=np.int64)
+        new_ids = np.array([new_id for _, new_id in id_map], dtype=np.int64)
+        if not DetectorScoreCache(source_id).copy_to(DetectorScoreCache(target_id), old_ids, new_ids):
+            logger.info(f"No detector scores to copy from log {source_id}; log {target_id} needs re-analysis to re-tune")
+    except Exception as e:
+        logger.warning(f"Could not copy detector scores of log {source_id} to log {target_id}: {str(e)}")
+
+
+def link_raw_store(source: LogFile, target: LogFile) -> Optional[str]:
+    """Share the source's block store with a clone whose entries point into it
+
+    Hard-linked when possible, copied otherwise. Returns the clone's block
+    store path, or None when the source keeps its lines inline.
+    """
+    if not is_block_store(source.file_path):
+        return None
+
+    path = block_store_path(str(target.id))
+    try:
+        os.link(source.file_path, path)
+    except OSError:
+        shutil.copyfile(source.file_path, path)
+    return path
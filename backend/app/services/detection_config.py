@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional, Tuple
+
+# Bump whenever detection results change for the same entries; processed
+# logs only stand in for duplicate uploads of the same version
+DETECTOR_VERSION = 1
+
+# Detectors that can be run (or rerun) individually
+DETECTORS = ('volume', 'behavioral', 'temporal', 'scanning', 'injection', 'error_rate')
+
+# Detectors whose results depend on thresholds (and can be re-tuned from
+# cached scores); injection is a fixed rule pack
+THRESHOLD_DETECTORS = ('volume', 'behavioral', 'temporal', 'scanning', 'error_rate')
+
+# (anomaly_type, model_used) written by each detector, used to replace
+# exactly one detector's results on re-analysis
+DETECTOR_SIGNATURES = {
+    'volume': ('volume', 'isolation_forest'),
+    'behavioral': ('behavioral', 'isolation_forest'),
+    'temporal': ('temporal', 'statistical_analysis'),
+    'scanning': ('pattern', 'pattern_analysis'),
+    'injection': ('pattern', 'pattern_matching'),
+    'error_rate': ('pattern', 'statistical_analysis')
+}
+
+# Tunable detector thresholds
+DEFAULT_THRESHOLDS = {
+    'volume_contamination': 0.05,      # share of (IP, 5 min) windows flagged
+    'behavioral_contamination': 0.05,  # share of requests flagged
+    'temporal_z_score': 2.0,           # per-IP hourly deviation
+    'temporal_min_requests': 5,        # skip IPs with fewer requests
+    'scanning_404_count': 10,          # 404s from one IP that suggest scanning
+    'scanning_unique_ratio': 0.8,      # share of those 404s on distinct URLs
+    'error_rate': 0.5,                 # per-IP error rate
+    'error_min_requests': 5            # skip IPs with fewer requests
+}
+
+
+def resolve_detection_config(detectors: Optional[List[str]] = None,
+                             thresholds: Optional[Dict] = None) -> Tuple[List[str], Dict]:
+    """Validate detector selection and threshold overrides, filling defaults"""
+    detectors = list(detectors) if detectors else list(DETECTORS)
+    unknown = [name for name in detectors if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Unknown detectors: {', '.join(unknown)}")
+
+    resolved = dict(DEFAULT_THRESHOLDS)
+    for key, value in (thresholds or {}).items():
+        if key not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"Unknown threshold: {key}")
+        try:
+            resolved[key] = type(DEFAULT_THRESHOLDS[key])(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {key}: {value}")
+        if resolved[key] < 0:
+            raise ValueError(f"{key} must not be negative")
+
+    for key in ('volume_contamination', 'behavioral_contamination'):
+        if not 0 < resolved[key] <= 0.5:
+            raise ValueError(f"{key} must be in (0, 0.5]")
+
+    return detectors, resolved
+
+
+def calculate_severity(confidence: float, additional_factor: Optional[float] = None) -> str:
+    """Calculate severity level based on confidence and optional additional factors"""
+    if additional_factor is not None:
+        # Incorporate additional factors (like request count)
+        severity_score = confidence * 0.7 + min(additional_factor / 100, 0.3)
+    else:
+        severity_score = confidence
+    
+    if severity_score >= 0.8:
+        return 'critical'
+    elif severity_score >= 0.6:
+        return 'high'
+    elif severity_score >= 0.4:
+        return 'medium'
+    else:
+        return 'low'
@@ -0,0 +1,164 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from app.models import DestHost, HttpMethod, UserAgent, Referer
+
+logger = logging.getLogger(__name__)
+
+# Entry fields stored as ids into a dimension table (LogEntry.<name>_id)
+DIMENSION_MODELS = {
+    'dest_host': DestHost,
+    'method': HttpMethod,
+    'user_agent': UserAgent,
+    'referer': Referer
+}
+
+
+def value_digest(value: str) -> bytes:
+    """Unique key of a dimension value (``sha256(convert_to(value, 'UTF8'))`` in SQL)"""
+    return hashlib.sha256(value.encode('utf-8')).digest()
+
+
+class _DictionaryCache:
+    """Thread-safe LRU of interned values in both directions, shared by a process
+
+    Dimension rows are never updated or deleted, so entries can't go stale.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._ids: OrderedDict = OrderedDict()     # (name, value) -> id
+        self._values: OrderedDict = OrderedDict()  # (name, id) -> value
+        self._lock = threading.Lock()
+
+    def _get(self, data: OrderedDict, key):
+        with self._lock:
+            found = data.get(key)
+            if found is not None:
+                data.move_to_end(key)
+            return found
+
+    def get_id(self, name: str, value: str) -> Optional[int]:
+        return self._get(self._ids, (name, value))
+
+    def get_value(self, name: str, value_id: int) -> Optional[str]:
+        return self._get(self._values, (name, value_id))
+
+    def set(self, name: str, value_id: int, value: str):
+        with self._lock:
+            for data, key, item in ((self._ids, (name, value), value_id),
+                                    (self._values, (name, value_id), value)):
+                data[key] = item
+                data.move_to_end(key)
+                while len(data) > self.maxsize:
+                    data.popitem(last=False)
+
+
+_cache = _DictionaryCache(int(os.getenv('DIMENSION_CACHE_SIZE', 100000)))
+
+
+def intern_values(name: str, values: Iterable[str]) -> Dict[str, int]:
+    """Ids of dimension values, inserting the ones not seen before
+
+    New values are upserted (concurrent ingests may race on the same value)
+    and committed right away on a connection of their own, so cached ids
+    always refer to stored rows and the caller's transaction is left alone.
+    """
+    model = DIMENSION_MODELS[name]
+    ids = {}
+    missing = {}
+    for value in set(values):
+        value_id = _cache.get_id(name, value)
+        if value_id is None:
+            missing[value_digest(value)] = value
+        else:
+            ids[value] = value_id
+
+    if missing:
+        with db.engine.begin() as connection:
+            connection.execute(
+                insert(model.__table__)
+                .values([{'value': value, 'digest': digest} for digest, value in missing.items()])
+                .on_conflict_do_nothing()
+            )
+            rows = connection.execute(
+                db.select(model.id, model.digest).where(model.digest.in_(list(missing)))
+            ).all()
+        logger.debug(f"Interned {len(missing)} new {name} values")
+
+        for value_id, digest in rows:
+            value = missing[bytes(digest)]
+            ids[value] = value_id
+            _cache.set(name, value_id, value)
+
+    return ids
+
+
+def encode_dimensions(entries: List[Dict]):
+    """Set ``<name>_id`` on parsed entries for every dimension field"""
+    for name in DIMENSION_MODELS:
+        ids = intern_values(name, (entry[name] for entry in entries if entry.get(name) is not None))
+        for entry in entries:
+            value = entry.get(name)
+            entry[f'{name}_id'] = ids[value] if value is not None else None
+
+
+def lookup_values(name: str, value_ids: Iterable[int]) -> Dict[int, str]:
+    """Values of dimension ids; ids missing from the cache take one IN query"""
+    values = {}
+    missing = set()
+    for value_id in value_ids:
+        if value_id is None:
+            continue
+        value = _cache.get_value(name, value_id)
+        if value is None:
+            missing.add(value_id)
+        else:
+            values[value_id] = value
+
+    if missing:
+        model = DIMENSION_MODELS[name]
+        for value_id, value in db.session.execute(
+                db.select(model.id, model.value).where(model.id.in_(missing))):
+            values[value_id] = value
+            _cache.set(name, value_id, value)
+
+    return values
+
+
+def lookup_value(name: str, value_id: Optional[int]) -> Optional[str]:
+    """Value of a single dimension id"""
+    if value_id is None:
+        return None
+    return lookup_values(name, (value_id,)).get(value_id)
+
+
+def decode_dimensions(entries: List[Dict]):
+    """Replace ``<name>_id`` keys of entry dicts by their values, one lookup per dimension"""
+    for name in DIMENSION_MODELS:
+        key = f'{name}_id'
+        if not entries or key not in entries[0]:
+            continue
+        values = lookup_values(name, {entry[key] for entry in entries})
+        for entry in entries:
+            entry[name] = values.get(entry.pop(key))
+
+
+def decode_rows(rows: Sequence[Sequence], positions: Dict[int, str]) -> List[tuple]:
+    """Result rows with the dimension ids at ``positions`` (index -> name) decoded"""
+    rows = [tuple(row) for row in rows]
+    lookups = {
+        index: lookup_values(name, {row[index] for row in rows})
+        for index, name in positions.items()
+    }
+    return [
+        tuple(lookups[index].get(item) if index in lookups else item for index, item in enumerate(row))
+        for row in rows
+    ]
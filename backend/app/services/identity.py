@@ -0,0 +1,218 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, defer
+
+from app.models import User, LogFile
+from app.services.cache import cache_get_json, cache_set_json, cache_delete
+
+logger = logging.getLogger(__name__)
+
+USER_KEY = 'identity:user:{user_id}'
+LOG_KEY = 'identity:log:{log_id}'
+
+# Only logs that finished processing are cached; their metadata no longer
+# changes except through deletion or an explicit update (both invalidate)
+CACHEABLE_LOG_STATUSES = ('ready', 'error')
+
+_MISSING = object()
+
+
+class LocalTTLCache:
+    """Thread-safe in-process LRU whose entries also expire after ``ttl`` seconds
+
+    Other processes can't reach this cache when they invalidate a key, so
+    the TTL bounds how long a worker may serve a stale entry.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cache = LocalTTLCache(
+    maxsize=int(os.getenv('IDENTITY_LOCAL_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('IDENTITY_LOCAL_CACHE_TTL', 5))
+)
+
+
+class LogFileSnapshot:
+    """Cached ownership and metadata of a processed log
+
+    Stands in for a LogFile in routes that only need its owner, status,
+    filename, size or ``to_dict(include_summary=False)``.
+    """
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.id = data['id']
+        self.user_id = data['user_id']
+        self.status = data['status']
+        self.original_filename = data['filename']
+        self.file_size = data['file_size']
+
+    @classmethod
+    def from_model(cls, log_file: LogFile) -> 'LogFileSnapshot':
+        return cls(dict(log_file.to_dict(include_summary=False), user_id=str(log_file.user_id)))
+
+    def to_dict(self, include_summary: bool = False) -> Dict:
+        return {key: value for key, value in self.data.items() if key != 'user_id'}
+
+
+def _cached(key: str, load: Callable[[], Optional[Dict]], cacheable: Callable[[Optional[Dict]], bool]):
+    """Read through the request, in-process and Redis caches, then the database"""
+    memo = g.setdefault('identity_cache', {}) if has_request_context() else {}
+    if key in memo:
+        return memo[key]
+
+    value = _local_cache.get(key)
+    if value is _MISSING:
+        value = cache_get_json(key)
+        if value is None:
+            value = load()
+            if cacheable(value):
+                cache_set_json(key, value, ttl=int(os.getenv('IDENTITY_CACHE_TTL', 60)))
+        if cacheable(value):
+            _local_cache.set(key, value)
+
+    memo[key] = value
+    return value
+
+
+def get_user_identity(user_id: str) -> Optional[Dict]:
+    """``User.to_dict()`` of a user, or None if it doesn't exist"""
+    def load():
+        user = User.query.get(user_id)
+        # Missing users are cached as {} so unknown tokens don't hit the database
+        return user.to_dict() if user else {}
+
+    identity = _cached(USER_KEY.format(user_id=user_id), load, lambda value: value is not None)
+    return identity or None
+
+
+def load_jwt_user(jwt_header: Dict, jwt_data: Dict) -> Optional[Dict]:
+    """JWT user lookup: tokens of deleted or deactivated users are rejected"""
+    identity = get_user_identity(jwt_data['sub'])
+    if not identity or not identity['is_active']:
+        return None
+    return identity
+
+
+def get_owned_log(log_id: str, user_id: str) -> Optional[LogFileSnapshot]:
+    """Snapshot of a log if ``user_id`` owns it, else None
+
+    Processed logs are served from cache; logs still being processed are
+    read from the database every time so their status stays current.
+    """
+    def load():
+        log_file = LogFile.query.options(defer(LogFile.summary)).filter_by(id=log_id).first()
+        return LogFileSnapshot.from_model(log_file).data if log_file else None
+
+    data = _cached(LOG_KEY.format(log_id=log_id), load,
+                   lambda value: bool(value) and value['status'] in CACHEABLE_LOG_STATUSES)
+    if not data or data['user_id'] != str(user_id):
+        return None
+    return LogFileSnapshot(data)
+
+
+def load_owned_log(log_id: str, user_id: str) -> Optional[LogFile]:
+    """LogFile row of a log if ``user_id`` owns it, read without the cache
+
+    For routes whose own queries already filter on the owner and only need
+    the row when those come back empty.
+    """
+    return LogFile.query.options(defer(LogFile.summary)).filter_by(id=log_id, user_id=user_id).first()
+
+
+def _forget(key: str):
+    # The request memo too: the request may read the row again after committing
+    if has_app_context():
+        g.get('identity_cache', {}).pop(key, None)
+    _local_cache.delete(key)
+    cache_delete(key)
+
+
+def invalidate_user(user_id: str):
+    """Forget a user's cached identity (deactivation, profile changes)"""
+    _forget(USER_KEY.format(user_id=user_id))
+
+
+def invalidate_log(log_id: str):
+    """Forget a log's cached ownership and metadata (deletion, updates)"""
+    _forget(LOG_KEY.format(log_id=log_id))
+
+
+def _queue_invalidation(kind: str):
+    def listener(mapper, connection, target):
+        session = Session.object_session(target)
+        if session is not None:
+            session.info.setdefault('identity_invalidations', set()).add((kind, str(target.id)))
+    return listener
+
+
+def _after_commit(session):
+    for kind, object_id in session.info.pop('identity_invalidations', ()):
+        if kind == 'user':
+            invalidate_user(object_id)
+        else:
+            invalidate_log(object_id)
+
+
+def _after_rollback(session):
+    session.info.pop('identity_invalidations', None)
+
+
+_listeners_installed = False
+
+
+def install_invalidation_listeners():
+    """Invalidate cached users and logs after any ORM update or delete commits
+
+    Invalidating only after commit keeps a concurrent request from caching
+    the old row between the flush and the commit.
+    """
+    global _listeners_installed
+    if _listeners_installed:
+        return
+
+    for model, kind in ((User, 'user'), (LogFile, 'log')):
+        event.listen(model, 'after_update', _queue_invalidation(kind))
+        event.listen(model, 'after_delete', _queue_invalidation(kind))
+    event.listen(Session, 'after_commit', _after_commit)
+    event.listen(Session, 'after_rollback', _after_rollback)
+    _listeners_installed = True
@@ -0,0 +1,344 @@
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT_KINDS = ('nginx', 'apache')
+
+# Variables whose values never contain whitespace; a single space is a
+# safe delimiter next to them. Anything else needs a quote or bracket
+# (upstream_* values are lists such as '0.010, 0.020 : 0.005').
+SPACE_FREE_VARIABLES = {
+    'remote_addr', 'binary_remote_addr', 'realip_remote_addr', 'remote_port', 'remote_user', 'ident',
+    'time_iso8601', 'msec', 'status', 'body_bytes_sent', 'bytes_sent', 'request_length',
+    'request_time', 'request_time_us', 'host', 'server_name', 'server_port',
+    'http_host', 'request_method', 'request_uri', 'uri', 'query_string', 'server_protocol',
+    'scheme', 'connection', 'connection_requests', 'pipe', 'pid', 'ssl_protocol', 'ssl_cipher',
+    'http_x_forwarded_for', 'gzip_ratio', 'request_id'
+}
+
+# Apache LogFormat directives -> nginx variable names
+APACHE_DIRECTIVES = {
+    'h': 'remote_addr', 'a': 'remote_addr', 'l': 'ident', 'u': 'remote_user', 't': 'time_local',
+    'r': 'request', 's': 'status', '>s': 'status', '<s': 'status', 'b': 'body_bytes_sent',
+    'B': 'body_bytes_sent', 'O': 'bytes_sent', 'I': 'request_length', 'D': 'request_time_us',
+    'T': 'request_time', 'v': 'server_name', 'V': 'host', 'U': 'uri', 'q': 'query_string',
+    'm': 'request_method', 'H': 'server_protocol', 'p': 'server_port', 'P': 'pid', 'L': 'request_id'
+}
+
+MONTHS = {month: index for index, month in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), start=1)}
+
+IP_PATTERN = re.compile(r'\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]*:[0-9A-Fa-f:.]+')
+
+NGINX_VARIABLE = re.compile(r'\$(\{\w+\}|\w+)')
+APACHE_DIRECTIVE = re.compile(r'%(?:\{([^}]*)\})?([<>]?[a-zA-Z%])')
+
+
+def _empty(value: str) -> bool:
+    return value == '' or value == '-'
+
+
+def _parse_time_local(value: str) -> Optional[datetime]:
+    """'10/Oct/2000:13:55:36 -0700' as naive UTC, without strptime"""
+    try:
+        parsed = datetime(int(value[7:11]), MONTHS[value[3:6]], int(value[0:2]),
+                          int(value[12:14]), int(value[15:17]), int(value[18:20]))
+    except (KeyError, ValueError):
+        return None
+    offset = value[21:26]
+    if len(offset) == 5 and offset[0] in '+-':
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[3:5]))
+        parsed = parsed - delta if offset[0] == '+' else parsed + delta
+    return parsed
+
+
+def _parse_iso(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    offset = parsed.utcoffset()
+    return (parsed - offset).replace(tzinfo=None) if offset is not None else parsed
+
+
+def _parse_msec(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc).replace(tzinfo=None)
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def _to_int(value: str) -> Optional[int]:
+    return int(value) if value.isdigit() else None
+
+
+def _to_seconds(value: str) -> Optional[float]:
+    """Seconds as float; upstream lists ('0.010, 0.020 : 0.005') are summed"""
+    if _empty(value):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return sum(float(part) for part in re.split(r'[,:]', value) if part.strip() not in ('', '-'))
+    except ValueError:
+        return None
+
+
+class LogLayout:
+    """A compiled ``log_format``: literals and variables in line order
+
+    ``split`` slices a line on the literal text around each variable when
+    the layout allows it and falls back to an anchored regex. Variables
+    are sliced from the left up to the first one whose delimiter could
+    occur inside its value, and from the right back to it; that one
+    variable takes whatever is left in the middle.
+    ``to_entry`` turns the values into typed LogEntry fields.
+    """
+
+    def __init__(self, prefix: str, variables: List[str], terminators: List[str]):
+        self.prefix = prefix
+        self.variables = variables
+        self.terminators = terminators
+        self.middle = self._find_middle()
+        self.sliceable = self.middle is not None
+
+        pattern = '^' + re.escape(prefix)
+        for variable, terminator in zip(variables, terminators):
+            pattern += (r'(\S*)' if variable in SPACE_FREE_VARIABLES else '(.*?)') + re.escape(terminator)
+        self.regex = re.compile(pattern + '$')
+
+    @staticmethod
+    def _safe(variable: str, delimiter: str) -> bool:
+        """Whether ``delimiter`` can't occur inside the variable's values"""
+        return bool(delimiter) and (bool(delimiter.strip()) or variable in SPACE_FREE_VARIABLES)
+
+    def _find_middle(self) -> Optional[int]:
+        """Index of the variable sliced last, or None if slicing is ambiguous"""
+        last = len(self.variables) - 1
+        middle = next((index for index in range(last) if not self._safe(self.variables[index], self.terminators[index])),
+                      last)
+        for index in range(middle + 1, last + 1):
+            # Right of the middle, each value is found by the literal before it
+            if not self._safe(self.variables[index], self.terminators[index - 1]):
+                return None
+        return middle
+
+    def split(self, line: str) -> Optional[List[str]]:
+        """Values of the variables in a line, or None if it doesn't match"""
+        if self.sliceable:
+            values = self._slice(line)
+            if values is not None:
+                return values
+        match = self.regex.match(line)
+        return list(match.groups()) if match else None
+
+    def _slice(self, line: str) -> Optional[List[str]]:
+        suffix = self.terminators[-1]
+        if not line.startswith(self.prefix) or not line.endswith(suffix):
+            return None
+        start = len(self.prefix)
+        end = len(line) - len(suffix)
+        if end < start:
+            return None
+
+        values = [None] * len(self.variables)
+        for index in range(self.middle):
+            found = line.find(self.terminators[index], start, end)
+            if found < 0:
+                return None
+            values[index] = line[start:found]
+            start = found + len(self.terminators[index])
+
+        for index in range(len(self.variables) - 1, self.middle, -1):
+            delimiter = self.terminators[index - 1]
+            found = line.rfind(delimiter, start, end)
+            if found < 0:
+                return None
+            values[index] = line[found + len(delimiter):end]
+            end = found
+
+        values[self.middle] = line[start:end]
+        return values
+
+    def to_entry(self, values: List[str]) -> Optional[Dict]:
+        """Typed LogEntry fields; variables without a column go to parsed_fields"""
+        entry = {}
+        extra = {}
+        for variable, value in zip(self.variables, values):
+            handler = _FIELD_HANDLERS.get(variable)
+            if handler is not None:
+                handler(value, entry, extra)
+            elif variable.endswith('_time'):
+                extra[variable] = _to_seconds(value)
+            else:
+                extra[variable] = None if _empty(value) else value
+
+        if entry.get('timestamp') is None:
+            return None
+        if 'dest_host' not in entry:
+            entry['dest_host'] = 'unknown'
+        entry['parsed_fields'] = extra or None
+        return entry
+
+
+def _set_timestamp(parse):
+    def handler(value, entry, extra):
+        if entry.get('timestamp') is None:
+            entry['timestamp'] = parse(value)
+    return handler
+
+
+def _set_src_ip(value, entry, extra):
+    if IP_PATTERN.fullmatch(value):
+        entry.setdefault('src_ip', value)
+    elif not _empty(value):
+        extra['remote_addr'] = value
+
+
+def _set_request(value, entry, extra):
+    parts = value.split(' ')
+    if len(parts) >= 2:
+        entry.setdefault('method', parts[0][:10])
+        entry.setdefault('url', parts[1])
+        if len(parts) > 2:
+            extra['protocol'] = parts[2]
+    elif not _empty(value):
+        extra['request'] = value
+
+
+def _set_text(field, limit=None):
+    def handler(value, entry, extra):
+        if not _empty(value):
+            entry.setdefault(field, value[:limit] if limit else value)
+    return handler
+
+
+def _set_int(field, upper=None):
+    def handler(value, entry, extra):
+        number = _to_int(value)
+        if number is not None and (upper is None or number <= upper):
+            entry.setdefault(field, number)
+        elif value == '-' and field == 'response_size':
+            entry.setdefault(field, 0)
+    return handler
+
+
+def _set_request_time_us(value, entry, extra):
+    number = _to_int(value)
+    extra['request_time'] = number / 1_000_000 if number is not None else None
+
+
+_FIELD_HANDLERS = {
+    'time_local': _set_timestamp(_parse_time_local),
+    'time_iso8601': _set_timestamp(_parse_iso),
+    'msec': _set_timestamp(_parse_msec),
+    'remote_addr': _set_src_ip,
+    'request': _set_request,
+    'request_method': _set_text('method', 10),
+    'request_uri': _set_text('url'),
+    'uri': _set_text('url'),
+    'status': _set_int('status_code', 32767),
+    'body_bytes_sent': _set_int('response_size'),
+    'bytes_sent': _set_int('response_size'),
+    'http_referer': _set_text('referer'),
+    'http_user_agent': _set_text('user_agent'),
+    'host': _set_text('dest_host', 255),
+    'http_host': _set_text('dest_host', 255),
+    'server_name': _set_text('dest_host', 255),
+    'request_time_us': _set_request_time_us
+}
+
+
+def _nginx_tokens(format_string: str) -> List[Tuple[str, Optional[str]]]:
+    """(literal, variable) pairs; the last pair may have no variable"""
+    tokens = []
+    pos = 0
+    for match in NGINX_VARIABLE.finditer(format_string):
+        tokens.append((format_string[pos:match.start()], match.group(1).strip('{}')))
+        pos = match.end()
+    tokens.append((format_string[pos:], None))
+    return tokens
+
+
+def _apache_tokens(format_string: str) -> List[Tuple[str, Optional[str]]]:
+    """Apache directives translated to nginx variable names"""
+    tokens = []
+    literal = ''
+    pos = 0
+    for match in APACHE_DIRECTIVE.finditer(format_string):
+        literal += format_string[pos:match.start()]
+        pos = match.end()
+        argument, directive = match.groups()
+        directive = directive.lstrip('<>') if directive not in APACHE_DIRECTIVES else directive
+
+        if directive == '%':
+            literal += '%'
+            continue
+        if directive == 'i' and argument:
+            variable = 'http_' + argument.lower().replace('-', '_')
+        elif directive == 'o' and argument:
+            variable = 'sent_http_' + argument.lower().replace('-', '_')
+        elif directive == 't' and argument:
+            variable = 'time_custom'
+        elif directive == 'D' or (directive == 'T' and argument == 'us'):
+            variable = 'request_time_us'
+        elif directive == 't':
+            # %t renders with its brackets: [10/Oct/2000:13:55:36 -0700]
+            tokens.append((literal + '[', 'time_local'))
+            literal = ']'
+            continue
+        else:
+            variable = APACHE_DIRECTIVES.get(directive, f'apache_{directive}')
+        tokens.append((literal, variable))
+        literal = ''
+    tokens.append((literal + format_string[pos:], None))
+    return tokens
+
+
+@lru_cache(maxsize=128)
+def compile_log_format(format_string: str, kind: str = 'nginx') -> LogLayout:
+    """Compile an nginx ``log_format`` or Apache ``LogFormat`` string (cached per string)"""
+    if kind not in LOG_FORMAT_KINDS:
+        raise ValueError(f"Unknown log format kind: {kind}")
+
+    tokens = _nginx_tokens(format_string) if kind == 'nginx' else _apache_tokens(format_string)
+    variables = [variable for _, variable in tokens if variable]
+    if not variables:
+        raise ValueError("Log format has no variables")
+    if 'time_local' not in variables and 'time_iso8601' not in variables and 'msec' not in variables:
+        raise ValueError("Log format needs a timestamp ($time_local, $time_iso8601, $msec or %t)")
+
+    prefix = tokens[0][0]
+    # The literal after each variable is the one before the next variable
+    terminators = [literal for literal, _ in tokens[1:]]
+
+    layout = LogLayout(prefix, variables, terminators)
+    logger.info(f"Compiled {kind} log format with {len(variables)} variables "
+                f"({'delimiter slicing' if layout.sliceable else 'regex'})")
+    return layout
+
+
+def parse_format_directives(text: str) -> List[Tuple[str, str, str]]:
+    """``(name, kind, format)`` for every nginx ``log_format`` and Apache ``LogFormat`` directive
+
+    Accepts the directives as they appear in nginx.conf / httpd.conf, so
+    formats can be pasted from the server configuration.
+    """
+    formats = []
+
+    for match in re.finditer(r'\blog_format\s+(\w+)\s+((?:escape=\w+\s+)?(?:(?:\'[^\']*\'|"[^"]*")\s*)+);', text):
+        name = match.group(1)
+        parts = re.findall(r'\'([^\']*)\'|"([^"]*)"', match.group(2))
+        formats.append((name, 'nginx', ''.join(single or double for single, double in parts)))
+
+    for match in re.finditer(r'^\s*LogFormat\s+"((?:[^"\\]|\\.)*)"\s+(\w+)', text, re.MULTILINE):
+        format_string = match.group(1).replace('\\"', '"')
+        formats.append((match.group(2), 'apache', format_string))
+
+    return formats
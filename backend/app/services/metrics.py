@@ -0,0 +1,266 @@
+import os
+import re
+import time
+import logging
+from typing import Dict, Optional
+
+from flask import Flask, Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Counters written by Celery workers and read back on every scrape, so
+# ingest throughput shows up no matter which process serves /metrics
+INGEST_METRICS_KEY = 'metrics:ingest'
+
+# Kombu keeps one Redis list per priority step: '<queue>' for step 0 and
+# '<queue>\x06\x16<step>' for the others
+PRIORITY_SEPARATOR = '\x06\x16'
+
+REQUEST_LATENCY = Histogram(
+    'logsight_http_request_duration_seconds',
+    'Request latency per API resource',
+    ['method', 'endpoint', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+REQUEST_QUERIES = Histogram(
+    'logsight_http_request_db_queries',
+    'SQL statements executed per request',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'logsight_http_request_db_seconds',
+    'Time spent in SQL per request',
+    ['endpoint'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+SLOW_QUERIES = Counter(
+    'logsight_db_slow_queries_total',
+    'SQL statements slower than SLOW_QUERY_MS',
+    ['endpoint']
+)
+POOL_CHECKED_OUT = Gauge(
+    'logsight_db_pool_checked_out',
+    'Database connections currently checked out of the pool',
+    multiprocess_mode='livesum'
+)
+POOL_CAPACITY = Gauge(
+    'logsight_db_pool_capacity',
+    'Pool size plus max overflow (checked_out / capacity is saturation)',
+    multiprocess_mode='livesum'
+)
+
+_slow_query_ms = float(os.getenv('SLOW_QUERY_MS', 500))
+_listeners_installed = False
+_collector_registered = False
+_capacity_pid = None
+
+
+class QueueCollector:
+    """Celery queue depth, scheduler backlog and worker ingest counters from Redis"""
+
+    def collect(self):
+        from app.services.cache import get_redis
+        from app.services.scheduler import IngestScheduler
+
+        up = GaugeMetricFamily('logsight_metrics_redis_up', 'Whether Redis-backed metrics could be read')
+        try:
+            redis_client = get_redis()
+            queues = list(IngestScheduler.QUEUES.items())
+
+            pipe = redis_client.pipeline()
+            for _, queue in queues:
+                for step in range(10):
+                    pipe.llen(queue if step == 0 else f'{queue}{PRIORITY_SEPARATOR}{step}')
+            for lane, _ in queues:
+                pipe.zcard(IngestScheduler.INFLIGHT_KEY.format(lane=lane))
+            pipe.get(IngestScheduler.BACKLOG_KEY)
+            pipe.hgetall(INGEST_METRICS_KEY)
+            results = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not read queue metrics from Redis: {str(e)}")
+            up.add_metric([], 0)
+            yield up
+            return
+
+        up.add_metric([], 1)
+        yield up
+
+        depth = GaugeMetricFamily('logsight_celery_queue_depth', 'Messages waiting in a Celery queue', labels=['queue'])
+        for index, (_, queue) in enumerate(queues):
+            depth.add_metric([queue], sum(results[index * 10:(index + 1) * 10]))
+        yield depth
+
+        offset = len(queues) * 10
+        inflight = GaugeMetricFamily('logsight_ingest_inflight', 'Ingest jobs holding a lane slot', labels=['lane'])
+        for index, (lane, _) in enumerate(queues):
+            inflight.add_metric([lane], results[offset + index])
+        yield inflight
+
+        backlog = results[offset + len(queues)]
+        yield GaugeMetricFamily('logsight_ingest_backlog', 'Ingest jobs waiting in the scheduler',
+                                value=int(backlog or 0))
+
+        yield from self._ingest_counters(results[-1])
+
+    def _ingest_counters(self, raw: Dict[bytes, bytes]):
+        """Turn the 'kind|task|name' hash fields into counter families"""
+        jobs = CounterMetricFamily('logsight_ingest_jobs', 'Finished ingest jobs', labels=['task', 'status'])
+        rows = CounterMetricFamily('logsight_ingest_rows', 'Rows handled per job stage', labels=['task', 'stage'])
+        seconds = CounterMetricFamily('logsight_ingest_stage_seconds', 'Wall time per job stage (rows/s = rows / seconds)',
+                                      labels=['task', 'stage'])
+        families = {'jobs': jobs, 'rows': rows, 'seconds': seconds}
+
+        for field, value in raw.items():
+            kind, task, name = field.decode().split('|', 2)
+            if kind in families:
+                families[kind].add_metric([task, name], float(value))
+
+        yield from families.values()
+
+
+def record_job_profile(profile: Dict, error: Optional[str] = None):
+    """Add a finished job's per-stage rows and seconds to the ingest counters"""
+    from app.services.cache import get_redis
+
+    task = profile.get('task', 'process')
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hincrby(INGEST_METRICS_KEY, f"jobs|{task}|{'error' if error else 'ok'}", 1)
+        for stage in profile.get('stages', []):
+            rows = stage['rows_out'] if stage.get('rows_out') is not None else stage.get('rows_in')
+            if rows is not None:
+                pipe.hincrby(INGEST_METRICS_KEY, f"rows|{task}|{stage['name']}", int(rows))
+            if stage.get('wall_ms') is not None:
+                pipe.hincrbyfloat(INGEST_METRICS_KEY, f"seconds|{task}|{stage['name']}", stage['wall_ms'] / 1000)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not record ingest metrics: {str(e)}")
+
+
+def _current_endpoint() -> str:
+    """Bounded label for the code path issuing a query"""
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or 'unmatched'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    if has_request_context() and 'db_queries' in g:
+        g.db_queries += 1
+        g.db_seconds += elapsed
+
+    if elapsed * 1000 >= _slow_query_ms:
+        endpoint = _current_endpoint()
+        SLOW_QUERIES.labels(endpoint).inc()
+        # Statement only: parameters may contain user data
+        sql = re.sub(r'\s+', ' ', statement)[:1000]
+        logger.warning(f"Slow query ({elapsed * 1000:.0f} ms, {endpoint}): {sql}")
+
+
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKED_OUT.inc()
+
+
+def _pool_checkin(dbapi_connection, connection_record):
+    POOL_CHECKED_OUT.dec()
+
+
+def _install_listeners():
+    """SQLAlchemy hooks are global, so install them once per process"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Pool, 'checkout', _pool_checkout)
+    event.listen(Pool, 'checkin', _pool_checkin)
+    _listeners_installed = True
+
+
+def _set_pool_capacity():
+    """Publish this process's pool capacity (once per pid, workers are forked)"""
+    global _capacity_pid
+    if _capacity_pid == os.getpid():
+        return
+
+    pool = db.engine.pool
+    if hasattr(pool, 'size'):
+        POOL_CAPACITY.set(pool.size() + max(getattr(pool, '_max_overflow', 0), 0))
+    _capacity_pid = os.getpid()
+
+
+def _registry():
+    """Registry to expose; aggregates every gunicorn worker in multiprocess mode"""
+    global _collector_registered
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(QueueCollector())
+        return registry
+
+    if not _collector_registered:
+        REGISTRY.register(QueueCollector())
+        _collector_registered = True
+    return REGISTRY
+
+
+def init_metrics(app: Flask):
+    """Time every request, count its queries and serve ``/metrics``"""
+    _install_listeners()
+    token = os.getenv('METRICS_TOKEN')
+
+    @app.before_request
+    def _start_request_metrics():
+        _set_pool_capacity()
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    @app.after_request
+    def _record_request_metrics(response):
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint == 'metrics' or 'request_started' not in g:
+            return response
+
+        elapsed = time.perf_counter() - g.request_started
+        REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(endpoint).observe(g.db_queries)
+        REQUEST_DB_SECONDS.labels(endpoint).observe(g.db_seconds)
+
+        # Lets N+1 regressions show up in the browser's network panel too
+        response.headers['Server-Timing'] = (
+            f'db;dur={g.db_seconds * 1000:.1f};desc="{g.db_queries} queries", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint"""
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return {'message': 'Invalid metrics token'}, 401
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
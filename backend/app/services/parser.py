@@ -1,14 +1,28 @@
 import re
 import os
+import csv
+import tempfile
+import orjson
 import pandas as pd
-from datetime import datetime
+from collections import Counter
+from functools import lru_cache
+from itertools import islice
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
 import logging
 from flask import current_app
 
 from app import db
-from app.models import LogFile, LogEntry
+from app.models import LogFile, LogEntry, Anomaly
 from app.services.anomaly import AnomalyDetectionService
+from app.services.rollup import RollupService
+from app.services.progress import ProgressPublisher
+from app.services.profiling import JobProfiler, save_profile
+from app.services.log_format_compiler import compile_log_format, parse_format_directives
+from app.services.collapse import collapse_duplicates, resolve_collapse_mode, entry_weight
+from app.services.raw_store import raw_log_storage, block_store_path, write_block_store, index_raw_lines
+from app.services.dimensions import encode_dimensions
+from app.services.dedup import pipeline_key, find_processed_duplicate, clone_results, link_raw_store
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +42,487 @@ class LogFormat:
     def parse_line(self, line: str) -> Optional[Dict]:
         """Parse a single log line into a dictionary"""
         return None
+    
+    def parse_lines(self, lines: List[str]) -> List[Optional[Dict]]:
+        """Parse a batch of stripped, non-empty lines (one result per line)"""
+        return [self.parse_line(line) for line in lines]
+    
+    def parse_file(self, file_path: str, progress: Optional[ProgressPublisher] = None) -> Optional[List[Dict]]:
+        """Parse a whole file at once; None means it is parsed line by line"""
+        return None
+
+
+# Header names (normalized: lowercase, non-alphanumerics as '_') that map
+# onto LogEntry fields, in order of preference
+DELIMITED_FIELD_ALIASES = {
+    'timestamp': ('timestamp', 'time', 'ts', 'datetime', 'date_time', 'event_time', 'eventtime', 'log_time', 'date'),
+    'src_ip': ('src_ip', 'cip', 'client_ip', 'clientip', 'source_ip', 'srcip', 'c_ip', 'remote_addr', 'client_address'),
+    'dest_host': ('dest_host', 'host', 'hostname', 'server_host', 'destination_host', 'dhost', 'cs_host', 'domain'),
+    'method': ('method', 'reqmethod', 'request_method', 'http_method', 'cs_method'),
+    'url': ('url', 'eurl', 'request_url', 'uri', 'request_uri', 'cs_uri'),
+    'status_code': ('status_code', 'status', 'respcode', 'response_code', 'http_status', 'sc_status'),
+    'response_size': ('response_size', 'respsize', 'bytes', 'bytes_sent', 'body_bytes_sent', 'sc_bytes'),
+    'user_agent': ('user_agent', 'ua', 'useragent', 'http_user_agent', 'cs_user_agent'),
+    'referer': ('referer', 'referrer', 'ereferer', 'referer_url', 'referrer_url', 'http_referer')
+}
+
+# Field order of a headerless Zscaler NSS web log feed in CSV
+ZSCALER_NSS_COLUMNS = (
+    'time', 'login', 'proto', 'eurl', 'action', 'appname', 'appclass', 'reqsize', 'respsize',
+    'urlclass', 'urlsupercat', 'urlcat', 'malwarecat', 'threatname', 'riskscore', 'dlpeng',
+    'dlpdict', 'location', 'dept', 'cip', 'sip', 'reqmethod', 'respcode', 'ua', 'ereferer',
+    'ruletype', 'rulelabel', 'contenttype', 'unscannabletype', 'deviceowner', 'devicehostname'
+)
+
+# Tried in order on a sample of the timestamp column; the first one that
+# parses most of it is applied to the whole column
+DELIMITED_TIME_FORMATS = (
+    'ISO8601', '%a %b %d %H:%M:%S %Y', '%d/%b/%Y:%H:%M:%S %z', '%d/%b/%Y:%H:%M:%S',
+    '%Y/%m/%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S'
+)
+
+IP_PATTERN = r'\d{1,3}(?:\.\d{1,3}){3}|[0-9A-Fa-f]*:[0-9A-Fa-f:.]+'
+URL_HOST_PATTERN = r'^(?:[A-Za-z][A-Za-z0-9+.-]*://)?([^/?#:\s]+)'
+
+# Nested keys of common JSON access logs (GCP HTTP(S) load balancer,
+# Azure Front Door, Cloudflare), flattened and normalized like headers
+JSON_FIELD_ALIASES = {
+    'timestamp': DELIMITED_FIELD_ALIASES['timestamp'] + ('edgestarttimestamp', 'receivetimestamp'),
+    'src_ip': DELIMITED_FIELD_ALIASES['src_ip'] + (
+        'httprequest_remoteip', 'properties_clientip', 'remote_ip', 'request_remote_ip'),
+    'dest_host': DELIMITED_FIELD_ALIASES['dest_host'] + (
+        'clientrequesthost', 'properties_hostname', 'http_host', 'request_host'),
+    'method': DELIMITED_FIELD_ALIASES['method'] + (
+        'httprequest_requestmethod', 'properties_httpmethod', 'clientrequestmethod', 'request_method'),
+    'url': DELIMITED_FIELD_ALIASES['url'] + (
+        'httprequest_requesturl', 'properties_requesturi', 'clientrequesturi', 'request_url', 'request_path'),
+    'status_code': DELIMITED_FIELD_ALIASES['status_code'] + (
+        'httprequest_status', 'properties_httpstatuscode', 'edgeresponsestatus', 'response_status'),
+    'response_size': DELIMITED_FIELD_ALIASES['response_size'] + (
+        'httprequest_responsesize', 'properties_responsebytes', 'edgeresponsebytes', 'response_bytes'),
+    'user_agent': DELIMITED_FIELD_ALIASES['user_agent'] + (
+        'httprequest_useragent', 'properties_useragent', 'clientrequestuseragent', 'request_user_agent'),
+    'referer': DELIMITED_FIELD_ALIASES['referer'] + (
+        'httprequest_referer', 'properties_referer', 'clientrequestreferer', 'request_referer')
+}
+
+
+@lru_cache(maxsize=4096)
+def _normalize_column(name: str) -> str:
+    return re.sub(r'[^0-9a-z]+', '_', name.strip().lower()).strip('_')
+
+
+class DelimitedLogFormat(LogFormat):
+    """CSV/TSV exports (Zscaler NSS feeds, SIEM and proxy exports) read column-wise
+    
+    Columns are mapped onto LogEntry fields by header name, by
+    ``DELIMITED_FIELD_MAP`` (``field=column,...``) or, for headerless files,
+    by ``DELIMITED_COLUMNS`` (falling back to the Zscaler NSS field order).
+    Unmapped columns go to ``parsed_fields``. Files are read by the pandas
+    C reader in chunks of rows, each converted a column at a time instead of
+    a regex per line.
+    """
+    
+    DELIMITERS = ('\t', ',')
+    
+    # Rows converted per pandas chunk; bounds the frame held in memory
+    CHUNK_ROWS = int(os.getenv('DELIMITED_CHUNK_ROWS', 50000))
+    
+    def __init__(self, columns: Optional[List[str]] = None, field_map: Optional[Dict[str, str]] = None,
+                 time_format: Optional[str] = None):
+        super().__init__()
+        self.name = "csv"
+        if columns is None and os.getenv('DELIMITED_COLUMNS'):
+            columns = os.getenv('DELIMITED_COLUMNS').split(',')
+        if field_map is None:
+            field_map = dict(
+                pair.split('=', 1) for pair in os.getenv('DELIMITED_FIELD_MAP', '').split(',') if '=' in pair
+            )
+        self.columns = [_normalize_column(column) for column in columns] if columns else None
+        self.field_map = {field.strip(): _normalize_column(column) for field, column in field_map.items()}
+        self.time_format = time_format or os.getenv('DELIMITED_TIME_FORMAT')
+    
+    def detect(self, sample_lines: List[str]) -> bool:
+        """Detect a delimited file whose columns can be mapped"""
+        return self._sniff(sample_lines) is not None
+    
+    def parse_line(self, line: str) -> Optional[Dict]:
+        """Delimited files are only parsed whole (see ``parse_file``)"""
+        return None
+    
+    def parse_file(self, file_path: str, progress: Optional[ProgressPublisher] = None) -> Optional[List[Dict]]:
+        """Parse the file column-wise into entry dicts, ``CHUNK_ROWS`` rows at a time"""
+        first_row, sample = self._sample(file_path)
+        sniffed = self._sniff(sample)
+        if sniffed is None:
+            raise ValueError("Could not map the columns of the delimited file")
+        delimiter, names, has_header = sniffed
+        skip = first_row + 1 if has_header else first_row
+        mapping = self._map_columns(names)
+        
+        entries = []
+        dropped = 0
+        aligned = True
+        line_number = skip
+        file_size = os.path.getsize(file_path) or 1
+        
+        # Raw lines are read alongside the pandas reader from a second handle
+        with open(file_path, 'rb') as source, open(file_path, 'rb') as lines_file:
+            for _ in islice(lines_file, skip):
+                pass
+            reader = pd.read_csv(
+                source, sep=delimiter, header=None, names=names, skiprows=skip, index_col=False,
+                dtype=str, keep_default_na=False, skip_blank_lines=False, skipinitialspace=True, on_bad_lines='skip',
+                encoding='utf-8', encoding_errors='ignore', engine='c', chunksize=self.CHUNK_ROWS
+            )
+            with reader:
+                for frame in reader:
+                    # Raw lines and line numbers line up with rows until the reader
+                    # skips a malformed row or a quoted field spans lines
+                    if aligned:
+                        lines = [raw_line.decode('utf-8', errors='ignore').rstrip('\r\n')
+                                 for raw_line in islice(lines_file, len(frame))]
+                        aligned = len(lines) == len(frame) and self._row_matches(frame.iloc[-1], lines[-1], delimiter)
+                        if not aligned:
+                            logger.warning(f"Rows after line {line_number} don't line up with the file; "
+                                           f"rebuilding raw lines from fields")
+                    if aligned:
+                        raw_logs = pd.Series(lines, index=frame.index)
+                        line_numbers = pd.Series(range(line_number + 1, line_number + len(lines) + 1), index=frame.index)
+                        line_number += len(lines)
+                    else:
+                        raw_logs = frame.iloc[:, 0].str.cat([frame[name] for name in names[1:]], sep=delimiter, na_rep='')
+                        line_numbers = pd.Series(frame.index + skip + 1, index=frame.index)
+                    
+                    chunk_entries = self._frame_entries(frame, names, mapping, raw_logs, line_numbers)
+                    dropped += len(frame) - len(chunk_entries)
+                    entries.extend(chunk_entries)
+                    
+                    if progress:
+                        bytes_parsed = min(source.tell(), file_size)
+                        progress.update(
+                            progress=10 + int(40 * bytes_parsed / file_size),
+                            bytes_parsed=bytes_parsed,
+                            lines_parsed=skip + frame.index[-1] + 1,
+                            entries_parsed=len(entries)
+                        )
+                    logger.info(f"Parsed {frame.index[-1] + 1} rows, found {len(entries)} valid entries")
+        
+        if dropped:
+            logger.warning(f"Dropped {dropped} rows without a parseable timestamp")
+        return entries
+    
+    def _frame_entries(self, frame: pd.DataFrame, names: List[str], mapping: Dict[str, str],
+                       raw_logs: pd.Series, line_numbers: pd.Series) -> List[Dict]:
+        """Entry dicts of a chunk of rows; rows without a parseable timestamp are left out"""
+        timestamps = self._parse_timestamps(frame[mapping['timestamp']])
+        keep = timestamps.notna()
+        frame = frame[keep]
+        
+        fields = {'timestamp': timestamps[keep].dt.tz_convert(None).array.to_pydatetime()}
+        for field in ('src_ip', 'dest_host', 'method', 'url', 'user_agent', 'referer'):
+            if field in mapping:
+                fields[field] = self._text(frame[mapping[field]])
+        if 'src_ip' in fields:
+            fields['src_ip'] = fields['src_ip'].where(fields['src_ip'].str.fullmatch(IP_PATTERN).eq(True), None)
+        if 'method' in fields:
+            fields['method'] = fields['method'].str.slice(0, 10)
+        if 'dest_host' not in fields and 'url' in fields:
+            fields['dest_host'] = self._text(fields['url'].str.extract(URL_HOST_PATTERN, expand=False))
+        if 'dest_host' in fields:
+            fields['dest_host'] = fields['dest_host'].str.slice(0, 255)
+        if 'status_code' in mapping:
+            fields['status_code'] = self._integers(frame[mapping['status_code']], upper=32767)
+        if 'response_size' in mapping:
+            fields['response_size'] = self._integers(frame[mapping['response_size']])
+        
+        unmapped = [name for name in names if name not in mapping.values()]
+        if unmapped:
+            extra = [self._text(frame[name]).tolist() for name in unmapped]
+            fields['parsed_fields'] = [dict(zip(unmapped, values)) for values in zip(*extra)]
+        else:
+            fields['parsed_fields'] = [None] * len(frame)
+        fields['raw_log'] = raw_logs[keep]
+        fields['line_number'] = line_numbers[keep]
+        
+        keys = list(fields)
+        columns = [values.tolist() if isinstance(values, pd.Series) else values for values in fields.values()]
+        return [dict(zip(keys, values)) for values in zip(*columns)]
+    
+    @staticmethod
+    def _sample(file_path: str, lines: int = 50, rows: int = 10) -> Tuple[int, List[str]]:
+        """Index of the first non-blank line and up to ``rows`` non-blank lines of the ``lines`` from there"""
+        first_row = 0
+        sample = []
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                if sample or line.strip():
+                    sample.append(line.rstrip('\r\n'))
+                    if len(sample) == lines:
+                        break
+                else:
+                    first_row += 1
+        return first_row, [line for line in sample if line.strip()][:rows]
+    
+    @staticmethod
+    def _row_matches(row: pd.Series, line: str, delimiter: str) -> bool:
+        """Whether a row read by pandas holds the cells of a raw line"""
+        cells = next(csv.reader([line], delimiter=delimiter, skipinitialspace=True), [])
+        values = [value if isinstance(value, str) else '' for value in row]
+        return cells + [''] * (len(values) - len(cells)) == values
+    
+    def _sniff(self, sample_lines: List[str]) -> Optional[Tuple[str, List[str], bool]]:
+        """Delimiter, column names and whether the first sample row is a header"""
+        for delimiter in self.DELIMITERS:
+            rows = list(csv.reader(sample_lines, delimiter=delimiter))
+            if not rows:
+                return None
+            # A stray malformed row in the sample shouldn't hide the format
+            widths = Counter(len(row) for row in (rows[1:] or rows))
+            width, count = widths.most_common(1)[0]
+            if width < 3 or count * 2 <= sum(widths.values()):
+                continue
+            
+            header = self._unique([_normalize_column(cell) for cell in rows[0]])
+            if len(header) == width and 'timestamp' in self._map_columns(header) and len(self._map_columns(header)) >= 2:
+                return delimiter, header, True
+            
+            columns = self.columns or (list(ZSCALER_NSS_COLUMNS) if width == len(ZSCALER_NSS_COLUMNS) else None)
+            if not columns or len(columns) != width:
+                continue
+            columns = self._unique(columns)
+            mapping = self._map_columns(columns)
+            if 'timestamp' not in mapping:
+                continue
+            stamps = pd.Series([row[columns.index(mapping['timestamp'])] for row in rows if len(row) == width])
+            if self._parse_timestamps(stamps).notna().any():
+                return delimiter, columns, False
+        return None
+    
+    def _map_columns(self, names: List[str]) -> Dict[str, str]:
+        """LogEntry field -> column name, config first, then header aliases"""
+        mapping = {}
+        for field, aliases in DELIMITED_FIELD_ALIASES.items():
+            candidates = ([self.field_map[field]] if field in self.field_map else []) + list(aliases)
+            for candidate in candidates:
+                if candidate in names and candidate not in mapping.values():
+                    mapping[field] = candidate
+                    break
+        return mapping
+    
+    def _parse_timestamps(self, values: pd.Series) -> pd.Series:
+        """Parse a column of timestamps to UTC with one format for the whole column"""
+        present = values[values.notna() & (values != '')]
+        sample = present.head(100)
+        if len(sample) and sample.str.fullmatch(r'\d{10}(?:\d{3})?').all():
+            numbers = pd.to_numeric(values, errors='coerce')
+            unit = 'ms' if numbers.max() > 10 ** 11 else 's'
+            return pd.to_datetime(numbers, unit=unit, errors='coerce', utc=True)
+        
+        formats = [self.time_format] if self.time_format else DELIMITED_TIME_FORMATS
+        best, best_parsed = None, 0
+        for time_format in formats:
+            parsed = pd.to_datetime(sample, format=time_format, errors='coerce', utc=True).notna().sum()
+            if parsed > best_parsed:
+                best, best_parsed = time_format, parsed
+            if parsed == len(sample):
+                break
+        if best is None:
+            return pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+        return pd.to_datetime(values, format=best, errors='coerce', utc=True)
+    
+    @staticmethod
+    def _text(values: pd.Series) -> pd.Series:
+        """Empty, '-' and 'None' (Zscaler's empty value) cells become None"""
+        return values.where(values.notna() & ~values.isin(('', '-', 'None')), None)
+    
+    @staticmethod
+    def _integers(values: pd.Series, upper: Optional[int] = None) -> pd.Series:
+        """Whole numbers in range, None otherwise"""
+        numbers = pd.to_numeric(values, errors='coerce')
+        valid = numbers.notna() & (numbers >= 0) & (numbers % 1 == 0)
+        if upper is not None:
+            valid &= numbers <= upper
+        numbers = numbers.where(valid).astype('Int64')
+        return numbers.astype(object).where(valid, None)
+    
+    @staticmethod
+    def _unique(names: List[str]) -> List[str]:
+        """Make column names unique ('col', 'col_2', ...) so pandas keeps all of them"""
+        seen = {}
+        result = []
+        for index, name in enumerate(names):
+            name = name or f'column_{index + 1}'
+            seen[name] = seen.get(name, 0) + 1
+            result.append(name if seen[name] == 1 else f'{name}_{seen[name]}')
+        return result
+
+
+class JsonLinesLogFormat(LogFormat):
+    """One JSON object per line (cloud load balancers, structured app logs)
+    
+    Nested objects are flattened to dotted keys; ``NDJSON_FIELD_MAP``
+    (``field=key.path,...``) picks the keys for LogEntry fields, otherwise
+    well-known names are matched. Everything else goes to ``parsed_fields``.
+    Batches of lines are decoded with a single orjson call.
+    """
+    
+    def __init__(self, field_map: Optional[Dict[str, str]] = None):
+        super().__init__()
+        self.name = "ndjson"
+        if field_map is None:
+            field_map = dict(
+                pair.split('=', 1) for pair in os.getenv('NDJSON_FIELD_MAP', '').split(',') if '=' in pair
+            )
+        self.candidates = {
+            field: tuple(dict.fromkeys(
+                ([_normalize_column(field_map[field])] if field in field_map else []) + list(aliases)
+            ))
+            for field, aliases in JSON_FIELD_ALIASES.items()
+        }
+        self.ip_pattern = re.compile(IP_PATTERN)
+        self.host_pattern = re.compile(URL_HOST_PATTERN)
+        # Key set of a record -> present candidate keys per field; lines from
+        # one source share a handful of shapes, so matching runs once per shape
+        self._shapes: Dict[Tuple, List[Tuple[str, List[str]]]] = {}
+    
+    def detect(self, sample_lines: List[str]) -> bool:
+        """Detect mostly JSON-object lines, some with a recognizable timestamp"""
+        lines = [line.strip() for line in sample_lines[:10]]
+        objects = [line for line in lines if line.startswith('{') and line.endswith('}')]
+        if not objects or len(objects) * 2 <= len(lines):
+            return False
+        return any(self.parse_lines(objects))
+    
+    def parse_line(self, line: str) -> Optional[Dict]:
+        """Parse one JSON line"""
+        return self.parse_lines([line.strip()])[0]
+    
+    def parse_lines(self, lines: List[str]) -> List[Optional[Dict]]:
+        """Decode the batch as one JSON array, falling back to line by line"""
+        if not lines:
+            return []
+        try:
+            records = orjson.loads('[' + ','.join(lines) + ']')
+            if len(records) != len(lines):
+                raise ValueError("Batch is not one object per line")
+        except (orjson.JSONDecodeError, ValueError):
+            records = [self._decode(line) for line in lines]
+        return [self._map_record(record) if isinstance(record, dict) else None for record in records]
+    
+    @staticmethod
+    def _decode(line: str):
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            return None
+    
+    def _map_record(self, record: Dict) -> Optional[Dict]:
+        """Map a decoded object onto LogEntry fields"""
+        flat = {}
+        self._flatten(record, '', flat)
+        
+        values = {}
+        for field, keys in self._shape(tuple(flat)):
+            for key in keys:
+                if flat[key] not in (None, '', '-'):
+                    values[field] = flat.pop(key)
+                    break
+        
+        timestamp = self._parse_timestamp(values.get('timestamp'))
+        if timestamp is None:
+            return None
+        
+        entry = {'timestamp': timestamp}
+        for field in ('method', 'url', 'user_agent', 'referer'):
+            if field in values:
+                entry[field] = str(values[field])
+        if 'method' in entry:
+            entry['method'] = entry['method'][:10]
+        
+        src_ip = values.get('src_ip')
+        if isinstance(src_ip, str) and '.' in src_ip and ':' in src_ip:
+            src_ip = src_ip.rsplit(':', 1)[0]  # IPv4 with port
+        if isinstance(src_ip, str) and self.ip_pattern.fullmatch(src_ip):
+            entry['src_ip'] = src_ip
+        
+        dest_host = values.get('dest_host')
+        if dest_host is None and 'url' in entry:
+            match = self.host_pattern.match(entry['url'])
+            dest_host = match.group(1) if match and not entry['url'].startswith('/') else None
+        if dest_host is not None:
+            entry['dest_host'] = str(dest_host)[:255]
+        
+        entry['status_code'] = self._integer(values.get('status_code'), upper=32767)
+        entry['response_size'] = self._integer(values.get('response_size'))
+        entry['parsed_fields'] = flat or None
+        return entry
+    
+    def _shape(self, keys: Tuple) -> List[Tuple[str, List[str]]]:
+        """Fields a record can fill, each with its keys best candidate first"""
+        shape = self._shapes.get(keys)
+        if shape is None:
+            normalized = {_normalize_column(key): key for key in keys}
+            shape = []
+            for field, candidates in self.candidates.items():
+                present = [normalized[candidate] for candidate in candidates if candidate in normalized]
+                if present:
+                    shape.append((field, present))
+            if len(self._shapes) >= 1024:
+                self._shapes.clear()
+            self._shapes[keys] = shape
+        return shape
+    
+    def _flatten(self, value: Dict, prefix: str, out: Dict):
+        for key, item in value.items():
+            path = f'{prefix}{key}'
+            if isinstance(item, dict) and item:
+                self._flatten(item, f'{path}.', out)
+            else:
+                out[path] = item
+    
+    @staticmethod
+    def _parse_timestamp(value) -> Optional[datetime]:
+        """ISO 8601, epoch seconds/milliseconds or a known log format, as naive UTC"""
+        if isinstance(value, bool) or value is None:
+            return None
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, (int, float)):
+            seconds = value / 1000 if value > 10 ** 11 else value
+            try:
+                return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+            except (OverflowError, OSError, ValueError):
+                return None
+        if not isinstance(value, str):
+            return None
+        
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = None
+            for time_format in DELIMITED_TIME_FORMATS[1:]:
+                try:
+                    parsed = datetime.strptime(value, time_format)
+                    break
+                except ValueError:
+                    continue
+        if parsed is not None and parsed.tzinfo is not None:
+            offset = parsed.utcoffset()
+            parsed = (parsed - offset if offset else parsed).replace(tzinfo=None)
+        return parsed
+    
+    @staticmethod
+    def _integer(value, upper: Optional[int] = None) -> Optional[int]:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str) and value.isdigit():
+            value = int(value)
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if not isinstance(value, int) or value < 0 or (upper is not None and value > upper):
+            return None
+        return value
 
 
 class ZscalerLogFormat(LogFormat):
@@ -293,16 +788,93 @@ class ApacheLogFormat(LogFormat):
             return datetime.utcnow()
 
 
+class CompiledLogFormat(LogFormat):
+    """A registered nginx ``log_format`` or Apache ``LogFormat``, compiled once per string"""
+    
+    def __init__(self, name: str, format_string: str, kind: str = 'nginx'):
+        super().__init__()
+        self.name = f"{kind}:{name}"
+        self.format_string = format_string
+        self.layout = compile_log_format(format_string, kind)
+        self.fields = self.layout.variables
+    
+    def detect(self, sample_lines: List[str]) -> bool:
+        """Detect lines laid out like the registered format"""
+        parsed = [self.parse_line(line) for line in sample_lines[:5]]
+        return sum(1 for entry in parsed if entry) * 2 > len(parsed)
+    
+    def parse_line(self, line: str) -> Optional[Dict]:
+        """Parse a line with the compiled layout"""
+        values = self.layout.split(line.strip())
+        return self.layout.to_entry(values) if values is not None else None
+
+
+# name -> (kind, format string) of registered custom formats
+_registered_formats: Dict[str, Tuple[str, str]] = {}
+_formats_file_loaded = False
+
+
+def register_log_format(name: str, format_string: str, kind: str = 'nginx'):
+    """Register an nginx ``log_format`` or Apache ``LogFormat`` string for detection
+    
+    Raises ValueError if the string can't be compiled.
+    """
+    compile_log_format(format_string, kind)
+    _registered_formats[name] = (kind, format_string)
+
+
+def load_log_formats_file(path: str) -> int:
+    """Register every ``log_format``/``LogFormat`` directive in a server config file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        directives = parse_format_directives(f.read())
+    
+    registered = 0
+    for name, kind, format_string in directives:
+        try:
+            register_log_format(name, format_string, kind)
+            registered += 1
+        except ValueError as e:
+            logger.warning(f"Skipping {kind} log format '{name}': {str(e)}")
+    logger.info(f"Registered {registered} custom log formats from {path}")
+    return registered
+
+
+def registered_log_formats() -> List[CompiledLogFormat]:
+    """Parsers for the registered formats (``LOG_FORMATS_FILE`` is read on first use)"""
+    global _formats_file_loaded
+    if not _formats_file_loaded:
+        _formats_file_loaded = True
+        path = os.getenv('LOG_FORMATS_FILE')
+        if path:
+            try:
+                load_log_formats_file(path)
+            except OSError as e:
+                logger.warning(f"Could not read LOG_FORMATS_FILE {path}: {str(e)}")
+    
+    return [CompiledLogFormat(name, format_string, kind)
+            for name, (kind, format_string) in _registered_formats.items()]
+
+
 class LogParserService:
     """Main log parsing service"""
     
+    # Lines handed to a format per parse_lines() call
+    PARSE_BATCH_LINES = 1000
+    
     def __init__(self):
+        # Registered custom formats and structured formats come first: the
+        # built-in nginx pattern also matches the prefix of extended layouts
+        # and the Zscaler pattern almost any line with enough tokens
         self.formats = [
+            *registered_log_formats(),
+            JsonLinesLogFormat(),
+            DelimitedLogFormat(),
             ZscalerLogFormat(),
             NginxLogFormat(),
             ApacheLogFormat()
         ]
         self.anomaly_service = AnomalyDetectionService()
+        self.rollup_service = RollupService()
     
     def detect_format(self, file_path: str) -> Optional[LogFormat]:
         """Detect log format by examining sample lines"""
@@ -313,7 +885,8 @@ class LogParserService:
                     if i >= 10:  # Read first 10 lines for detection
                         break
                     if line.strip():
-                        sample_lines.append(line.strip())
+                        # Keep trailing tabs: they are empty TSV fields
+                        sample_lines.append(line.rstrip('\r\n'))
             
             for format_parser in self.formats:
                 if format_parser.detect(sample_lines):
@@ -327,35 +900,45 @@ class LogParserService:
             logger.error(f"Error detecting log format: {str(e)}")
             return None
     
-    def process_log_file_async(self, log_id: str):
-        """Start asynchronous processing of a log file"""
-        try:
-            # In a real application, this would be a Celery task
-            # For now, we'll process synchronously but update status
-            self.process_log_file(log_id)
-        except Exception as e:
-            logger.error(f"Error in async processing: {str(e)}")
-            # Update log file status to error
-            log_file = LogFile.query.get(log_id)
-            if log_file:
-                log_file.status = 'error'
-                log_file.error_message = str(e)
-                db.session.commit()
-    
-    def process_log_file(self, log_id: str):
-        """Process a log file and extract entries"""
+    def process_log_file(self, log_id: str, cprofile: bool = False, collapse: Optional[str] = None):
+        """Process a log file and extract entries
+        
+        Every stage is timed by a JobProfiler and the result is saved on
+        ``LogFile.profile``; ``cprofile`` additionally dumps cProfile stats.
+        ``collapse`` merges duplicate lines into counted entries (see
+        ``collapse_duplicates``; default ``INGEST_COLLAPSE``). Results of an
+        earlier preview stay visible until the exact ones are complete: those
+        are written in one transaction alongside the preview's and replace
+        them when it commits, so a failed pass (status 'error') keeps the
+        preview's results. With ``RAW_LOG_STORAGE=offsets`` the original is replaced
+        by a compressed block store and entries keep line offsets into it.
+        If the user already has identical content processed with the same
+        format and pipeline (see ``services.dedup``), its results are cloned
+        instead of parsing and detecting again.
+        """
         log_file = LogFile.query.get(log_id)
         if not log_file:
             raise ValueError(f"Log file not found: {log_id}")
+        collapse = resolve_collapse_mode(collapse)
+        raw_store_path = block_store_path(log_id) if raw_log_storage() == 'offsets' else None
+        original_path = log_file.file_path
+        
+        # Fine-grained progress goes to Redis; the LogFile row is only
+        # written at stage boundaries
+        progress = ProgressPublisher(log_id)
+        profiler = JobProfiler(log_id, 'process', cprofile=cprofile).start()
         
         try:
             logger.info(f"Starting processing of log file: {log_file.original_filename}")
-            log_file.status = 'processing'
+            if log_file.status != 'preview':
+                log_file.status = 'processing'
             log_file.processing_progress = 0
             db.session.commit()
+            progress.stage('detecting_format', 0)
             
             # Detect format
-            format_parser = self.detect_format(log_file.file_path)
+            with profiler.stage('detect_format'):
+                format_parser = self.detect_format(log_file.file_path)
             if not format_parser:
                 raise ValueError("Could not detect log format")
             
@@ -363,68 +946,378 @@ class LogParserService:
             log_file.processing_progress = 10
             db.session.commit()
             
+            # Identical content already processed the same way: copy its results
+            source = find_processed_duplicate(log_file, pipeline_key(collapse), format_parser.name)
+            if source:
+                self._reuse_results(log_file, source, pipeline_key(collapse), profiler, progress)
+                return
+            
+            progress.stage('parsing', 10, log_format=format_parser.name,
+                           bytes_parsed=0, bytes_total=log_file.file_size)
+            
             # Parse entries
-            entries = self._parse_file(log_file.file_path, format_parser)
+            with profiler.stage('parse') as stage:
+                entries = self._parse_file(log_file.file_path, format_parser, progress)
+                stage['rows_out'] = len(entries)
+            lines_parsed = len(entries)
+            
+            if collapse != 'off':
+                with profiler.stage('collapse', rows_in=lines_parsed) as stage:
+                    entries = collapse_duplicates(entries, collapse)
+                    stage['rows_out'] = len(entries)
+            
+            if raw_store_path:
+                with profiler.stage('raw_store', rows_in=len(entries)) as stage:
+                    stage['rows_out'] = index_raw_lines(original_path, entries)
+                    write_block_store(original_path, raw_store_path)
+            
+            # Preview results are swapped out in one transaction (flushing
+            # instead of committing until detection stores its anomalies);
+            # leftovers of a failed run are simply dropped first
+            staged = log_file.status == 'preview'
+            checkpoint = db.session.flush if staged else db.session.commit
+            if staged:
+                watermark = db.session.query(db.func.max(LogEntry.id)).filter(LogEntry.log_id == log_id).scalar()
+            else:
+                with profiler.stage('clear_results'):
+                    self._clear_results(log_id)
+            log_file.status = 'processing'
             log_file.processing_progress = 50
-            db.session.commit()
+            checkpoint()
+            progress.stage('storing', 50, rows_stored=0, rows_total=len(entries))
             
             # Store entries in database
-            self._store_entries(log_id, entries)
+            with profiler.stage('store_entries', rows_in=len(entries)) as stage:
+                self._store_entries(log_id, entries, progress, commit=not staged)
+                stage['rows_out'] = len(entries)
+            
+            # Maintain per-minute rollups for dashboard charts
+            with profiler.stage('store_rollups', rows_in=len(entries)):
+                self.rollup_service.store_rollups(log_id, entries, commit=not staged)
             log_file.processing_progress = 70
-            db.session.commit()
+            checkpoint()
+            progress.stage('summarizing', 70, rows_total=len(entries))
             
             # Generate summary
-            summary = self._generate_summary(entries)
+            with profiler.stage('summarize', rows_in=len(entries)):
+                summary = self._generate_summary(entries)
+                if collapse != 'off':
+                    summary['collapse'] = {'mode': collapse, 'lines': lines_parsed, 'entries': len(entries)}
             log_file.summary = summary
             log_file.total_entries = len(entries)
             
             if entries:
                 log_file.date_range_start = min(entry['timestamp'] for entry in entries)
-                log_file.date_range_end = max(entry['timestamp'] for entry in entries)
+                log_file.date_range_end = max(entry.get('last_timestamp', entry['timestamp']) for entry in entries)
             
             log_file.processing_progress = 80
-            db.session.commit()
+            checkpoint()
+            progress.stage('detecting', 80, detector=None)
+            
+            # Detection only sees the exact entries; storing its anomalies
+            # commits the swap
+            if staged and watermark is not None:
+                with profiler.stage('clear_results'):
+                    self._clear_results(log_id, up_to_entry=watermark, commit=False)
             
             # Run anomaly detection
-            self.anomaly_service.detect_anomalies(log_id)
+            with profiler.stage('detect_anomalies', rows_in=len(entries)):
+                self.anomaly_service.detect_anomalies(log_id, progress, profiler=profiler)
             
-            # Mark as completed
+            # Mark as completed; the block store now stands in for the original
             log_file.status = 'ready'
             log_file.processing_progress = 100
             log_file.processed_at = datetime.utcnow()
+            log_file.pipeline_key = pipeline_key(collapse)
+            if raw_store_path:
+                log_file.file_path = raw_store_path
+            save_profile(log_file, profiler.stop())
             db.session.commit()
+            progress.stage('ready', 100, total_entries=len(entries))
+            
+            if raw_store_path:
+                self._remove_file(original_path)
             
             logger.info(f"Successfully processed log file: {log_file.original_filename}")
             
         except Exception as e:
             logger.error(f"Error processing log file {log_id}: {str(e)}")
+            db.session.rollback()
             log_file.status = 'error'
             log_file.error_message = str(e)
+            save_profile(log_file, profiler.stop(), error=str(e))
+            db.session.commit()
+            progress.stage('error', log_file.processing_progress or 0, error=str(e))
+            raise
+    
+    def _reuse_results(self, log_file: LogFile, source: LogFile, key: str,
+                       profiler: JobProfiler, progress: ProgressPublisher):
+        """Finish processing by cloning the results of an identical processed upload"""
+        logger.info(f"Log {log_file.id} duplicates processed log {source.id}, reusing its results")
+        progress.stage('cloning', 10, log_format=log_file.log_format, duplicate_of=str(source.id))
+        
+        with profiler.stage('clone_results', rows_in=source.total_entries) as stage:
+            stage['rows_out'] = clone_results(source, log_file)
+        # Offsets of cloned entries point into the source's block store
+        raw_store_path = link_raw_store(source, log_file)
+        original_path = log_file.file_path
+        
+        log_file.summary = dict(source.summary or {}, duplicate_of=str(source.id))
+        log_file.total_entries = source.total_entries
+        log_file.date_range_start = source.date_range_start
+        log_file.date_range_end = source.date_range_end
+        log_file.pipeline_key = key
+        log_file.status = 'ready'
+        log_file.processing_progress = 100
+        log_file.processed_at = datetime.utcnow()
+        if raw_store_path:
+            log_file.file_path = raw_store_path
+        save_profile(log_file, profiler.stop())
+        db.session.commit()
+        progress.stage('ready', 100, total_entries=log_file.total_entries, duplicate_of=str(source.id))
+        
+        if raw_store_path:
+            self._remove_file(original_path)
+    
+    def preview_log_file(self, log_id: str, collapse: Optional[str] = None):
+        """Approximate first pass over a sample of the file; marks the log 'preview'
+        
+        ``PREVIEW_SAMPLE_BLOCKS`` newline-aligned blocks are read from evenly
+        spaced offsets (``PREVIEW_SAMPLE_LINES`` lines in total) and go
+        through the usual parse, store, summary and detection stages. Summary
+        counts are scaled up to the whole file. ``process_log_file`` later
+        replaces everything with exact results.
+        """
+        log_file = LogFile.query.get(log_id)
+        if not log_file:
+            raise ValueError(f"Log file not found: {log_id}")
+        collapse = resolve_collapse_mode(collapse)
+        
+        progress = ProgressPublisher(log_id)
+        profiler = JobProfiler(log_id, 'preview').start()
+        sample_path = None
+        
+        try:
+            logger.info(f"Starting preview of log file: {log_file.original_filename}")
+            log_file.status = 'processing'
+            log_file.processing_progress = 0
+            db.session.commit()
+            progress.stage('previewing', 0, detector=None)
+            
+            with profiler.stage('detect_format'):
+                format_parser = self.detect_format(log_file.file_path)
+            if not format_parser:
+                raise ValueError("Could not detect log format")
+            log_file.log_format = format_parser.name
+            
+            with profiler.stage('sample'):
+                sample_path, sample_bytes, line_numbers = self._sample_file(
+                    log_file.file_path,
+                    int(os.getenv('PREVIEW_SAMPLE_LINES', 20000)),
+                    int(os.getenv('PREVIEW_SAMPLE_BLOCKS', 200))
+                )
+            
+            with profiler.stage('parse') as stage:
+                entries = self._parse_file(sample_path, format_parser)
+                stage['rows_out'] = len(entries)
+            sample_lines = len(entries)
+            
+            # Point line numbers within the sample back at the original file
+            for entry in entries:
+                position = entry['line_number']
+                entry['line_number'] = line_numbers[position - 1] if position and position <= len(line_numbers) else None
+            if collapse != 'off':
+                with profiler.stage('collapse', rows_in=sample_lines) as stage:
+                    entries = collapse_duplicates(entries, collapse)
+                    stage['rows_out'] = len(entries)
+            
+            with profiler.stage('clear_results'):
+                self._clear_results(log_id)
+            with profiler.stage('store_entries', rows_in=len(entries)):
+                self._store_entries(log_id, entries)
+            with profiler.stage('store_rollups', rows_in=len(entries)):
+                self.rollup_service.store_rollups(log_id, entries)
+            
+            with profiler.stage('summarize', rows_in=len(entries)):
+                scale = log_file.file_size / sample_bytes if sample_bytes else 1.0
+                summary = self._scale_summary(self._generate_summary(entries), scale)
+                summary['preview'] = {
+                    'sample_lines': sample_lines,
+                    'sample_bytes': sample_bytes,
+                    'file_size': log_file.file_size,
+                    'scale': round(scale, 4)
+                }
+            log_file.summary = summary
+            log_file.total_entries = len(entries)
+            if entries:
+                log_file.date_range_start = min(entry['timestamp'] for entry in entries)
+                log_file.date_range_end = max(entry.get('last_timestamp', entry['timestamp']) for entry in entries)
+            db.session.commit()
+            
+            with profiler.stage('detect_anomalies', rows_in=len(entries)):
+                self.anomaly_service.detect_anomalies(log_id, profiler=profiler)
+            
+            log_file.status = 'preview'
+            save_profile(log_file, profiler.stop())
             db.session.commit()
+            progress.stage('preview', 0, total_entries=len(entries), sample_lines=sample_lines)
+            
+            logger.info(f"Preview of {log_file.original_filename} ready ({sample_lines} sampled lines)")
+            
+        except Exception as e:
+            # The exact pass still follows; it reports its own errors
+            logger.error(f"Error previewing log file {log_id}: {str(e)}")
+            db.session.rollback()
+            log_file.status = 'uploaded'
+            save_profile(log_file, profiler.stop(), error=str(e))
+            db.session.commit()
+            raise
+        
+        finally:
+            if sample_path:
+                os.remove(sample_path)
+    
+    @classmethod
+    def _sample_file(cls, file_path: str, sample_lines: int, blocks: int) -> Tuple[str, int, List[int]]:
+        """Copy newline-aligned blocks from evenly spaced offsets into a temp file
+        
+        The first block starts at offset 0 so header lines are kept. Returns
+        the sample's path (the caller removes it), its size in bytes and the
+        original line number of every sampled line. Skipped stretches are
+        only scanned for newlines to number the lines.
+        """
+        file_size = os.path.getsize(file_path)
+        lines_per_block = max(1, sample_lines // max(1, blocks))
+        fd, sample_path = tempfile.mkstemp(prefix='preview-', suffix='.log')
+        sample_bytes = 0
+        end = 0
+        line_numbers = []
+        lines_before = 0  # newlines before ``end``
+        
+        with open(file_path, 'rb') as source, open(file_path, 'rb') as counter, \
+                os.fdopen(fd, 'wb') as sample:
+            for block in range(blocks):
+                offset = file_size * block // blocks
+                if offset <= end:
+                    # Blocks overlap on small files: carry on where the last one ended
+                    source.seek(end)
+                else:
+                    source.seek(offset)
+                    source.readline()  # skip to the next line start
+                    lines_before += cls._count_newlines(counter, end, source.tell())
+                
+                for _ in range(lines_per_block):
+                    line = source.readline()
+                    if not line:
+                        break
+                    lines_before += 1
+                    line_numbers.append(lines_before)
+                    if not line.endswith(b'\n'):
+                        line += b'\n'
+                    sample.write(line)
+                    sample_bytes += len(line)
+                
+                end = source.tell()
+                if end >= file_size:
+                    break
+        
+        return sample_path, sample_bytes, line_numbers
+    
+    @staticmethod
+    def _count_newlines(f, start: int, end: int, chunk_bytes: int = 1024 * 1024) -> int:
+        """Number of newlines in bytes ``start:end`` of an open binary file"""
+        f.seek(start)
+        count = 0
+        while start < end:
+            chunk = f.read(min(chunk_bytes, end - start))
+            if not chunk:
+                break
+            count += chunk.count(b'\n')
+            start += len(chunk)
+        return count
+    
+    @staticmethod
+    def _scale_summary(summary: Dict, scale: float) -> Dict:
+        """Extrapolate the line counts of a sample's summary to the whole file"""
+        if not summary or 'error' in summary or scale == 1.0:
+            return summary
+        
+        def scaled(counts: Dict) -> Dict:
+            return {key: int(round(count * scale)) for key, count in counts.items()}
+        
+        summary['total_lines'] = int(round(summary['total_lines'] * scale))
+        for key in ('methods', 'status_codes', 'top_ips', 'top_hosts', 'hourly_distribution'):
+            summary[key] = scaled(summary[key])
+        return summary
+    
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {str(e)}")
+    
+    @staticmethod
+    def _clear_results(log_id: str, up_to_entry: Optional[int] = None, commit: bool = True):
+        """Delete a log's stored entries and anomalies (rollups are replaced on store)
+        
+        ``up_to_entry`` keeps entries with higher ids (and leaves anomalies
+        of those alone); ``commit=False`` leaves it to the caller's transaction.
+        """
+        try:
+            entries = LogEntry.query.filter(LogEntry.log_id == log_id)
+            anomalies = Anomaly.query.filter(Anomaly.log_id == log_id)
+            if up_to_entry is not None:
+                entries = entries.filter(LogEntry.id <= up_to_entry)
+                anomalies = anomalies.filter(Anomaly.entry_id <= up_to_entry)
+            anomalies.delete(synchronize_session=False)
+            entries.delete(synchronize_session=False)
+            if commit:
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Error clearing results of log {log_id}: {str(e)}")
+            db.session.rollback()
             raise
     
-    def _parse_file(self, file_path: str, format_parser: LogFormat) -> List[Dict]:
+    def _parse_file(self, file_path: str, format_parser: LogFormat,
+                    progress: Optional[ProgressPublisher] = None) -> List[Dict]:
         """Parse entire log file"""
+        entries = format_parser.parse_file(file_path, progress)
+        if entries is not None:
+            logger.info(f"Parsing complete: {len(entries)} entries ({format_parser.name}, whole file)")
+            return entries
+        
         entries = []
+        batch = []
         line_number = 0
+        bytes_parsed = 0
+        file_size = os.path.getsize(file_path) or 1
         
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
+            # Read bytes so progress can report exact offsets; lines are
+            # handed to the format in batches so it can decode them together
+            with open(file_path, 'rb') as f:
+                for raw_line in f:
                     line_number += 1
+                    bytes_parsed += len(raw_line)
+                    line = raw_line.decode('utf-8', errors='ignore').strip()
+                    if line:
+                        batch.append((line_number, line))
                     
-                    if not line.strip():
-                        continue
-                    
-                    parsed = format_parser.parse_line(line)
-                    if parsed:
-                        parsed['raw_log'] = line.strip()
-                        parsed['line_number'] = line_number
-                        entries.append(parsed)
-                    
-                    # Progress update every 1000 lines
-                    if line_number % 1000 == 0:
+                    if line_number % self.PARSE_BATCH_LINES == 0:
+                        self._parse_batch(format_parser, batch, entries)
+                        batch = []
+                        
+                        if progress:
+                            progress.update(
+                                progress=10 + int(40 * bytes_parsed / file_size),
+                                bytes_parsed=bytes_parsed,
+                                lines_parsed=line_number,
+                                entries_parsed=len(entries)
+                            )
                         logger.info(f"Parsed {line_number} lines, found {len(entries)} valid entries")
+                
+                self._parse_batch(format_parser, batch, entries)
             
             logger.info(f"Parsing complete: {len(entries)} entries from {line_number} lines")
             return entries
@@ -433,13 +1326,25 @@ class LogParserService:
             logger.error(f"Error parsing file: {str(e)}")
             raise
     
-    def _store_entries(self, log_id: str, entries: List[Dict]):
-        """Store parsed entries in database"""
+    @staticmethod
+    def _parse_batch(format_parser: LogFormat, batch: List[Tuple[int, str]], entries: List[Dict]):
+        """Parse ``(line_number, line)`` pairs and append the valid entries"""
+        parsed_lines = format_parser.parse_lines([line for _, line in batch])
+        for (line_number, line), parsed in zip(batch, parsed_lines):
+            if parsed:
+                parsed['raw_log'] = line
+                parsed['line_number'] = line_number
+                entries.append(parsed)
+    
+    def _store_entries(self, log_id: str, entries: List[Dict],
+                       progress: Optional[ProgressPublisher] = None, commit: bool = True):
+        """Store parsed entries in database, committing each batch unless ``commit=False``"""
         try:
             # Batch insert for performance
             batch_size = 1000
             for i in range(0, len(entries), batch_size):
                 batch = entries[i:i + batch_size]
+                encode_dimensions(batch)
                 db_entries = []
                 
                 for entry in batch:
@@ -447,21 +1352,33 @@ class LogParserService:
                         log_id=log_id,
                         timestamp=entry['timestamp'],
                         src_ip=entry.get('src_ip'),
-                        dest_host=entry.get('dest_host'),
-                        method=entry.get('method'),
+                        dest_host_id=entry['dest_host_id'],
+                        method_id=entry['method_id'],
                         url=entry.get('url'),
                         status_code=entry.get('status_code'),
                         response_size=entry.get('response_size'),
-                        user_agent=entry.get('user_agent'),
-                        referer=entry.get('referer'),
+                        user_agent_id=entry['user_agent_id'],
+                        referer_id=entry['referer_id'],
                         raw_log=entry['raw_log'],
+                        raw_offset=entry.get('raw_offset'),
+                        raw_length=entry.get('raw_length'),
                         parsed_fields=entry.get('parsed_fields'),
-                        line_number=entry['line_number']
+                        line_number=entry['line_number'],
+                        repeat_count=entry_weight(entry),
+                        last_timestamp=entry.get('last_timestamp')
                     )
                     db_entries.append(db_entry)
                 
                 db.session.bulk_save_objects(db_entries)
-                db.session.commit()
+                if commit:
+                    db.session.commit()
+                
+                if progress:
+                    rows_stored = i + len(batch)
+                    progress.update(
+                        progress=50 + int(20 * rows_stored / len(entries)),
+                        rows_stored=rows_stored
+                    )
                 
                 logger.info(f"Stored batch {i//batch_size + 1}: {len(batch)} entries")
             
@@ -471,26 +1388,35 @@ class LogParserService:
             raise
     
     def _generate_summary(self, entries: List[Dict]) -> Dict:
-        """Generate summary statistics for the log file"""
+        """Generate summary statistics for the log file
+        
+        Counts are weighted by ``repeat_count``, so they describe the
+        original lines whether or not duplicates were collapsed.
+        """
         if not entries:
             return {}
         
         try:
             # Convert to DataFrame for easy analysis
             df = pd.DataFrame(entries)
+            weights = pd.Series([entry_weight(entry) for entry in entries], index=df.index)
+            
+            def counts(column: str) -> pd.Series:
+                return weights.groupby(df[column]).sum().sort_values(ascending=False, kind='stable')
             
             summary = {
                 'total_entries': len(entries),
+                'total_lines': int(weights.sum()),
                 'date_range': {
                     'start': min(entry['timestamp'] for entry in entries).isoformat(),
-                    'end': max(entry['timestamp'] for entry in entries).isoformat()
+                    'end': max(entry.get('last_timestamp', entry['timestamp']) for entry in entries).isoformat()
                 },
                 'unique_ips': len(df['src_ip'].dropna().unique()) if 'src_ip' in df.columns else 0,
                 'unique_hosts': len(df['dest_host'].dropna().unique()) if 'dest_host' in df.columns else 0,
-                'methods': df['method'].value_counts().to_dict() if 'method' in df.columns else {},
-                'status_codes': df['status_code'].value_counts().to_dict() if 'status_code' in df.columns else {},
-                'top_ips': df['src_ip'].value_counts().head(10).to_dict() if 'src_ip' in df.columns else {},
-                'top_hosts': df['dest_host'].value_counts().head(10).to_dict() if 'dest_host' in df.columns else {},
+                'methods': counts('method').to_dict() if 'method' in df.columns else {},
+                'status_codes': counts('status_code').to_dict() if 'status_code' in df.columns else {},
+                'top_ips': counts('src_ip').head(10).to_dict() if 'src_ip' in df.columns else {},
+                'top_hosts': counts('dest_host').head(10).to_dict() if 'dest_host' in df.columns else {},
                 'hourly_distribution': self._get_hourly_distribution(entries)
             }
             
@@ -506,7 +1432,7 @@ class LogParserService:
             hourly_counts = {}
             for entry in entries:
                 hour = entry['timestamp'].hour
-                hourly_counts[hour] = hourly_counts.get(hour, 0) + 1
+                hourly_counts[hour] = hourly_counts.get(hour, 0) + entry_weight(entry)
             
             return hourly_counts
         except Exception as e:
@@ -0,0 +1,212 @@
+import os
+import time
+import pstats
+import logging
+import resource
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Memory measurement per stage: 'rss' (sampled, near-zero overhead),
+# 'tracemalloc' (exact Python allocations, slows jobs down) or 'off'
+MEMORY_MODES = ('rss', 'tracemalloc', 'off')
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, if /proc is available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _RssSampler(threading.Thread):
+    """Background thread tracking peak RSS between two ``take_peak`` calls"""
+
+    def __init__(self, interval: float = 0.05):
+        super().__init__(name='rss-sampler', daemon=True)
+        self.interval = interval
+        self.peak = _current_rss_bytes() or 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = _current_rss_bytes()
+            if rss and rss > self.peak:
+                self.peak = rss
+
+    def take_peak(self) -> int:
+        """Peak since the previous call (including the current RSS)"""
+        peak = max(self.peak, _current_rss_bytes() or 0)
+        self.peak = _current_rss_bytes() or 0
+        return peak
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class JobProfiler:
+    """Per-stage wall time, CPU time, row counts and peak memory of one job
+
+    ``stage()`` blocks can nest (detectors run inside the detection stage);
+    records keep their parent's name so the profile reads as a tree, and a
+    parent's peak memory includes its children's. With
+    ``cprofile=True`` the whole job also runs under cProfile and the stats
+    are dumped to ``PROFILE_FOLDER`` for offline analysis.
+    """
+
+    def __init__(self, log_id: str, task: str = 'process', cprofile: bool = False,
+                 memory: Optional[str] = None, profile_folder: Optional[str] = None):
+        self.log_id = str(log_id)
+        self.task = task
+        self.memory = memory or os.getenv('JOB_PROFILE_MEMORY', 'rss')
+        if self.memory not in MEMORY_MODES:
+            self.memory = 'rss'
+        self.cprofile = cprofile or os.getenv('JOB_CPROFILE', 'false').lower() == 'true'
+        self.profile_folder = profile_folder or current_app.config['PROFILE_FOLDER']
+
+        self.stages: List[Dict] = []
+        self._stack: List[Dict] = []
+        self._peaks: Dict[int, int] = {}
+        self._sampler = None
+        self._profiler = None
+        self._owns_tracemalloc = False
+        self._started_wall = None
+        self._started_cpu = None
+        self._started_at = None
+        self.cprofile_path = None
+        self._result = None
+
+    def start(self):
+        """Begin measuring the job"""
+        self._started_at = datetime.utcnow()
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+        if self.memory == 'rss':
+            self._sampler = _RssSampler()
+            self._sampler.start()
+        elif self.memory == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+        if self.cprofile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def stop(self) -> Dict:
+        """Stop measuring and return the profile as a JSON-serializable dict"""
+        if self._result is not None:
+            return self._result
+
+        if self._profiler:
+            self._profiler.disable()
+            self.cprofile_path = self._dump_cprofile()
+        if self._sampler:
+            self._sampler.stop()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+        self._result = self.to_dict()
+        return self._result
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """Measure a block; yields its record so ``record['rows_out']`` can be set"""
+        record = dict(name=name, parent=self._stack[-1]['name'] if self._stack else None,
+                             rows_in=rows_in, rows_out=None)
+        self.stages.append(record)
+        self._fold_peak()
+        self._stack.append(record)
+        self._peaks[id(record)] = 0
+
+        started_wall = time.perf_counter()
+        started_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_ms'] = round((time.perf_counter() - started_wall) * 1000, 2)
+            record['cpu_ms'] = round((time.process_time() - started_cpu) * 1000, 2)
+
+            self._fold_peak()
+            peak = self._peaks.pop(id(record))
+            if self.memory != 'off':
+                record['peak_mb'] = round(peak / (1024 * 1024), 1)
+            self._stack.pop()
+
+    def to_dict(self) -> Dict:
+        """Profile of the job so far"""
+        wall = (time.perf_counter() - self._started_wall) * 1000 if self._started_wall else None
+        cpu = (time.process_time() - self._started_cpu) * 1000 if self._started_cpu else None
+        return {
+            'task': self.task,
+            'started_at': self._started_at.isoformat() if self._started_at else None,
+            'wall_ms': round(wall, 2) if wall is not None else None,
+            'cpu_ms': round(cpu, 2) if cpu is not None else None,
+            'memory': self.memory,
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'stages': self.stages,
+            'cprofile': os.path.basename(self.cprofile_path) if self.cprofile_path else None
+        }
+
+    def _fold_peak(self):
+        """Add the peak since the last stage boundary to every open stage"""
+        if self._sampler:
+            peak = self._sampler.take_peak()
+        elif self.memory == 'tracemalloc' and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        else:
+            return
+
+        for record in self._stack:
+            self._peaks[id(record)] = max(self._peaks[id(record)], peak)
+
+    def _dump_cprofile(self) -> Optional[str]:
+        """Write the cProfile stats of the job (load with pstats or snakeviz)"""
+        try:
+            os.makedirs(self.profile_folder, exist_ok=True)
+            path = os.path.join(
+                self.profile_folder,
+                f"{self.log_id}-{self.task}-{self._started_at:%Y%m%d%H%M%S}.prof"
+            )
+            self._profiler.dump_stats(path)
+
+            top = pstats.Stats(self._profiler).sort_stats('cumulative')
+            logger.info(f"cProfile for log {self.log_id} written to {path} ({top.total_tt:.2f}s profiled)")
+            return path
+        except Exception as e:
+            logger.warning(f"Could not write cProfile dump for log {self.log_id}: {str(e)}")
+            return None
+
+
+@contextmanager
+def profile_stage(profiler: Optional[JobProfiler], name: str, rows_in: Optional[int] = None):
+    """``profiler.stage(...)`` that is a no-op when profiling isn't active"""
+    if profiler is None:
+        yield {}
+        return
+    with profiler.stage(name, rows_in) as record:
+        yield record
+
+
+def save_profile(log_file, profile: Dict, error: Optional[str] = None):
+    """Keep the latest profile per task (preview, process, reanalyze) on the LogFile; caller commits
+
+    The stage timings also feed the ingest rows/s counters on ``/metrics``.
+    """
+    from app.services.metrics import record_job_profile
+
+    record_job_profile(profile, error)
+    if error:
+        profile = dict(profile, error=error)
+    log_file.profile = dict(log_file.profile or {}, **{profile['task']: profile})
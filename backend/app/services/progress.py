@@ -0,0 +1,102 @@
+import json
+import time
+import logging
+from typing import Dict, Iterator, Optional
+
+from app.services.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_CHANNEL = 'log_progress:{log_id}'
+PROGRESS_STATE_KEY = 'log_progress_state:{log_id}'
+
+# Stages after which no further events are published
+TERMINAL_STAGES = ('ready', 'error')
+
+
+class ProgressPublisher:
+    """Publish fine-grained processing progress of one log file to Redis
+
+    Every event is published on a per-log pub/sub channel and also stored
+    as the latest snapshot, so late subscribers start from current state.
+    Publishing never raises: progress is best-effort and must not break
+    processing.
+    """
+
+    def __init__(self, log_id: str, min_interval: float = 0.25):
+        self.log_id = str(log_id)
+        self.min_interval = min_interval
+        self.state = {'log_id': self.log_id, 'stage': 'queued', 'progress': 0}
+        self._last_publish = 0.0
+
+    def stage(self, stage: str, progress: int, **fields):
+        """Publish a stage transition (always sent)"""
+        self.state = {'log_id': self.log_id, 'stage': stage, 'progress': progress}
+        self.state.update(fields)
+        self._publish()
+
+    def update(self, force: bool = False, **fields):
+        """Publish counters within the current stage (rate limited)"""
+        self.state.update(fields)
+        if force or time.monotonic() - self._last_publish >= self.min_interval:
+            self._publish()
+
+    def _publish(self):
+        self._last_publish = time.monotonic()
+        payload = json.dumps(dict(self.state, ts=time.time()), default=str)
+        try:
+            pipe = get_redis().pipeline()
+            pipe.set(PROGRESS_STATE_KEY.format(log_id=self.log_id), payload, ex=86400)
+            pipe.publish(PROGRESS_CHANNEL.format(log_id=self.log_id), payload)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Progress publish failed for log {self.log_id}: {str(e)}")
+
+
+def get_progress_snapshot(log_id: str) -> Optional[Dict]:
+    """Latest published progress of a log file, if any"""
+    try:
+        raw = get_redis().get(PROGRESS_STATE_KEY.format(log_id=log_id))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"Progress snapshot read failed for log {log_id}: {str(e)}")
+        return None
+
+
+def progress_event_stream(log_id: str, initial: Dict, heartbeat: float = 15.0) -> Iterator[str]:
+    """Yield Server-Sent Events for a log until processing finishes
+
+    ``initial`` is sent first (the Redis snapshot or the database state), so
+    clients always receive the current status immediately.
+    """
+    yield f"event: progress\ndata: {json.dumps(initial, default=str)}\n\n"
+    if initial.get('stage') in TERMINAL_STAGES:
+        return
+
+    pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(PROGRESS_CHANNEL.format(log_id=log_id))
+    try:
+        # Re-check the snapshot after subscribing to close the race with a
+        # stage transition that happened in between
+        snapshot = get_progress_snapshot(log_id)
+        if snapshot and snapshot.get('stage') in TERMINAL_STAGES:
+            yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+            return
+
+        last_sent = time.monotonic()
+        while True:
+            message = pubsub.get_message(timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= heartbeat:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+
+            data = message['data'].decode('utf-8') if isinstance(message['data'], bytes) else message['data']
+            last_sent = time.monotonic()
+            yield f"event: progress\ndata: {data}\n\n"
+
+            if json.loads(data).get('stage') in TERMINAL_STAGES:
+                return
+    finally:
+        pubsub.close()
@@ -0,0 +1,239 @@
+import os
+import zlib
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import current_app
+
+try:
+    import zstandard
+except ImportError:  # zlib blocks only
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+RAW_LOG_STORAGE_MODES = ('inline', 'offsets')
+
+# Container: independently compressed blocks of BLOCK_BYTES raw bytes each,
+# then the compressed offset of every block (plus the end), then a footer
+MAGIC = b'LSBLOCK1'
+FOOTER = struct.Struct('<QQIB')  # index offset, raw size, block size, codec
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+
+def raw_log_storage() -> str:
+    """Configured raw line storage: inline text or offsets into the block store"""
+    mode = os.getenv('RAW_LOG_STORAGE', 'inline').strip().lower()
+    if mode not in RAW_LOG_STORAGE_MODES:
+        raise ValueError(f"Unknown RAW_LOG_STORAGE: {mode}")
+    return mode
+
+
+def block_store_path(log_id: str) -> str:
+    """Where the compressed original of a log is kept"""
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], f'{log_id}.blocks')
+
+
+def is_block_store(path: str) -> bool:
+    return path.endswith('.blocks')
+
+
+def has_block_store(log_id: str) -> bool:
+    """Whether a log's raw lines are (at least partly) kept in its block store"""
+    return os.path.exists(block_store_path(log_id))
+
+
+def write_block_store(source_path: str, target_path: str, block_bytes: Optional[int] = None) -> int:
+    """Compress a file into a seekable block container; returns its size
+
+    zstd is used when ``zstandard`` is installed, zlib otherwise; readers
+    pick the codec from the footer.
+    """
+    block_bytes = block_bytes or int(os.getenv('RAW_STORE_BLOCK_BYTES', 64 * 1024))
+    if zstandard is not None:
+        codec = CODEC_ZSTD
+        compress = zstandard.ZstdCompressor(level=int(os.getenv('RAW_STORE_ZSTD_LEVEL', 3))).compress
+    else:
+        codec = CODEC_ZLIB
+        compress = lambda block: zlib.compress(block, 6)
+
+    tmp_path = f'{target_path}.tmp'
+    offsets = []
+    raw_size = 0
+    with open(source_path, 'rb') as source, open(tmp_path, 'wb') as target:
+        target.write(MAGIC)
+        while True:
+            block = source.read(block_bytes)
+            if not block:
+                break
+            offsets.append(target.tell())
+            target.write(compress(block))
+            raw_size += len(block)
+        offsets.append(target.tell())
+
+        index_offset = target.tell()
+        target.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        target.write(FOOTER.pack(index_offset, raw_size, block_bytes, codec))
+        target.write(MAGIC)
+        size = target.tell()
+    os.replace(tmp_path, target_path)
+
+    logger.info(f"Stored {raw_size} bytes as {len(offsets) - 1} blocks ({size} bytes compressed)")
+    return size
+
+
+class BlockStore:
+    """Random access to the raw bytes of a block container"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            f.seek(-(FOOTER.size + len(MAGIC)), os.SEEK_END)
+            footer = f.read(FOOTER.size + len(MAGIC))
+            if footer[FOOTER.size:] != MAGIC:
+                raise ValueError(f"Not a block store: {path}")
+            index_offset, self.raw_size, self.block_bytes, codec = FOOTER.unpack(footer[:FOOTER.size])
+            index_end = os.path.getsize(path) - len(footer)
+            f.seek(index_offset)
+            index = f.read(index_end - index_offset)
+        self.offsets = struct.unpack(f'<{len(index) // 8}Q', index)
+        self.block_count = len(self.offsets) - 1
+
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read this block store")
+            self._decompress = zstandard.ZstdDecompressor().decompress
+        else:
+            self._decompress = zlib.decompress
+
+    def block(self, number: int) -> bytes:
+        """Decompressed block, served from the shared block cache"""
+        key = (self.path, number)
+        data = _block_cache.get(key)
+        if data is None:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offsets[number])
+                data = self._decompress(f.read(self.offsets[number + 1] - self.offsets[number]))
+            _block_cache.set(key, data)
+        return data
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Raw bytes ``[offset, offset + length)``, across block boundaries if needed"""
+        first = offset // self.block_bytes
+        last = min((offset + max(length, 1) - 1) // self.block_bytes, self.block_count - 1)
+        data = b''.join(self.block(number) for number in range(first, last + 1))
+        start = offset - first * self.block_bytes
+        return data[start:start + length]
+
+    def iter_blocks(self) -> Iterator[bytes]:
+        """Decompressed blocks in order, bypassing the cache (downloads)"""
+        with open(self.path, 'rb') as f:
+            for number in range(self.block_count):
+                f.seek(self.offsets[number])
+                yield self._decompress(f.read(self.offsets[number + 1] - self.offsets[number]))
+
+
+class _BlockCache:
+    """Thread-safe LRU of decompressed blocks shared by all stores of a process"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+            return data
+
+    def set(self, key, data: bytes):
+        with self._lock:
+            self._data[key] = data
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+_block_cache = _BlockCache(int(os.getenv('RAW_BLOCK_CACHE_SIZE', 256)))
+
+
+@lru_cache(maxsize=64)
+def _open_store(path: str, mtime: float) -> BlockStore:
+    return BlockStore(path)
+
+
+def open_block_store(path: str) -> BlockStore:
+    """Block store of a container, with its index cached until the file changes"""
+    return _open_store(path, os.path.getmtime(path))
+
+
+def index_raw_lines(file_path: str, entries: List[Dict]) -> int:
+    """Point entries at their source line instead of keeping ``raw_log``
+
+    Sets ``raw_offset``/``raw_length`` (bytes, line ending excluded) and
+    clears ``raw_log`` for entries whose line reads back identically;
+    the others (rebuilt CSV rows, sampled lines) keep their text. Returns
+    the number of entries converted.
+    """
+    by_line = {entry['line_number']: entry for entry in entries if entry.get('line_number')}
+    converted = 0
+    offset = 0
+
+    with open(file_path, 'rb') as f:
+        for line_number, raw_line in enumerate(f, start=1):
+            entry = by_line.get(line_number)
+            if entry is not None:
+                line = raw_line.rstrip(b'\r\n')
+                if line.decode('utf-8', errors='ignore').strip() == entry['raw_log']:
+                    entry['raw_offset'] = offset
+                    entry['raw_length'] = len(line)
+                    entry['raw_log'] = None
+                    converted += 1
+            offset += len(raw_line)
+
+    logger.info(f"Indexed {converted} of {len(entries)} raw lines by offset")
+    return converted
+
+
+def read_raw_lines(log_id: str, spans: Sequence[Tuple[int, int]]) -> List[str]:
+    """Raw lines of a log for ``(offset, length)`` spans, in the given order"""
+    store = open_block_store(block_store_path(log_id))
+    return [
+        store.read(offset, length).decode('utf-8', errors='ignore').strip()
+        for offset, length in spans
+    ]
+
+
+def resolve_raw_logs(entries: List[Dict]):
+    """Fill in ``raw_log`` of entry dicts stored as offsets
+
+    Entries carry ``log_id``, ``raw_offset`` and ``raw_length``; those keys
+    are removed so payloads keep their documented shape.
+    """
+    pending: Dict[str, List[Dict]] = {}
+    for entry in entries:
+        log_id = entry.pop('log_id', None)
+        if entry.get('raw_log') is None and entry.get('raw_offset') is not None:
+            pending.setdefault(str(log_id), []).append(entry)
+
+    for log_id, group in pending.items():
+        # Reading in file order keeps consecutive lookups in the same block
+        group.sort(key=lambda entry: entry['raw_offset'])
+        try:
+            lines = read_raw_lines(log_id, [(entry['raw_offset'], entry['raw_length']) for entry in group])
+        except OSError as e:
+            logger.warning(f"Raw lines of log {log_id} unavailable: {str(e)}")
+            lines = [None] * len(group)
+        for entry, line in zip(group, lines):
+            entry['raw_log'] = line
+
+    for entry in entries:
+        entry.pop('raw_offset', None)
+        entry.pop('raw_length', None)
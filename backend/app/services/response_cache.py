@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import logging
+from functools import wraps
+
+from flask import request, current_app, g
+from flask_jwt_extended import get_jwt_identity
+
+from app.services.cache import get_redis
+from app.services.compression import base_etag, encoded_etag, response_encoding
+from app.services.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+LOG_VERSION_KEY = 'log_version:{log_id}'
+RESPONSE_KEY = 'resp:{digest}'
+
+
+def get_log_version(log_id: str) -> int:
+    """Current cache version of a log file (0 if never bumped)"""
+    version = get_redis().get(LOG_VERSION_KEY.format(log_id=log_id))
+    return int(version) if version is not None else 0
+
+
+def bump_log_version(log_id: str):
+    """Invalidate every cached response of a log file
+
+    Called whenever a log's derived data changes (re-detection, new
+    entries, deletion); old cache entries simply stop being addressed and
+    expire on their own.
+    """
+    try:
+        get_redis().incr(LOG_VERSION_KEY.format(log_id=log_id))
+    except Exception as e:
+        logger.warning(f"Failed to bump cache version for log {log_id}: {str(e)}")
+
+
+def mark_cacheable(status: str):
+    """Allow the current response to be cached (only for fully processed logs)"""
+    g.response_cacheable = status == 'ready'
+
+
+def _cache_key(user_id: str, log_id: str, version: int) -> str:
+    """Build the cache key from user, route, query args and log version"""
+    args = sorted(request.args.items(multi=True))
+    raw = json.dumps([str(user_id), request.path, args, str(log_id), version])
+    return RESPONSE_KEY.format(digest=hashlib.sha256(raw.encode('utf-8')).hexdigest())
+
+
+def _json_response(body: bytes, etag: str):
+    """Build a revalidatable JSON response"""
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _etag_matches(etag: str) -> bool:
+    """Whether If-None-Match names this body, in any content coding"""
+    if_none_match = request.if_none_match
+    return if_none_match.star_tag or any(
+        base_etag(tag) == etag for tag in if_none_match.as_set(include_weak=True)
+    )
+
+
+def _not_modified(etag: str, body: bytes):
+    """Build an empty 304 response with the ETag the 200 would have carried"""
+    response = current_app.response_class(status=304)
+    response.set_etag(encoded_etag(etag, response_encoding(len(body))))
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_response(f):
+    """Serve a log-scoped GET endpoint from the Redis response cache
+
+    Must sit below ``jwt_required`` and above ``marshal_with`` (if any). The wrapped
+    resource calls ``mark_cacheable(status)`` once ownership is verified;
+    only those responses are stored. Cached responses carry a strong ETag
+    (hash of the body) so ``If-None-Match`` revalidation is answered with a
+    304 from Redis alone. Compression appends the content coding to the
+    ETag (``"<sha256>-br"``), so tags are matched on their base hash.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        log_id = kwargs.get('log_id')
+        ttl = int(os.getenv('RESPONSE_CACHE_TTL', 3600))
+
+        try:
+            redis_client = get_redis()
+            cache_key = _cache_key(get_jwt_identity(), log_id, get_log_version(log_id))
+            etag, body = redis_client.hmget(cache_key, 'etag', 'body')
+        except Exception as e:
+            logger.warning(f"Response cache unavailable: {str(e)}")
+            return f(*args, **kwargs)
+
+        if etag is not None and body is not None:
+            etag = etag.decode('utf-8')
+            if _etag_matches(etag):
+                return _not_modified(etag, body)
+            return _json_response(body, etag)
+
+        g.response_cacheable = False
+        result = f(*args, **kwargs)
+
+        # Errors come back as tuples/responses; only plain payloads are cached
+        if not g.response_cacheable or isinstance(result, (tuple, current_app.response_class)):
+            return result
+
+        body = dumps(result)
+        etag = hashlib.sha256(body).hexdigest()
+
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hset(cache_key, mapping={'etag': etag, 'body': body})
+            pipe.expire(cache_key, ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+        if _etag_matches(etag):
+            return _not_modified(etag, body)
+        return _json_response(body, etag)
+
+    return wrapper
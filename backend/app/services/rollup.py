@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+
+from app import db
+from app.models import LogRollup
+from app.services.collapse import entry_weight
+
+logger = logging.getLogger(__name__)
+
+
+class RollupService:
+    """Per-minute rollups of log traffic used to serve dashboard charts"""
+
+    DIMENSIONS = ('total', 'status_class', 'method', 'host')
+
+    # Supported chart bucket sizes (seconds)
+    INTERVALS = {
+        '1m': 60,
+        '5m': 300,
+        '15m': 900,
+        '1h': 3600,
+        '6h': 21600,
+        '1d': 86400
+    }
+
+    # Origin used to align buckets coarser than one minute
+    BUCKET_ORIGIN = datetime(2000, 1, 1)
+
+    def build_rollups(self, entries: List[Dict]) -> List[Dict]:
+        """Aggregate parsed entries into per-minute rollup rows
+
+        Collapsed entries count once per original line, in the minute of
+        their first occurrence.
+        """
+        totals = {}
+
+        for entry in entries:
+            bucket = entry['timestamp'].replace(second=0, microsecond=0)
+            weight = entry_weight(entry)
+            size = (entry.get('response_size') or 0) * weight
+            status_code = entry.get('status_code')
+
+            keys = (
+                ('total', ''),
+                ('status_class', f'{status_code // 100}xx' if status_code else 'unknown'),
+                ('method', (entry.get('method') or 'unknown')[:255]),
+                ('host', (entry.get('dest_host') or 'unknown')[:255])
+            )
+
+            for dimension, value in keys:
+                key = (bucket, dimension, value)
+                counts = totals.get(key)
+                if counts is None:
+                    counts = totals[key] = [0, 0]
+                counts[0] += weight
+                counts[1] += size
+
+        return [
+            {
+                'bucket': bucket,
+                'dimension': dimension,
+                'value': value,
+                'request_count': counts[0],
+                'bytes_total': counts[1]
+            }
+            for (bucket, dimension, value), counts in totals.items()
+        ]
+
+    def store_rollups(self, log_id: str, entries: List[Dict], commit: bool = True):
+        """Replace the rollups of a log file with ones built from the given entries
+
+        With ``commit=False`` the replacement is left to the caller's transaction.
+        """
+        try:
+            rows = self.build_rollups(entries)
+            for row in rows:
+                row['log_id'] = log_id
+
+            LogRollup.query.filter_by(log_id=log_id).delete(synchronize_session=False)
+
+            batch_size = 5000
+            for i in range(0, len(rows), batch_size):
+                db.session.bulk_insert_mappings(LogRollup, rows[i:i + batch_size])
+            if commit:
+                db.session.commit()
+
+            logger.info(f"Stored {len(rows)} rollup rows for log {log_id}")
+
+        except Exception as e:
+            logger.error(f"Error storing rollups: {str(e)}")
+            db.session.rollback()
+            raise
+
+    def get_series(self, log_id: str, dimension: str = 'total', interval: str = '5m',
+                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   top: int = 10) -> Dict:
+        """Merge per-minute rollups into a time-bucketed series"""
+        if dimension not in self.DIMENSIONS:
+            raise ValueError(f"Unsupported dimension: {dimension}")
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Unsupported interval: {interval}")
+
+        base_filters = [LogRollup.log_id == log_id, LogRollup.dimension == dimension]
+        if start:
+            base_filters.append(LogRollup.bucket >= start)
+        if end:
+            base_filters.append(LogRollup.bucket < end)
+
+        # Keep high-cardinality dimensions readable by folding the tail into 'other'
+        top_values = None
+        if dimension != 'total' and top:
+            top_stats = db.session.query(
+                LogRollup.value,
+                db.func.sum(LogRollup.request_count).label('request_count')
+            ).filter(*base_filters)\
+             .group_by(LogRollup.value)\
+             .order_by(db.desc('request_count'))\
+             .limit(top).all()
+            top_values = {stat.value for stat in top_stats}
+
+        bucket_expr = db.func.date_bin(
+            timedelta(seconds=self.INTERVALS[interval]),
+            LogRollup.bucket,
+            self.BUCKET_ORIGIN
+        ).label('bucket_start')
+
+        series_stats = db.session.query(
+            bucket_expr,
+            LogRollup.value,
+            db.func.sum(LogRollup.request_count).label('request_count'),
+            db.func.sum(LogRollup.bytes_total).label('bytes_total')
+        ).filter(*base_filters)\
+         .group_by('bucket_start', LogRollup.value)\
+         .order_by('bucket_start').all()
+
+        buckets = {}
+        for stat in series_stats:
+            point = buckets.get(stat.bucket_start)
+            if point is None:
+                point = buckets[stat.bucket_start] = {
+                    'timestamp': stat.bucket_start.isoformat(),
+                    'request_count': 0,
+                    'bytes_total': 0,
+                    'values': {}
+                }
+
+            point['request_count'] += int(stat.request_count)
+            point['bytes_total'] += int(stat.bytes_total)
+
+            if dimension != 'total':
+                value = stat.value if top_values is None or stat.value in top_values else 'other'
+                point['values'][value] = point['values'].get(value, 0) + int(stat.request_count)
+
+        return {
+            'dimension': dimension,
+            'interval': interval,
+            'series': list(buckets.values())
+        }
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import logging
+from typing import Dict, Optional
+
+from app.services.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionError(Exception):
+    """Raised when the ingest backlog is too deep to accept another job"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class IngestScheduler:
+    """Fair, size-aware scheduling of ingest jobs on top of Celery
+
+    Jobs are kept in per-user Redis lists, one set per lane. A lane (fast
+    for small files, heavy for large ones) only has a fixed number of
+    in-flight slots; whenever a slot frees up the next job is taken from
+    the next user in that lane's round-robin ring, so one user uploading
+    many files cannot starve everyone else. Celery only ever sees jobs that
+    can start right away.
+    """
+
+    FAST_LANE = 'fast'
+    HEAVY_LANE = 'heavy'
+
+    # Celery queue each lane dispatches to
+    QUEUES = {
+        FAST_LANE: 'ingest-fast',
+        HEAVY_LANE: 'ingest-heavy'
+    }
+
+    RING_KEY = 'ingest:ring:{lane}'
+    QUEUE_KEY = 'ingest:queue:{lane}:{user_id}'
+    INFLIGHT_KEY = 'ingest:inflight:{lane}'
+    BACKLOG_KEY = 'ingest:backlog'
+    USER_BACKLOG_KEY = 'ingest:backlog:{user_id}'
+    LOCK_KEY = 'ingest:dispatch_lock'
+
+    def __init__(self):
+        self.heavy_threshold = int(os.getenv('INGEST_HEAVY_THRESHOLD_BYTES', 20 * 1024 * 1024))
+        self.max_backlog = int(os.getenv('INGEST_MAX_BACKLOG', 100))
+        self.max_user_backlog = int(os.getenv('INGEST_MAX_USER_BACKLOG', 25))
+        self.retry_after = int(os.getenv('INGEST_RETRY_AFTER', 30))
+        self.job_timeout = int(os.getenv('INGEST_JOB_TIMEOUT', 3600))
+        self.slots = {
+            self.FAST_LANE: int(os.getenv('INGEST_FAST_SLOTS', 2)),
+            self.HEAVY_LANE: int(os.getenv('INGEST_HEAVY_SLOTS', 1))
+        }
+        self.redis = get_redis()
+
+    def lane_for(self, file_size: int, task: str = 'process') -> str:
+        """Pick the lane for a job based on its file size; previews only read a sample"""
+        if task == 'preview':
+            return self.FAST_LANE
+        return self.HEAVY_LANE if file_size >= self.heavy_threshold else self.FAST_LANE
+
+    def check_admission(self, user_id: str):
+        """Reject new work when the global or per-user backlog is too deep"""
+        backlog, user_backlog = self.redis.mget(
+            self.BACKLOG_KEY,
+            self.USER_BACKLOG_KEY.format(user_id=user_id)
+        )
+
+        if int(backlog or 0) >= self.max_backlog:
+            raise AdmissionError('Processing backlog is full, please retry later', self.retry_after)
+        if int(user_backlog or 0) >= self.max_user_backlog:
+            raise AdmissionError('Too many of your uploads are waiting to be processed', self.retry_after)
+
+    def submit(self, log_id: str, user_id: str, file_size: int, task: str = 'process',
+               priority: int = 5, options: Optional[Dict] = None) -> str:
+        """Queue a job for a user and dispatch whatever can start now"""
+        lane = self.lane_for(file_size, task)
+        job = json.dumps({
+            'log_id': str(log_id),
+            'user_id': str(user_id),
+            'task': task,
+            'priority': priority,
+            'file_size': file_size,
+            'options': options or {},
+            'queued_at': time.time()
+        })
+
+        queue_key = self.QUEUE_KEY.format(lane=lane, user_id=user_id)
+        ring_key = self.RING_KEY.format(lane=lane)
+
+        pipe = self.redis.pipeline()
+        pipe.rpush(queue_key, job)
+        pipe.incr(self.BACKLOG_KEY)
+        pipe.incr(self.USER_BACKLOG_KEY.format(user_id=user_id))
+        pipe.execute()
+
+        # Users enter the ring once, when their lane queue becomes non-empty
+        with self.redis.lock(self.LOCK_KEY, timeout=10, blocking_timeout=5):
+            if str(user_id).encode() not in self.redis.lrange(ring_key, 0, -1):
+                self.redis.rpush(ring_key, str(user_id))
+
+        logger.info(f"Queued {task} job for log {log_id} in {lane} lane (user {user_id})")
+        self.dispatch(lane)
+        return lane
+
+    def complete(self, lane: str, log_id: str):
+        """Free a lane slot after a job finished and start the next one"""
+        self.redis.zrem(self.INFLIGHT_KEY.format(lane=lane), str(log_id))
+        self.dispatch(lane)
+
+    def dispatch(self, lane: Optional[str] = None):
+        """Send queued jobs to Celery while their lane has free slots"""
+        from app.tasks import run_ingest_job
+
+        lanes = [lane] if lane else list(self.QUEUES)
+        to_send = []
+
+        with self.redis.lock(self.LOCK_KEY, timeout=10, blocking_timeout=5):
+            for current in lanes:
+                inflight_key = self.INFLIGHT_KEY.format(lane=current)
+                ring_key = self.RING_KEY.format(lane=current)
+
+                # Forget jobs whose worker died without reporting back
+                self.redis.zremrangebyscore(inflight_key, '-inf', time.time() - self.job_timeout)
+
+                while self.redis.zcard(inflight_key) < self.slots[current]:
+                    user_id = self.redis.lpop(ring_key)
+                    if user_id is None:
+                        break
+                    user_id = user_id.decode('utf-8')
+
+                    queue_key = self.QUEUE_KEY.format(lane=current, user_id=user_id)
+                    raw_job = self.redis.lpop(queue_key)
+
+                    # Round-robin: the user goes to the back of the ring if
+                    # they still have work in this lane
+                    if self.redis.llen(queue_key):
+                        self.redis.rpush(ring_key, user_id)
+
+                    if raw_job is None:
+                        continue
+
+                    job = json.loads(raw_job)
+                    pipe = self.redis.pipeline()
+                    pipe.zadd(inflight_key, {job['log_id']: time.time()})
+                    pipe.decr(self.BACKLOG_KEY)
+                    pipe.decr(self.USER_BACKLOG_KEY.format(user_id=user_id))
+                    pipe.execute()
+                    to_send.append((job, current))
+
+        # Publish outside the lock: eager/inline execution calls complete(),
+        # which dispatches again
+        for job, current in to_send:
+            run_ingest_job.apply_async(
+                args=[job, current],
+                queue=self.QUEUES[current],
+                priority=job['priority']
+            )
+            logger.info(f"Dispatched {job['task']} job for log {job['log_id']} to {self.QUEUES[current]}")
@@ -0,0 +1,343 @@
+import os
+import glob
+import shutil
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.services.detection_config import THRESHOLD_DETECTORS, calculate_severity
+
+logger = logging.getLogger(__name__)
+
+# Columns shared by all detectors, aligned with the entries (ordered by id)
+ENTRIES = 'entries'
+
+
+class DetectorScoreCache:
+    """Per-log raw detector scores stored as memory-mapped .npy columns
+
+    Detection writes what it computed before applying any threshold: model
+    scores, per-window/per-IP aggregates and the entry -> group mapping.
+    Re-tuning loads those columns with ``mmap_mode='r'`` and only redoes
+    the selection step, so no feature engineering or model fitting is
+    repeated. Layout: ``<SCORE_CACHE_FOLDER>/<log_id>/<detector>.<column>.npy``.
+    """
+
+    def __init__(self, log_id: str, folder: Optional[str] = None):
+        self.log_id = str(log_id)
+        self.path = os.path.join(folder or current_app.config['SCORE_CACHE_FOLDER'], self.log_id)
+
+    def save(self, name: str, columns: Dict[str, np.ndarray]):
+        """Write one detector's columns, replacing any previous version"""
+        os.makedirs(self.path, exist_ok=True)
+        for column, values in columns.items():
+            target = os.path.join(self.path, f'{name}.{column}.npy')
+            tmp_path = f'{target}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.asarray(values))
+            os.replace(tmp_path, target)
+
+    def load(self, name: str) -> Optional[Dict[str, np.ndarray]]:
+        """Memory-map one detector's columns, or None if they were never cached"""
+        paths = glob.glob(os.path.join(self.path, f'{name}.*.npy'))
+        if not paths:
+            return None
+        return {
+            os.path.basename(path)[len(name) + 1:-len('.npy')]: np.load(path, mmap_mode='r')
+            for path in paths
+        }
+
+    def delete(self):
+        """Remove all cached scores of the log"""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def copy_to(self, target: 'DetectorScoreCache', old_ids: np.ndarray, new_ids: np.ndarray) -> bool:
+        """Replace ``target``'s scores by these, for a clone whose entry ids map old -> new
+
+        ``old_ids`` must be sorted. Columns other than the entry ids are
+        hard-linked when possible (``save`` never writes into an existing
+        file). Returns False, leaving the target without scores, when there
+        is nothing to copy or an entry has no new id.
+        """
+        target.delete()
+        entry_ids = self.load(ENTRIES)
+        entry_ids = entry_ids.get('entry_id') if entry_ids is not None else None
+        if entry_ids is None:
+            return False
+
+        positions = np.searchsorted(old_ids, entry_ids)
+        if len(entry_ids) and (positions.max() >= len(old_ids) or (old_ids[positions] != entry_ids).any()):
+            logger.warning(f"Scores of log {self.log_id} refer to entries that were not cloned")
+            return False
+
+        os.makedirs(target.path, exist_ok=True)
+        for path in glob.glob(os.path.join(self.path, '*.npy')):
+            if os.path.basename(path) == f'{ENTRIES}.entry_id.npy':
+                continue
+            copy = os.path.join(target.path, os.path.basename(path))
+            try:
+                os.link(path, copy)
+            except OSError:
+                shutil.copyfile(path, copy)
+        target.save(ENTRIES, {'entry_id': new_ids[positions]})
+        return True
+
+    def select(self, detectors: List[str], thresholds: Dict,
+               min_samples: int = 10) -> Tuple[List[Dict], Dict[str, int], List[str]]:
+        """Apply thresholds to cached scores
+
+        Returns the anomalies, their count per re-tuned detector and the
+        detectors that had no cached scores.
+        """
+        base = self.load(ENTRIES)
+        anomalies, counts, missing = [], {}, []
+
+        for name in detectors:
+            scores = self.load(name) if base is not None else None
+            if scores is None:
+                missing.append(name)
+                continue
+            selected = select_anomalies(name, base, scores, thresholds, min_samples)
+            anomalies.extend(selected)
+            counts[name] = len(selected)
+
+        return anomalies, counts, missing
+
+
+def select_anomalies(name: str, base: Dict[str, np.ndarray], scores: Dict[str, np.ndarray],
+                     thresholds: Dict, min_samples: int = 10) -> List[Dict]:
+    """Turn one detector's raw scores into anomaly records for the given thresholds"""
+    if name not in THRESHOLD_DETECTORS:
+        raise ValueError(f"{name} has no thresholds to apply")
+    return _SELECTORS[name](base, scores, thresholds, min_samples)
+
+
+def _scaled_confidence(scores: np.ndarray) -> np.ndarray:
+    """Map isolation forest scores to 0-1, most anomalous = 1"""
+    spread = scores.max() - scores.min() if len(scores) else 0
+    if not spread:
+        return np.zeros(len(scores))
+    return 1 - (scores - scores.min()) / spread
+
+
+def _isolation_outliers(scores: np.ndarray, contamination: float,
+                        weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Outlier mask IsolationForest(contamination=...) would predict
+
+    The fitted forest does not depend on contamination; it only sets the
+    decision offset to that percentile of the training scores. With
+    ``weights`` (lines per collapsed entry) the percentile is taken over
+    lines instead of entries.
+    """
+    if weights is None or not (weights > 1).any():
+        return scores < np.percentile(scores, 100.0 * contamination)
+
+    order = np.argsort(scores, kind='stable')
+    lines_below = np.cumsum(weights[order]) - weights[order]
+    outliers = np.zeros(len(scores), dtype=bool)
+    outliers[order] = lines_below < contamination * weights.sum()
+    return outliers
+
+
+def _grouped(entry_group: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Indices of entries in the given groups, ordered by group"""
+    members = np.flatnonzero(np.isin(entry_group, groups))
+    return members[np.argsort(entry_group[members], kind='stable')]
+
+
+def _select_volume(base, scores, thresholds, min_samples) -> List[Dict]:
+    """Volume: (IP, 5 minute window) request counts scored by an isolation forest"""
+    window_score = scores['score']
+    if len(window_score) < min_samples:
+        return []
+
+    confidence = _scaled_confidence(window_score)
+    flagged = np.flatnonzero(_isolation_outliers(window_score, thresholds['volume_contamination']))
+    entry_window = scores['entry_window']
+    ips = base['ips']
+
+    anomalies = []
+    for i in _grouped(entry_window, flagged):
+        window = entry_window[i]
+        request_count = int(scores['window_count'][window])
+        window_start = scores['window_start'][window].astype('M8[us]').item()
+        window_conf = float(min(confidence[window], 1.0))
+        anomalies.append({
+            'entry_id': int(base['entry_id'][i]),
+            'anomaly_type': 'volume',
+            'reason': f"Unusual request volume: {request_count} requests from {ips[scores['window_ip'][window]]} in 5 minutes",
+            'confidence': window_conf,
+            'severity': calculate_severity(window_conf, request_count),
+            'model_used': 'isolation_forest',
+            'feature_contributions': {
+                'request_count': float(request_count),
+                'time_window': '5T'
+            },
+            'context_window_start': window_start,
+            'context_window_end': (scores['window_start'][window] + np.timedelta64(5, 'm')).astype('M8[us]').item(),
+            'related_entries_count': request_count
+        })
+
+    return anomalies
+
+
+def _select_behavioral(base, scores, thresholds, min_samples) -> List[Dict]:
+    """Behavioral: per-request feature vectors scored by an isolation forest"""
+    entry_score = scores['score']
+    if not len(entry_score):
+        return []
+
+    confidence = _scaled_confidence(entry_score)
+    features = scores['features']
+    methods = base['methods']
+
+    anomalies = []
+    # Caches written before entries had weights don't have the column
+    weights = base['weight'] if 'weight' in base else None
+    for i in np.flatnonzero(_isolation_outliers(entry_score, thresholds['behavioral_contamination'], weights)):
+        status_freq, size_z, method_freq, url_z = (float(value) for value in features[i])
+
+        reasons = []
+        if status_freq < 0.01:  # Rare status code
+            status = int(base['status'][i])
+            reasons.append(f"rare status code {status if status >= 0 else None}")
+        if method_freq < 0.01:  # Rare method
+            method = int(base['method'][i])
+            reasons.append(f"unusual HTTP method {methods[method] if method >= 0 else None}")
+        if url_z > 2:  # Very long URL
+            reasons.append("unusually long URL")
+
+        entry_conf = float(min(confidence[i], 1.0))
+        anomalies.append({
+            'entry_id': int(base['entry_id'][i]),
+            'anomaly_type': 'behavioral',
+            'reason': f"Behavioral anomaly: {', '.join(reasons) if reasons else 'unusual request pattern'}",
+            'confidence': entry_conf,
+            'severity': calculate_severity(entry_conf),
+            'model_used': 'isolation_forest',
+            'feature_contributions': {
+                'status_frequency': status_freq,
+                'response_size_zscore': size_z,
+                'method_frequency': method_freq,
+                'url_length_zscore': url_z
+            }
+        })
+
+    return anomalies
+
+
+def _select_temporal(base, scores, thresholds, min_samples) -> List[Dict]:
+    """Temporal: per-(IP, hour) request counts against the expected share"""
+    group_ip = scores['group_ip']
+    z_scores = scores['group_z']
+    eligible = scores['ip_requests'][group_ip] >= thresholds['temporal_min_requests']
+    flagged = np.flatnonzero(eligible & (z_scores > thresholds['temporal_z_score']))
+    ips = base['ips']
+
+    anomalies = []
+    for i in _grouped(scores['entry_group'], flagged):
+        group = scores['entry_group'][i]
+        hour = int(scores['group_hour'][group])
+        count = int(scores['group_count'][group])
+        expected = float(scores['group_expected'][group])
+        z_score = float(z_scores[group])
+        group_conf = min(z_score / 5, 1.0)  # Normalize to 0-1
+        anomalies.append({
+            'entry_id': int(base['entry_id'][i]),
+            'anomaly_type': 'temporal',
+            'reason': f"Unusual activity time: {count} requests from {ips[group_ip[group]]} at hour {hour} (expected ~{expected:.1f})",
+            'confidence': group_conf,
+            'severity': calculate_severity(group_conf),
+            'model_used': 'statistical_analysis',
+            'feature_contributions': {
+                'hour': hour,
+                'actual_count': count,
+                'expected_count': expected,
+                'z_score': z_score
+            }
+        })
+
+    return anomalies
+
+
+def _select_scanning(base, scores, thresholds, min_samples) -> List[Dict]:
+    """Scanning: IPs with many 404s on mostly distinct URLs"""
+    threshold = thresholds['scanning_404_count']
+    ip_404 = scores['ip_404']
+    ip_unique = scores['ip_404_unique']
+    scanners = (ip_404 > 0) & (ip_404 >= threshold) & (ip_unique >= threshold * thresholds['scanning_unique_ratio'])
+
+    entry_ip = base['ip']
+    candidates = np.flatnonzero(base['status'] == 404)
+    candidates = candidates[entry_ip[candidates] >= 0]
+    members = candidates[scanners[entry_ip[candidates]]]
+    members = members[np.argsort(entry_ip[members], kind='stable')]
+    ips = base['ips']
+
+    anomalies = []
+    for i in members:
+        ip = entry_ip[i]
+        count = int(ip_404[ip])
+        unique_urls = int(ip_unique[ip])
+        anomalies.append({
+            'entry_id': int(base['entry_id'][i]),
+            'anomaly_type': 'pattern',
+            'reason': f"Potential scanning activity: {count} 404 errors from {ips[ip]} across {unique_urls} different URLs",
+            'confidence': min(count / 50, 1.0),  # Scale confidence
+            'severity': 'high' if count > 50 else 'medium',
+            'model_used': 'pattern_analysis',
+            'feature_contributions': {
+                'total_404s': count,
+                'unique_urls': unique_urls,
+                'scanning_ratio': float(unique_urls / count)
+            }
+        })
+
+    return anomalies
+
+
+def _select_error_rate(base, scores, thresholds, min_samples) -> List[Dict]:
+    """Error rate: IPs whose share of 4xx/5xx responses is too high"""
+    totals = scores['ip_status_total']
+    errors = scores['ip_errors']
+    rates = np.divide(errors, totals, out=np.zeros(len(totals)), where=totals > 0)
+    offenders = (totals > 0) & (rates > thresholds['error_rate']) & (totals >= thresholds['error_min_requests'])
+
+    entry_ip = base['ip']
+    candidates = np.flatnonzero(base['status'] >= 400)
+    candidates = candidates[entry_ip[candidates] >= 0]
+    members = candidates[offenders[entry_ip[candidates]]]
+    members = members[np.argsort(entry_ip[members], kind='stable')]
+    ips = base['ips']
+
+    anomalies = []
+    for i in members:
+        ip = entry_ip[i]
+        rate = float(rates[ip])
+        confidence = min(rate, 1.0)
+        anomalies.append({
+            'entry_id': int(base['entry_id'][i]),
+            'anomaly_type': 'pattern',
+            'reason': f"High error rate: {rate:.1%} errors from {ips[ip]} ({int(errors[ip])}/{int(totals[ip])})",
+            'confidence': confidence,
+            'severity': calculate_severity(confidence),
+            'model_used': 'statistical_analysis',
+            'feature_contributions': {
+                'error_rate': rate,
+                'total_requests': int(totals[ip]),
+                'error_requests': int(errors[ip])
+            }
+        })
+
+    return anomalies
+
+
+_SELECTORS = {
+    'volume': _select_volume,
+    'behavioral': _select_behavioral,
+    'temporal': _select_temporal,
+    'scanning': _select_scanning,
+    'error_rate': _select_error_rate
+}
@@ -0,0 +1,221 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+import logging
+
+import orjson
+from flask import make_response
+from sqlalchemy.orm import defer
+
+from app import db
+from app.models import LogEntry, Anomaly
+from app.services.raw_store import resolve_raw_logs
+from app.services.dimensions import DIMENSION_MODELS, decode_dimensions, lookup_values
+
+logger = logging.getLogger(__name__)
+
+# Columns of the hot list endpoints, read as plain tuples instead of ORM
+# objects; names follow the documented response models once dimension ids
+# are decoded
+ENTRY_LIST_COLUMNS = (
+    LogEntry.id, LogEntry.timestamp, LogEntry.src_ip, LogEntry.dest_host_id, LogEntry.method_id,
+    LogEntry.url, LogEntry.status_code, LogEntry.response_size, LogEntry.user_agent_id,
+    LogEntry.repeat_count, LogEntry.last_timestamp
+)
+ENTRY_DETAIL_COLUMNS = ENTRY_LIST_COLUMNS + (LogEntry.referer_id, LogEntry.line_number)
+ANOMALY_COLUMNS = (
+    Anomaly.id, Anomaly.entry_id, Anomaly.anomaly_type, Anomaly.reason, Anomaly.confidence,
+    Anomaly.severity, Anomaly.model_used, Anomaly.feature_contributions,
+    Anomaly.context_window_start, Anomaly.context_window_end, Anomaly.related_entries_count,
+    Anomaly.detected_at
+)
+
+
+def _default(value):
+    """Fallback for types orjson doesn't know (INET addresses, Decimals)"""
+    return str(value)
+
+
+def dumps(data) -> bytes:
+    """Encode a response payload; datetimes come out as ISO 8601 like ``isoformat()``"""
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def output_json(data, code, headers=None):
+    """flask-restx JSON representation backed by orjson"""
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = 'application/json'
+    return response
+
+
+def rows_to_dicts(rows: Sequence, start: int = 0) -> List[Dict]:
+    """Turn result rows into dicts keyed by column name, from column ``start`` on"""
+    if not rows:
+        return []
+    keys = rows[0]._fields[start:]
+    return [dict(zip(keys, row[start:])) for row in rows]
+
+
+def entry_columns(include_raw: bool = True, include_parsed: bool = False,
+                  detail: bool = False) -> List:
+    """Columns to select for entry payloads built from tuples"""
+    columns = list(ENTRY_DETAIL_COLUMNS if detail else ENTRY_LIST_COLUMNS)
+    if include_raw:
+        # Offsets (and the log) locate lines kept in the block store
+        columns.extend((LogEntry.raw_log, LogEntry.raw_offset, LogEntry.raw_length, LogEntry.log_id))
+    if include_parsed:
+        columns.append(LogEntry.parsed_fields)
+    return columns
+
+
+def entry_load_options(include_raw: bool = True, include_parsed: bool = True) -> List:
+    """Query options that defer heavy LogEntry columns the caller won't serialize"""
+    options = []
+    if not include_raw:
+        options.append(defer(LogEntry.raw_log))
+    if not include_parsed:
+        options.append(defer(LogEntry.parsed_fields))
+    return options
+
+
+def load_anomalies_by_entry(entry_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """Load the anomalies of many entries with one IN query, grouped by entry"""
+    entry_ids = list(set(entry_ids))
+    if not entry_ids:
+        return {}
+
+    anomalies = Anomaly.query\
+        .filter(Anomaly.entry_id.in_(entry_ids))\
+        .order_by(Anomaly.confidence.desc())\
+        .all()
+
+    grouped = {}
+    for anomaly in anomalies:
+        grouped.setdefault(anomaly.entry_id, []).append(anomaly.to_dict())
+    return grouped
+
+
+def resolve_entry_values(log_entries: List[LogEntry], include_raw: bool = True) -> Dict[int, Dict]:
+    """``LogEntry.resolve_values()`` of many entries, one lookup per dimension and block store"""
+    resolved = {entry.id: {} for entry in log_entries}
+    for name in DIMENSION_MODELS:
+        values = lookup_values(name, {getattr(entry, f'{name}_id') for entry in log_entries})
+        for entry in log_entries:
+            resolved[entry.id][name] = values.get(getattr(entry, f'{name}_id'))
+
+    if include_raw:
+        lines = [
+            {'id': entry.id, 'log_id': entry.log_id, 'raw_log': entry.raw_log,
+             'raw_offset': entry.raw_offset, 'raw_length': entry.raw_length}
+            for entry in log_entries
+        ]
+        resolve_raw_logs(lines)
+        for line in lines:
+            resolved[line['id']]['raw_log'] = line['raw_log']
+    return resolved
+
+
+def serialize_anomalies_with_entries(anomalies: List[Anomaly], include_raw: bool = True,
+                                     include_parsed: bool = True) -> List[Dict]:
+    """Serialize a page of anomalies together with their log entries
+
+    Entries are fetched with one IN query and their anomalies with another,
+    so the query count does not grow with the page size.
+    """
+    entry_ids = list({anomaly.entry_id for anomaly in anomalies})
+
+    entries = {}
+    resolved = {}
+    if entry_ids:
+        entry_rows = LogEntry.query\
+            .options(*entry_load_options(include_raw, include_parsed))\
+            .filter(LogEntry.id.in_(entry_ids))\
+            .all()
+        entries = {entry.id: entry for entry in entry_rows}
+        resolved = resolve_entry_values(entry_rows, include_raw)
+
+    anomalies_by_entry = load_anomalies_by_entry(entries.keys())
+
+    result = []
+    for anomaly in anomalies:
+        log_entry = entries.get(anomaly.entry_id)
+        result.append({
+            'anomaly': anomaly.to_dict(),
+            'log_entry': log_entry.to_dict(
+                include_raw=include_raw,
+                include_parsed=include_parsed,
+                anomalies=anomalies_by_entry.get(log_entry.id, []),
+                resolved=resolved[log_entry.id]
+            ) if log_entry else None
+        })
+    return result
+
+
+def load_anomaly_rows_by_entry(entry_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """``load_anomalies_by_entry`` reading tuples instead of Anomaly objects"""
+    entry_ids = list(set(entry_ids))
+    if not entry_ids:
+        return {}
+
+    rows = db.session.query(*ANOMALY_COLUMNS)\
+        .filter(Anomaly.entry_id.in_(entry_ids))\
+        .order_by(Anomaly.confidence.desc())\
+        .all()
+
+    grouped = {}
+    for anomaly in rows_to_dicts(rows):
+        grouped.setdefault(anomaly['entry_id'], []).append(anomaly)
+    return grouped
+
+
+def entry_rows_payload(rows: Sequence, include_raw: bool = True, start: int = 0) -> List[Dict]:
+    """Entries list payload straight from ``entry_columns()`` rows (from column ``start`` on)
+
+    Matches ``LogEntry`` in the API docs: ``raw_log`` is null when left out.
+    """
+    entries = rows_to_dicts(rows, start)
+    decode_dimensions(entries)
+    anomalies_by_entry = load_anomaly_rows_by_entry(entry['id'] for entry in entries)
+    if include_raw:
+        resolve_raw_logs(entries)
+
+    for entry in entries:
+        if not include_raw:
+            entry['raw_log'] = None
+        entry['anomalies'] = anomalies_by_entry.get(entry['id'], [])
+    return entries
+
+
+def anomaly_rows_payload(rows: Sequence, include_raw: bool = True, start: int = 0) -> List[Dict]:
+    """Anomalies list payload straight from ``ANOMALY_COLUMNS`` rows (from column ``start`` on)
+
+    Each log entry has the shape of ``LogEntry.to_dict()``; entries and
+    their anomalies take one IN query each.
+    """
+    anomalies = rows_to_dicts(rows, start)
+    entry_ids = list({anomaly['entry_id'] for anomaly in anomalies})
+
+    entries = {}
+    if entry_ids:
+        entry_rows = db.session.query(*entry_columns(include_raw, include_parsed=True, detail=True))\
+            .filter(LogEntry.id.in_(entry_ids))\
+            .all()
+        entries = {entry['id']: entry for entry in rows_to_dicts(entry_rows)}
+        decode_dimensions(list(entries.values()))
+        if include_raw:
+            resolve_raw_logs(list(entries.values()))
+
+    anomalies_by_entry = load_anomaly_rows_by_entry(entries.keys())
+    for entry_id, entry in entries.items():
+        entry['anomalies'] = anomalies_by_entry.get(entry_id, [])
+
+    return [
+        {'anomaly': anomaly, 'log_entry': entries.get(anomaly['entry_id'])}
+        for anomaly in anomalies
+    ]
+
+
+def project(data: Optional[Dict], model) -> Optional[Dict]:
+    """Keep exactly the keys of a documented model, like ``marshal`` would"""
+    if data is None:
+        return None
+    return {key: data.get(key) for key in model}
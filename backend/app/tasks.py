@@ -0,0 +1,106 @@
+import logging
+from contextlib import contextmanager
+
+from celery.signals import worker_init, worker_process_init
+from flask import has_app_context
+
+from app import celery, db
+
+logger = logging.getLogger(__name__)
+
+# Flask app used by worker processes (built at worker start, or on first task)
+_worker_app = None
+
+
+@contextmanager
+def _app_context():
+    """Run task code inside a Flask app context
+
+    API processes call ``init_celery`` so tasks already run in a context;
+    worker processes only import ``app.celery`` and build the app lazily.
+    """
+    if has_app_context():
+        yield
+        return
+
+    with _get_worker_app().app_context():
+        yield
+
+
+def _get_worker_app():
+    """Build the worker's Flask app once per process tree"""
+    global _worker_app
+    if _worker_app is None:
+        from app import create_app
+        _worker_app = create_app()
+    return _worker_app
+
+
+@worker_init.connect
+def _warm_worker(**kwargs):
+    """Preload the app, parsers and ML stack in the parent before forking"""
+    from app.services.warmup import preload
+
+    _get_worker_app()
+    preload()
+
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    """Per-child setup: drop connections inherited from the parent"""
+    import app.services.cache as cache
+
+    # Sockets must never be shared across forked processes
+    cache._redis_client = None
+    if _worker_app is not None:
+        with _worker_app.app_context():
+            db.engine.dispose(close=False)
+
+    # Still warm if the pool doesn't fork (solo/threads)
+    from app.services.warmup import get_parser_service
+    get_parser_service()
+
+
+@celery.task(name='app.tasks.run_ingest_job')
+def run_ingest_job(job: dict, lane: str):
+    """Run one scheduled ingest job and hand its lane slot back to the scheduler"""
+    from app.services.scheduler import IngestScheduler
+
+    try:
+        with _app_context():
+            from app.services.warmup import get_parser_service
+
+            logger.info(f"Starting {job['task']} job for log {job['log_id']} ({lane} lane)")
+            if job['task'] == 'reanalyze':
+                get_parser_service().anomaly_service.reanalyze(
+                    job['log_id'],
+                    job['options'].get('detectors'),
+                    job['options'].get('thresholds'),
+                    cprofile=job['options'].get('cprofile', False)
+                )
+            elif job['task'] == 'preview':
+                get_parser_service().preview_log_file(job['log_id'], collapse=job['options'].get('collapse'))
+            else:
+                get_parser_service().process_log_file(
+                    job['log_id'],
+                    cprofile=job['options'].get('cprofile', False),
+                    collapse=job['options'].get('collapse')
+                )
+
+    except Exception as e:
+        # Failures are already recorded on the LogFile / progress stream
+        logger.error(f"Ingest job for log {job['log_id']} failed: {str(e)}")
+
+    finally:
+        try:
+            IngestScheduler().complete(lane, job['log_id'])
+        except Exception as e:
+            logger.error(f"Failed to release {lane} slot for log {job['log_id']}: {str(e)}")
+
+        # The exact pass replaces the preview (or recovers from a failed one);
+        # queued only after the slot is released since slots are keyed by log
+        if job['task'] == 'preview':
+            try:
+                IngestScheduler().submit(job['log_id'], job['user_id'], job['file_size'], options=job['options'])
+            except Exception as e:
+                logger.error(f"Failed to queue processing of log {job['log_id']} after its preview: {str(e)}")
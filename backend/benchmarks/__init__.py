@@ -0,0 +1,13 @@
+"""Ingestion, detection and API load benchmarks
+
+Run from the backend directory against a local Postgres (DATABASE_URL):
+
+    python -m benchmarks generate --format nginx --lines 100k /tmp/nginx.log
+    python -m benchmarks run --formats zscaler,nginx,apache,csv,ndjson --sizes 10k,100k
+    python -m benchmarks compare benchmarks/results/a.json benchmarks/results/b.json
+
+Load tests only talk HTTP to a running stack (docker compose up):
+
+    python -m benchmarks seed --users 4 --logs-per-user 2 --lines 100k
+    python -m benchmarks load --concurrency 1,8,32 --duration 60
+"""
@@ -0,0 +1,91 @@
+import json
+import logging
+import argparse
+
+from benchmarks.generator import FORMATS, LogGenerator, parse_size
+from benchmarks.runner import BenchmarkRunner, save_report, compare_reports
+from benchmarks.loadtest import LoadFixtures, LoadTest, format_load_report, compare_load_reports
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Ingestion and detection benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write a synthetic log file')
+    generate.add_argument('output')
+    generate.add_argument('--format', choices=FORMATS, default='nginx')
+    generate.add_argument('--lines', default='10k', help='line count, e.g. 10k, 1M')
+    generate.add_argument('--seed', type=int, default=42)
+
+    run = commands.add_parser('run', help='Benchmark ingest and detection stages')
+    run.add_argument('--formats', default=','.join(FORMATS))
+    run.add_argument('--sizes', default='10k,100k', help='comma-separated line counts (10k to 10M)')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--workdir', default='/tmp/logsight-bench')
+    run.add_argument('--output', help='report path (default: benchmarks/results/<time>-<commit>.json)')
+    run.add_argument('--keep', action='store_true', help='keep generated files and database rows')
+
+    seed = commands.add_parser('seed', help='Create load-test users with processed logs through the API')
+    seed.add_argument('--url', default='http://localhost:5000')
+    seed.add_argument('--users', type=int, default=4)
+    seed.add_argument('--logs-per-user', type=int, default=2)
+    seed.add_argument('--lines', default='10k', help='lines per seeded log, e.g. 10k, 1M')
+    seed.add_argument('--format', choices=FORMATS, default='nginx')
+    seed.add_argument('--seed', type=int, default=42)
+    seed.add_argument('--workdir', default='/tmp/logsight-load')
+
+    load = commands.add_parser('load', help='Replay dashboard traffic against the API')
+    load.add_argument('--url', default='http://localhost:5000')
+    load.add_argument('--users', type=int, default=4, help='seeded users to spread virtual users over')
+    load.add_argument('--concurrency', default='1,8,32', help='comma-separated virtual user counts, one step each')
+    load.add_argument('--duration', type=float, default=60, help='measured seconds per step')
+    load.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before each step')
+    load.add_argument('--think-time', type=float, default=0.0, help='average pause between requests')
+    load.add_argument('--seed', type=int, default=42)
+    load.add_argument('--output', help='report path (default: benchmarks/results/<time>-load-<commit>.json)')
+
+    compare = commands.add_parser('compare', help='Compare two saved reports')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'generate':
+        truth = LogGenerator(args.format, args.seed).write(args.output, parse_size(args.lines))
+        print(json.dumps({scenario: len(lines) for scenario, lines in truth.items()}))
+
+    elif args.command == 'run':
+        from app import create_app
+
+        formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+        sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+        runner = BenchmarkRunner(create_app(), args.workdir, args.seed, args.keep)
+        report = runner.run_all(formats, sizes)
+        print(f"Report saved to {save_report(report, args.output)}")
+
+    elif args.command == 'seed':
+        fixtures = LoadFixtures(args.url, args.users, args.logs_per_user, parse_size(args.lines),
+                                args.format, args.seed, args.workdir)
+        print(json.dumps(fixtures.seed_all(), indent=2))
+
+    elif args.command == 'load':
+        concurrency = [int(level) for level in args.concurrency.split(',') if level.strip()]
+        load_test = LoadTest(args.url, args.users, args.duration, args.think_time, args.seed, args.warmup)
+        report = load_test.run_all(concurrency)
+        print('\n'.join(format_load_report(report)))
+        print(f"Report saved to {save_report(report, args.output)}")
+
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        if candidate['meta'].get('kind') == 'load':
+            print('\n'.join(compare_load_reports(baseline, candidate)))
+        else:
+            print('\n'.join(compare_reports(baseline, candidate)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+import json
+import zlib
+import heapq
+import random
+import itertools
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Set, Tuple
+
+FORMATS = ('zscaler', 'nginx', 'apache', 'csv', 'ndjson')
+
+# Header of generated 'csv' logs (Zscaler NSS web log field names)
+CSV_HEADER = 'time,login,cip,reqmethod,eurl,respcode,respsize,ua,action'
+
+# Injected scenario -> detector expected to catch it
+SCENARIO_DETECTORS = {
+    'scanner': 'scanning',
+    'burst': 'volume',
+    'injection': 'injection',
+    'error_storm': 'error_rate'
+}
+
+# Payloads the injection rule pack matches without whitespace (URLs are a
+# single token in every supported format)
+INJECTION_PAYLOADS = [
+    '/search?q=<script>alert(1)</script>',
+    '/redirect?to=javascript:alert(document.cookie)',
+    '/static/../../../../etc/passwd',
+    '/api/run?cmd=exec(whoami)',
+    '/api/calc?expr=eval(base64_decode(x))'
+]
+
+PATHS = [
+    '/', '/index.html', '/login', '/logout', '/api/users', '/api/orders', '/api/items',
+    '/api/search', '/static/app.js', '/static/app.css', '/images/logo.png', '/favicon.ico',
+    '/account', '/cart', '/checkout', '/docs', '/blog', '/health'
+]
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0) AppleWebKit/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0',
+    'curl/8.4.0',
+    'python-requests/2.31.0'
+]
+
+HOSTS = ['www.example.com', 'api.example.com', 'cdn.example.com', 'github.com', 'www.google.com']
+
+METHODS = (['GET'] * 80) + (['POST'] * 15) + ['PUT', 'DELETE', 'HEAD', 'OPTIONS', 'PATCH']
+STATUSES = ([200] * 85) + ([304] * 5) + ([301] * 3) + ([404] * 4) + [403, 500, 502]
+
+
+def parse_size(value: str) -> int:
+    """Parse a line count such as 10k, 2.5M or 10000"""
+    value = value.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+class LogGenerator:
+    """Seeded synthetic access logs with labelled anomalies
+
+    Normal traffic comes from a skewed pool of clients spread over one day.
+    Scanners (many 404s on distinct URLs), request bursts, injection
+    payloads and error storms are mixed in at random times; the line
+    numbers of every injected line are returned as ground truth.
+    """
+
+    def __init__(self, log_format: str, seed: int = 42, start: datetime = datetime(2024, 1, 15)):
+        if log_format not in FORMATS:
+            raise ValueError(f"Unknown format: {log_format}")
+        self.log_format = log_format
+        self.seed = seed
+        self.start = start
+        self.span = timedelta(days=1)
+
+    def write(self, path: str, lines: int) -> Dict[str, Set[int]]:
+        """Write ``lines`` log lines to ``path`` and return injected line numbers per scenario"""
+        truth = {scenario: set() for scenario in SCENARIO_DETECTORS}
+        with open(path, 'w', encoding='utf-8') as f:
+            first_line = 1
+            if self.log_format == 'csv':
+                f.write(CSV_HEADER + '\n')
+                first_line = 2
+            for line_number, (scenario, line) in enumerate(self.lines(lines), start=first_line):
+                f.write(line + '\n')
+                if scenario:
+                    truth[scenario].add(line_number)
+        return truth
+
+    def lines(self, lines: int) -> Iterator[Tuple[str, str]]:
+        """Yield ``(scenario or None, line)`` in timestamp order"""
+        rng = random.Random(self.seed)
+        injected = self._scenario_events(rng, lines)
+        normal_count = max(lines - len(injected), 0)
+
+        # Skewed client pool: a few heavy clients, a long tail of light ones
+        clients = [f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256 + 1}'
+                   for i in range(min(max(lines // 200, 50), 20000))]
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(clients))))
+        seconds = self.span.total_seconds()
+
+        def normal_events():
+            picks = []
+            for i in range(normal_count):
+                if i % 100_000 == 0:
+                    picks = rng.choices(clients, cum_weights=cum_weights, k=100_000)
+                yield i * seconds / normal_count, None, {
+                    'ip': picks[i % 100_000],
+                    'method': rng.choice(METHODS),
+                    'url': f'{rng.choice(PATHS)}?id={rng.randrange(5000)}' if rng.random() < 0.3 else rng.choice(PATHS),
+                    'status': rng.choice(STATUSES),
+                    'bytes': int(rng.lognormvariate(7, 1.2)),
+                    'ua': rng.choice(USER_AGENTS)
+                }
+
+        for offset, scenario, event in heapq.merge(normal_events(), injected, key=lambda item: item[0]):
+            yield scenario, self._format(event, self.start + timedelta(seconds=offset))
+
+    def _scenario_events(self, rng: random.Random, lines: int) -> List[Tuple[float, str, Dict]]:
+        """Injected anomalous requests, sorted by time offset"""
+        seconds = self.span.total_seconds() - 600
+        events = []
+
+        def attacker(prefix: int, index: int) -> str:
+            return f'203.0.{prefix}.{index % 250 + 1}'
+
+        # Scanners: 60-200 404s on distinct paths within a few minutes
+        for n in range(max(2, lines // 50_000)):
+            ip, begin = attacker(113, n), rng.uniform(0, seconds)
+            for k in range(rng.randint(60, 200)):
+                events.append((begin + k * 0.5, 'scanner', {
+                    'ip': ip, 'method': 'GET', 'url': f'/probe/{n}/{k}/{rng.randrange(10 ** 6)}.php',
+                    'status': 404, 'bytes': 0, 'ua': 'Mozilla/5.0 zgrab/0.x'
+                }))
+
+        # Bursts: 300-1000 ordinary requests from one client within 5 minutes
+        for n in range(max(2, lines // 100_000)):
+            ip, begin = attacker(114, n), rng.uniform(0, seconds)
+            count = rng.randint(300, 1000)
+            for k in range(count):
+                events.append((begin + k * 290 / count, 'burst', {
+                    'ip': ip, 'method': 'GET', 'url': rng.choice(PATHS),
+                    'status': 200, 'bytes': int(rng.lognormvariate(7, 1.2)), 'ua': USER_AGENTS[3]
+                }))
+
+        # Injection payloads from scattered clients
+        for n in range(max(20, lines // 2_000)):
+            events.append((rng.uniform(0, seconds), 'injection', {
+                'ip': attacker(115, n), 'method': 'GET', 'url': rng.choice(INJECTION_PAYLOADS),
+                'status': rng.choice([200, 400, 403]), 'bytes': rng.randint(0, 2000), 'ua': USER_AGENTS[4]
+            }))
+
+        # Error storms: 50-150 requests from one client, all failing
+        for n in range(max(2, lines // 100_000)):
+            ip, begin = attacker(116, n), rng.uniform(0, seconds)
+            for k in range(rng.randint(50, 150)):
+                events.append((begin + k * 2, 'error_storm', {
+                    'ip': ip, 'method': rng.choice(['GET', 'POST']), 'url': rng.choice(PATHS[:8]),
+                    'status': rng.choice([500, 502, 503, 401]), 'bytes': 0, 'ua': USER_AGENTS[0]
+                }))
+
+        events.sort(key=lambda item: item[0])
+        return events
+
+    def _format(self, event: Dict, timestamp: datetime) -> str:
+        """Render one request in the generator's log format"""
+        if self.log_format == 'zscaler':
+            host = HOSTS[zlib.crc32(event['ip'].encode()) % len(HOSTS)]
+            return (f"{timestamp:%Y-%m-%d %H:%M:%S} {event['method']} https://{host}{event['url']} "
+                    f"{event['status']} {event['bytes']} {event['ip']} \"{event['ua']}\"")
+
+        if self.log_format == 'csv':
+            host = HOSTS[zlib.crc32(event['ip'].encode()) % len(HOSTS)]
+            action = 'Blocked' if event['status'] == 403 else 'Allowed'
+            return (f"\"{timestamp:%a %b %d %H:%M:%S %Y}\",user{zlib.crc32(event['ip'].encode()) % 500}@example.com,"
+                    f"{event['ip']},{event['method']},\"{host}{event['url']}\",{event['status']},{event['bytes']},"
+                    f"\"{event['ua']}\",{action}")
+
+        if self.log_format == 'ndjson':
+            # Shaped like a GCP HTTP(S) load balancer log entry
+            host = HOSTS[zlib.crc32(event['ip'].encode()) % len(HOSTS)]
+            return json.dumps({
+                'timestamp': f'{timestamp:%Y-%m-%dT%H:%M:%S}Z',
+                'severity': 'ERROR' if event['status'] >= 500 else 'INFO',
+                'httpRequest': {
+                    'requestMethod': event['method'], 'requestUrl': f"https://{host}{event['url']}",
+                    'status': event['status'], 'responseSize': str(event['bytes']),
+                    'remoteIp': event['ip'], 'userAgent': event['ua']
+                }
+            }, separators=(',', ':'))
+
+        clf_time = f'{timestamp:%d/%b/%Y:%H:%M:%S} +0000'
+        request = f"{event['method']} {event['url']} HTTP/1.1"
+        if self.log_format == 'nginx':
+            return (f"{event['ip']} - - [{clf_time}] \"{request}\" {event['status']} {event['bytes']} "
+                    f"\"-\" \"{event['ua']}\"")
+        return f"{event['ip']} - - [{clf_time}] \"{request}\" {event['status']} {event['bytes']}"
@@ -0,0 +1,351 @@
+import os
+import re
+import time
+import random
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+
+from benchmarks.generator import LogGenerator
+from benchmarks.runner import git_commit
+
+logger = logging.getLogger(__name__)
+
+LOADTEST_EMAIL = 'loadtest-{index}@localhost'
+LOADTEST_PASSWORD = 'loadtest-password'
+
+# Dashboard traffic mix: (name, weight). Entry and anomaly pages dominate,
+# the summary is polled while a log is open.
+TRAFFIC_MIX = [
+    ('list_logs', 10),
+    ('log_detail', 10),
+    ('entries', 20),
+    ('entries_search', 15),
+    ('anomalies', 15),
+    ('anomaly_summary', 15),
+    ('stats_series', 10),
+    ('auth_me', 5)
+]
+
+SEARCH_TERMS = ['/api', 'login', '10.0.', '203.0.113', 'probe', '.php', 'Firefox', 'checkout']
+
+_SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class ApiClient:
+    """Thin requests wrapper that logs in, revalidates ETags and records timings"""
+
+    def __init__(self, base_url: str, email: str, password: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.etags: Dict[str, str] = {}
+        # (name, seconds, status, SQL queries, finished at)
+        self.samples: List[tuple] = []
+
+    def login(self) -> bool:
+        """Authenticate and keep the token on the session"""
+        response = self._request('login', 'POST', '/api/auth/login',
+                                 json={'email': self.email, 'password': self.password})
+        if response is None or response.status_code != 200:
+            return False
+        self.session.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+        self.etags.clear()
+        return True
+
+    def get(self, name: str, path: str, params: Optional[Dict] = None):
+        """GET like the dashboard does: revalidate with If-None-Match, re-login on 401"""
+        key = f"{path}?{sorted((params or {}).items())}"
+        headers = {'If-None-Match': self.etags[key]} if key in self.etags else {}
+        response = self._request(name, 'GET', path, params=params, headers=headers)
+
+        if response is not None and response.status_code == 401 and self.login():
+            response = self._request(name, 'GET', path, params=params)
+        if response is not None and response.status_code == 200 and response.headers.get('ETag'):
+            self.etags[key] = response.headers['ETag']
+        return response
+
+    def _request(self, name: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            status = response.status_code
+        except requests.RequestException as e:
+            logger.debug(f"{name} failed: {str(e)}")
+            response, status = None, 'error'
+        elapsed = time.perf_counter() - started
+
+        queries = None
+        if response is not None:
+            match = _SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+            queries = int(match.group(1)) if match else None
+        self.samples.append((name, elapsed, status, queries, time.monotonic()))
+        return response
+
+
+class LoadFixtures:
+    """Users with processed logs to drive the load test, created through the API
+
+    Seeding goes through register, upload and the normal Celery pipeline,
+    so it only needs the docker-compose stack to be up. Users that already
+    have enough ready logs are left alone, which makes reseeding cheap.
+    """
+
+    def __init__(self, base_url: str, users: int = 4, logs_per_user: int = 2, lines: int = 10_000,
+                 log_format: str = 'nginx', seed: int = 42, workdir: str = '/tmp/logsight-load'):
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.logs_per_user = logs_per_user
+        self.lines = lines
+        self.log_format = log_format
+        self.seed = seed
+        self.workdir = workdir
+
+    def seed_all(self, timeout: float = 1800) -> List[Dict]:
+        """Make sure every load-test user has its logs processed"""
+        os.makedirs(self.workdir, exist_ok=True)
+        seeded = [self._seed_user(index) for index in range(self.users)]
+
+        pending = [log_id for user in seeded for log_id in user['pending']]
+        if pending:
+            logger.info(f"Waiting for {len(pending)} logs to finish processing")
+            self._wait_ready(seeded, timeout)
+        return [{'email': user['email'], 'log_ids': user['log_ids']} for user in seeded]
+
+    def _seed_user(self, index: int) -> Dict:
+        email = LOADTEST_EMAIL.format(index=index)
+        client = ApiClient(self.base_url, email, LOADTEST_PASSWORD)
+        if not client.login():
+            response = client.session.post(f'{self.base_url}/api/auth/register', json={
+                'email': email, 'username': f'loadtest{index}', 'password': LOADTEST_PASSWORD
+            }, timeout=30)
+            response.raise_for_status()
+            client.login()
+
+        logs = client.get('list_logs', '/api/logs/', {'per_page': 100}).json()
+        ready = [log['id'] for log in logs if log['status'] == 'ready'
+                 and log['filename'].startswith(f'loadtest-{self.lines}-')]
+
+        pending = []
+        for n in range(len(ready), self.logs_per_user):
+            path = os.path.join(self.workdir, f'loadtest-{self.lines}-{index}-{n}.log')
+            if not os.path.exists(path):
+                LogGenerator(self.log_format, self.seed + index * 1000 + n).write(path, self.lines)
+
+            while True:
+                with open(path, 'rb') as f:
+                    response = client.session.post(f'{self.base_url}/api/logs/upload',
+                                                   files={'file': (os.path.basename(path), f)}, timeout=300)
+                if response.status_code != 429:
+                    break
+                time.sleep(int(response.headers.get('Retry-After', 10)))
+            response.raise_for_status()
+            pending.append(response.json()['log_id'])
+            logger.info(f"Uploaded {os.path.basename(path)} for {email}")
+
+        return {'email': email, 'client': client, 'log_ids': ready + pending, 'pending': pending}
+
+    def _wait_ready(self, seeded: List[Dict], timeout: float):
+        deadline = time.monotonic() + timeout
+        for user in seeded:
+            for log_id in user['pending']:
+                while True:
+                    client = user['client']
+                    response = client.session.get(f'{self.base_url}/api/logs/{log_id}', timeout=30)
+                    if response.status_code == 401 and client.login():
+                        continue
+                    response.raise_for_status()
+                    status = response.json()['status']
+                    if status == 'ready':
+                        break
+                    if status == 'error':
+                        raise RuntimeError(f"Seed log {log_id} failed to process")
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Seed log {log_id} still {status} after {timeout}s")
+                    time.sleep(2)
+
+
+class LoadTest:
+    """Replay the dashboard traffic mix against a running API
+
+    Every virtual user is a thread with its own session and login that
+    opens one of its logs and then picks weighted requests from
+    TRAFFIC_MIX, with ``think_time`` seconds (randomized) between them.
+    Each concurrency level runs for ``duration`` seconds and reports
+    p50/p95/p99 latency, throughput, errors and SQL queries per request
+    (from the Server-Timing header) for every endpoint.
+    """
+
+    def __init__(self, base_url: str, users: int = 4, duration: float = 60, think_time: float = 0.0,
+                 seed: int = 42, warmup: float = 5):
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.duration = duration
+        self.think_time = think_time
+        self.seed = seed
+        self.warmup = warmup
+
+    def run_all(self, concurrency_levels: List[int]) -> Dict:
+        """Run one step per concurrency level and return the full report"""
+        report = {
+            'meta': {
+                'kind': 'load',
+                'started_at': datetime.utcnow().isoformat(),
+                'git_commit': git_commit(),
+                'base_url': self.base_url,
+                'users': self.users,
+                'duration': self.duration,
+                'think_time': self.think_time,
+                'seed': self.seed
+            },
+            'steps': []
+        }
+        for concurrency in concurrency_levels:
+            logger.info(f"Load step: {concurrency} concurrent users for {self.duration}s")
+            report['steps'].append(self.run(concurrency))
+        return report
+
+    def run(self, concurrency: int) -> Dict:
+        """Run one concurrency level"""
+        clients = []
+        stop_at = time.monotonic() + self.warmup + self.duration
+        measure_from = time.monotonic() + self.warmup
+        threads = []
+
+        for worker in range(concurrency):
+            client = ApiClient(self.base_url, LOADTEST_EMAIL.format(index=worker % self.users), LOADTEST_PASSWORD)
+            clients.append(client)
+            thread = threading.Thread(target=self._virtual_user,
+                                      args=(client, random.Random(self.seed + worker), stop_at),
+                                      name=f'vu-{worker}', daemon=True)
+            threads.append(thread)
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Warm-up samples (first logins, cold caches) are dropped
+        samples = [sample for client in clients for sample in client.samples if sample[4] >= measure_from]
+        return {'concurrency': concurrency, **self._summarize(samples)}
+
+    def _virtual_user(self, client: ApiClient, rng: random.Random, stop_at: float):
+        """One dashboard user: log in, open a log, browse until time is up"""
+        if not client.login():
+            logger.warning(f"Login failed for {client.email}")
+            return
+        logs = client.get('list_logs', '/api/logs/', {'per_page': 20})
+        log_ids = [log['id'] for log in logs.json() if log['status'] == 'ready'] if logs is not None and logs.ok else []
+        if not log_ids:
+            logger.warning(f"{client.email} has no ready logs; run `python -m benchmarks seed` first")
+            return
+
+        names, weights = zip(*TRAFFIC_MIX)
+        log_id = rng.choice(log_ids)
+        while time.monotonic() < stop_at:
+            action = rng.choices(names, weights)[0]
+            if action == 'list_logs':
+                client.get(action, '/api/logs/', {'per_page': 20})
+                log_id = rng.choice(log_ids)
+            elif action == 'log_detail':
+                client.get(action, f'/api/logs/{log_id}')
+            elif action == 'entries':
+                client.get(action, f'/api/logs/{log_id}/entries',
+                           {'page': rng.choice([1, 1, 1, 2, 3, rng.randint(4, 50)]), 'per_page': 50})
+            elif action == 'entries_search':
+                client.get(action, f'/api/logs/{log_id}/entries',
+                           {'search': rng.choice(SEARCH_TERMS), 'page': rng.choice([1, 1, 2]), 'per_page': 50})
+            elif action == 'anomalies':
+                client.get(action, f'/api/anomalies/{log_id}', {'page': rng.choice([1, 1, 2, 3]), 'per_page': 20})
+            elif action == 'anomaly_summary':
+                client.get(action, f'/api/anomalies/{log_id}/summary')
+            elif action == 'stats_series':
+                client.get(action, f'/api/logs/{log_id}/stats/series',
+                           {'interval': rng.choice(['1m', '5m', '1h']), 'dimension': rng.choice(['total', 'status'])})
+            elif action == 'auth_me':
+                client.get(action, '/api/auth/me')
+
+            if self.think_time:
+                time.sleep(rng.uniform(0.5, 1.5) * self.think_time)
+
+    def _summarize(self, samples: List[tuple]) -> Dict:
+        """Latency percentiles and throughput per endpoint and overall"""
+        by_endpoint: Dict[str, List[tuple]] = {}
+        for sample in samples:
+            by_endpoint.setdefault(sample[0], []).append(sample)
+
+        endpoints = {name: self._stats(group) for name, group in sorted(by_endpoint.items())}
+        return {'endpoints': endpoints, 'totals': self._stats(samples)}
+
+    def _stats(self, samples: List[tuple]) -> Dict:
+        latencies = sorted(sample[1] * 1000 for sample in samples)
+        errors = sum(1 for sample in samples if sample[2] == 'error' or sample[2] >= 400)
+        queries = [sample[3] for sample in samples if sample[3] is not None]
+        return {
+            'requests': len(samples),
+            'errors': errors,
+            'not_modified': sum(1 for sample in samples if sample[2] == 304),
+            'rps': round(len(samples) / self.duration, 2),
+            'p50_ms': _round(percentile(latencies, 50)),
+            'p95_ms': _round(percentile(latencies, 95)),
+            'p99_ms': _round(percentile(latencies, 99)),
+            'max_ms': _round(latencies[-1] if latencies else None),
+            'avg_queries': round(sum(queries) / len(queries), 1) if queries else None
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def format_load_report(report: Dict) -> List[str]:
+    """Per-step table of latency percentiles and throughput"""
+    lines = []
+    for step in report['steps']:
+        lines.append(f"\n{step['concurrency']} concurrent users")
+        lines.append(f"  {'endpoint':<16} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'err':>5} {'sql':>5}")
+        for name, stats in list(step['endpoints'].items()) + [('TOTAL', step['totals'])]:
+            lines.append(
+                f"  {name:<16} {stats['requests']:>7} {stats['rps']:>8.1f} {stats['p50_ms'] or 0:>8.1f} "
+                f"{stats['p95_ms'] or 0:>8.1f} {stats['p99_ms'] or 0:>8.1f} {stats['errors']:>5} "
+                f"{stats['avg_queries'] if stats['avg_queries'] is not None else '-':>5}"
+            )
+    return lines
+
+
+def compare_load_reports(baseline: Dict, candidate: Dict) -> List[str]:
+    """p95 latency and throughput changes per concurrency level and endpoint"""
+    lines = [
+        f"baseline {baseline['meta'].get('git_commit')} ({baseline['meta']['started_at']}) -> "
+        f"candidate {candidate['meta'].get('git_commit')} ({candidate['meta']['started_at']})"
+    ]
+    steps = {step['concurrency']: step for step in baseline['steps']}
+
+    for step in candidate['steps']:
+        old = steps.get(step['concurrency'])
+        if not old:
+            continue
+        lines.append(f"\n{step['concurrency']} concurrent users")
+        for name, stats in list(step['endpoints'].items()) + [('TOTAL', step['totals'])]:
+            before = old['totals'] if name == 'TOTAL' else old['endpoints'].get(name)
+            if not before or not before['p95_ms'] or not stats['p95_ms']:
+                continue
+            lines.append(
+                f"  {name:<16} p95 {before['p95_ms']:>8.1f} -> {stats['p95_ms']:>8.1f} ms "
+                f"({(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+.1f}%)  "
+                f"rps {before['rps']:>7.1f} -> {stats['rps']:>7.1f}"
+            )
+    return lines
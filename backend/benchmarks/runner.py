@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import platform
+import resource
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.generator import LogGenerator, SCENARIO_DETECTORS
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_EMAIL = 'benchmark@localhost'
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, if this is a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class BenchmarkRunner:
+    """Time every ingest and detection stage on generated logs
+
+    Stages run one by one, the way LogParserService.process_log_file and
+    AnomalyDetectionService.detect_anomalies chain them, against the
+    database configured for the app (a local Postgres). Each run reports
+    seconds, lines/s and peak RSS per stage plus recall of the injected
+    anomalies per detector.
+    """
+
+    def __init__(self, app, workdir: str = '/tmp/logsight-bench', seed: int = 42, keep: bool = False):
+        self.app = app
+        self.workdir = workdir
+        self.seed = seed
+        self.keep = keep
+        os.makedirs(workdir, exist_ok=True)
+
+    def run_all(self, formats: List[str], sizes: List[int]) -> Dict:
+        """Run every format/size combination and return the full report"""
+        report = {'meta': self._metadata(), 'runs': []}
+        for log_format in formats:
+            for lines in sizes:
+                logger.info(f"Benchmarking {log_format} with {lines} lines")
+                report['runs'].append(self.run(log_format, lines))
+        return report
+
+    def run(self, log_format: str, lines: int) -> Dict:
+        """Benchmark one generated log end to end"""
+        from app import db
+        from app.models import LogEntry
+        from app.services.parser import LogParserService
+        from app.services.score_cache import select_anomalies
+        from app.services.detection_config import DEFAULT_THRESHOLDS
+
+        result = {'format': log_format, 'lines': lines, 'seed': self.seed, 'stages': {}, 'detectors': {}}
+        path = os.path.join(self.workdir, f'{log_format}-{lines}-{self.seed}.log')
+
+        with self._stage(result, 'generate', lines):
+            truth = LogGenerator(log_format, self.seed).write(path, lines)
+
+        with self.app.app_context():
+            service = LogParserService()
+            anomaly_service = service.anomaly_service
+            log_id = None
+
+            try:
+                with self._stage(result, 'detect_format', lines):
+                    detected = service.detect_format(path)
+
+                # Keep measuring the right parser even if detection picks another one
+                result['format_detected'] = detected.name if detected else None
+                parser = next(fmt for fmt in service.formats if fmt.name == log_format)
+
+                with self._stage(result, 'parse_file', lines):
+                    entries = service._parse_file(path, parser)
+                result['entries'] = len(entries)
+
+                log_id = self._create_log_file(path, log_format, lines)
+
+                with self._stage(result, 'store_entries', len(entries)):
+                    service._store_entries(log_id, entries)
+
+                with self._stage(result, 'store_rollups', len(entries)):
+                    service.rollup_service.store_rollups(log_id, entries)
+
+                with self._stage(result, 'generate_summary', len(entries)):
+                    service._generate_summary(entries)
+                del entries
+
+                with self._stage(result, 'load_entries', result['entries']):
+                    df = anomaly_service._load_entries(log_id)
+                line_of = dict(db.session.query(LogEntry.id, LogEntry.line_number).filter_by(log_id=log_id).all())
+
+                with self._stage(result, 'features', len(df)):
+                    features_df = anomaly_service._engineer_features(df)
+                    base = anomaly_service._score_entries(df)
+
+                scorers = {
+                    'volume': lambda: anomaly_service._score_volume(df, features_df, base),
+                    'behavioral': lambda: anomaly_service._score_behavioral(df, features_df, base),
+                    'temporal': lambda: anomaly_service._score_temporal(df, features_df, base),
+                    'scanning': lambda: anomaly_service._score_scanning(df, base),
+                    'error_rate': lambda: anomaly_service._score_error_rate(df, base)
+                }
+
+                flagged_lines = {}
+                for name in list(scorers) + ['injection']:
+                    started = time.perf_counter()
+                    if name == 'injection':
+                        anomalies = anomaly_service._detect_injection_patterns(df)
+                    else:
+                        anomalies = select_anomalies(name, base, scorers[name](), DEFAULT_THRESHOLDS,
+                                                     anomaly_service.min_samples)
+                    elapsed = time.perf_counter() - started
+
+                    flagged_lines[name] = {line_of[int(a['entry_id'])] for a in anomalies}
+                    result['detectors'][name] = {
+                        'seconds': round(elapsed, 4),
+                        'lines_per_s': round(len(df) / elapsed, 1) if elapsed else None,
+                        'flagged': len(flagged_lines[name]),
+                        'peak_rss_mb': round(peak_rss_mb(), 1)
+                    }
+
+                result['recall'] = {
+                    scenario: self._recall(truth[scenario], flagged_lines[detector], detector)
+                    for scenario, detector in SCENARIO_DETECTORS.items()
+                }
+
+                ingest = ('detect_format', 'parse_file', 'store_entries', 'store_rollups', 'generate_summary')
+                ingest_seconds = sum(result['stages'][stage]['seconds'] for stage in ingest)
+                detect_seconds = result['stages']['load_entries']['seconds'] + result['stages']['features']['seconds'] \
+                    + sum(detector['seconds'] for detector in result['detectors'].values())
+                result['totals'] = {
+                    'ingest_seconds': round(ingest_seconds, 4),
+                    'ingest_lines_per_s': round(lines / ingest_seconds, 1) if ingest_seconds else None,
+                    'detect_seconds': round(detect_seconds, 4),
+                    'detect_lines_per_s': round(lines / detect_seconds, 1) if detect_seconds else None,
+                    'peak_rss_mb': round(peak_rss_mb(), 1)
+                }
+
+            finally:
+                db.session.rollback()
+                if log_id and not self.keep:
+                    self._delete_log_file(log_id)
+                if not self.keep and os.path.exists(path):
+                    os.remove(path)
+
+        return result
+
+    @contextmanager
+    def _stage(self, result: Dict, name: str, lines: int):
+        """Record wall time, throughput and peak RSS of one stage"""
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+        result['stages'][name] = {
+            'seconds': round(elapsed, 4),
+            'lines_per_s': round(lines / elapsed, 1) if elapsed else None,
+            'peak_rss_mb': round(peak_rss_mb(), 1)
+        }
+        logger.info(f"  {name}: {elapsed:.3f}s")
+
+    def _recall(self, injected: set, flagged: set, detector: str) -> Dict:
+        """Share of injected lines the responsible detector flagged"""
+        hits = len(injected & flagged)
+        return {
+            'detector': detector,
+            'injected': len(injected),
+            'detected': hits,
+            'recall': round(hits / len(injected), 4) if injected else None
+        }
+
+    def _create_log_file(self, path: str, log_format: str, lines: int) -> str:
+        """Create the benchmark user (once) and a LogFile row for this run"""
+        from app import db
+        from app.models import User, LogFile
+
+        db.create_all()
+
+        user = User.query.filter_by(email=BENCHMARK_EMAIL).first()
+        if not user:
+            user = User(email=BENCHMARK_EMAIL, username='benchmark')
+            user.set_password(uuid.uuid4().hex)
+            db.session.add(user)
+            db.session.commit()
+
+        log_file = LogFile(
+            user_id=user.id,
+            filename=os.path.basename(path),
+            original_filename=f'benchmark-{log_format}-{lines}.log',
+            file_path=path,
+            file_size=os.path.getsize(path),
+            content_type='text/plain',
+            log_format=log_format,
+            status='processing'
+        )
+        db.session.add(log_file)
+        db.session.commit()
+        return str(log_file.id)
+
+    def _delete_log_file(self, log_id: str):
+        """Delete a run's rows with bulk deletes (ORM cascades would load every entry)"""
+        from app import db
+        from app.models import LogFile, LogEntry, LogRollup, Anomaly
+
+        for model in (Anomaly, LogRollup, LogEntry):
+            model.query.filter_by(log_id=log_id).delete(synchronize_session=False)
+        LogFile.query.filter_by(id=log_id).delete(synchronize_session=False)
+        db.session.commit()
+
+    def _metadata(self) -> Dict:
+        """Environment details needed to compare runs between versions"""
+        import numpy
+        import pandas
+        import sklearn
+        from app import db
+
+        with self.app.app_context():
+            try:
+                database = db.session.execute(db.text('SHOW server_version')).scalar()
+            except Exception:
+                database = db.engine.dialect.name
+            finally:
+                db.session.rollback()
+
+        return {
+            'started_at': datetime.utcnow().isoformat(),
+            'git_commit': git_commit(),
+            'seed': self.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'database': database,
+            'versions': {
+                'numpy': numpy.__version__,
+                'pandas': pandas.__version__,
+                'sklearn': sklearn.__version__
+            }
+        }
+
+
+def save_report(report: Dict, output: Optional[str] = None) -> str:
+    """Write a report as JSON (default: benchmarks/results/<time>[-load]-<commit>.json)"""
+    if not output:
+        results_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        kind = f"-{report['meta']['kind']}" if report['meta'].get('kind') else ''
+        output = os.path.join(results_dir, f"{stamp}{kind}-{report['meta'].get('git_commit') or 'nogit'}.json")
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return output
+
+
+def compare_reports(baseline: Dict, candidate: Dict) -> List[str]:
+    """Human-readable throughput and recall changes between two reports"""
+    lines = [
+        f"baseline {baseline['meta'].get('git_commit')} ({baseline['meta']['started_at']}) -> "
+        f"candidate {candidate['meta'].get('git_commit')} ({candidate['meta']['started_at']})"
+    ]
+    runs = {(run['format'], run['lines']): run for run in baseline['runs']}
+
+    for run in candidate['runs']:
+        old = runs.get((run['format'], run['lines']))
+        if not old:
+            continue
+        lines.append(f"\n{run['format']} / {run['lines']} lines")
+
+        for new_stages, old_stages in ((run['stages'], old['stages']), (run['detectors'], old['detectors'])):
+            for name, stage in new_stages.items():
+                before = old_stages.get(name, {}).get('lines_per_s')
+                after = stage.get('lines_per_s')
+                if before and after:
+                    lines.append(f"  {name:<18} {before:>12.0f} -> {after:>12.0f} lines/s ({(after / before - 1) * 100:+.1f}%)")
+
+        for scenario, recall in run.get('recall', {}).items():
+            before = old.get('recall', {}).get(scenario, {}).get('recall')
+            if recall['recall'] != before:
+                lines.append(f"  recall {scenario:<11} {before} -> {recall['recall']}")
+
+        lines.append(f"  peak RSS           {old['totals']['peak_rss_mb']} -> {run['totals']['peak_rss_mb']} MB")
+
+    return lines
@@ -0,0 +1,18 @@
+# Loaded automatically by gunicorn from the working directory
+import os
+import shutil
+
+# prometheus_client multiprocess mode: every worker writes its samples to
+# this directory and /metrics aggregates them. Stale files from a previous
+# run would be added to the new totals, so start from an empty directory.
+_multiproc_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if _multiproc_dir:
+    shutil.rmtree(_multiproc_dir, ignore_errors=True)
+    os.makedirs(_multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop a recycled worker's live gauges (pool checkout counts)"""
+    if _multiproc_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,51 @@
+import pytest
+
+from app.models import Anomaly
+from app.services.anomaly import AnomalyDetectionService
+from app.services.detection_config import DETECTOR_SIGNATURES
+from app.services.parser import LogParserService
+from benchmarks.generator import LogGenerator
+
+
+@pytest.fixture
+def processed_log(make_log):
+    log_file = make_log([line for _, line in LogGenerator('apache', 11).lines(5000)], status='uploaded')
+    LogParserService().process_log_file(str(log_file.id))
+    return log_file
+
+
+def _anomaly_ids(log_file, detector):
+    anomaly_type, model_used = DETECTOR_SIGNATURES[detector]
+    return {anomaly.id for anomaly in Anomaly.query.filter_by(
+        log_id=log_file.id, anomaly_type=anomaly_type, model_used=model_used)}
+
+
+def test_failed_detector_keeps_previous_results(processed_log, monkeypatch):
+    volume, behavioral = _anomaly_ids(processed_log, 'volume'), _anomaly_ids(processed_log, 'behavioral')
+    assert volume and behavioral
+
+    service = AnomalyDetectionService()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('volume model crashed')
+    monkeypatch.setattr(service, '_score_volume', fail)
+
+    service.detect_anomalies(str(processed_log.id))
+
+    assert _anomaly_ids(processed_log, 'volume') == volume
+    rerun = _anomaly_ids(processed_log, 'behavioral')
+    assert len(rerun) == len(behavioral)
+    assert not rerun & behavioral
+
+
+def test_all_detectors_failing_keeps_previous_results(processed_log, monkeypatch):
+    before = {anomaly.id for anomaly in Anomaly.query.filter_by(log_id=processed_log.id)}
+    service = AnomalyDetectionService()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('model crashed')
+    monkeypatch.setattr(service, '_score_volume', fail)
+
+    service.detect_anomalies(str(processed_log.id), detectors=['volume'])
+
+    assert {anomaly.id for anomaly in Anomaly.query.filter_by(log_id=processed_log.id)} == before
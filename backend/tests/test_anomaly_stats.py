@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import Anomaly, LogEntry
+from app.services.anomaly_stats import AnomalyStatsService
+from app.services.anomaly_store import store_anomalies
+
+# (confidence, anomaly_type, severity, entry, detected_at); confidences
+# include every range boundary
+ANOMALIES = [
+    (0.0, 'volume', 'low', 0, datetime(2024, 1, 16, 10, 5)),
+    (0.1, 'volume', 'low', 0, datetime(2024, 1, 16, 10, 10)),
+    (0.2, 'volume', 'medium', 0, datetime(2024, 1, 16, 10, 15)),
+    (0.3, 'volume', 'medium', 0, datetime(2024, 1, 16, 10, 20)),
+    (0.4, 'pattern', 'medium', 1, datetime(2024, 1, 16, 10, 25)),
+    (0.59, 'pattern', 'high', 1, datetime(2024, 1, 16, 10, 30)),
+    (0.6, 'pattern', 'high', 1, datetime(2024, 1, 16, 12, 0)),
+    (0.8, 'temporal', 'high', 2, datetime(2024, 1, 16, 12, 10)),
+    (0.95, 'temporal', 'critical', 2, datetime(2024, 1, 16, 12, 20)),
+    (1.0, 'temporal', 'critical', 3, datetime(2024, 1, 16, 12, 59)),
+]
+
+
+@pytest.fixture
+def analyzed_log(make_log, database):
+    log_file = make_log([], status='ready')
+    entries = [LogEntry(log_id=log_file.id, timestamp=datetime(2024, 1, 16, 10), src_ip=ip, line_number=index + 1)
+               for index, ip in enumerate(['10.0.0.1', '10.0.0.2', '10.0.0.3', None])]
+    database.session.add_all(entries)
+    database.session.flush()
+    database.session.add_all(
+        Anomaly(log_id=log_file.id, entry_id=entries[entry].id, anomaly_type=anomaly_type, severity=severity,
+                confidence=confidence, reason='seeded', model_used='seeded', detected_at=detected_at)
+        for confidence, anomaly_type, severity, entry, detected_at in ANOMALIES
+    )
+    database.session.commit()
+    return log_file, entries
+
+
+def test_stats_keep_the_per_range_semantics(analyzed_log, user):
+    log_file, _ = analyzed_log
+
+    stats = AnomalyStatsService().calculate_stats(log_file.id)
+
+    assert (stats['user_id'], stats['status']) == (str(user.id), 'ready')
+    assert stats['total_anomalies'] == 10
+    assert stats['by_type'] == {'volume': 4, 'pattern': 3, 'temporal': 3}
+    assert stats['by_severity'] == {'low': 2, 'medium': 3, 'high': 3, 'critical': 2}
+    assert stats['timeline'] == [{'timestamp': '2024-01-16T10:00:00', 'count': 6},
+                                 {'timestamp': '2024-01-16T12:00:00', 'count': 4}]
+    assert stats['top_ips'] == [{'ip': '10.0.0.1', 'anomaly_count': 4}, {'ip': '10.0.0.2', 'anomaly_count': 3},
+                                {'ip': '10.0.0.3', 'anomaly_count': 2}, {'ip': 'Unknown', 'anomaly_count': 1}]
+    # Ranges include their lower bound; the last one also includes 1.0
+    assert stats['confidence_distribution'] == {'Very Low': 2, 'Low': 2, 'Medium': 2, 'High': 1, 'Very High': 3}
+
+
+def test_stats_of_a_log_without_anomalies(make_log):
+    log_file = make_log([], status='ready')
+
+    stats = AnomalyStatsService().calculate_stats(log_file.id)
+
+    assert stats['total_anomalies'] == 0
+    assert (stats['by_type'], stats['timeline'], stats['top_ips']) == ({}, [], [])
+    assert set(stats['confidence_distribution'].values()) == {0}
+
+
+def test_storing_anomalies_invalidates_cached_stats(analyzed_log, user, redis_client):
+    log_file, entries = analyzed_log
+    service = AnomalyStatsService()
+    cache_key = service.CACHE_KEY.format(log_id=log_file.id)
+
+    assert service.get_owned_stats(log_file.id, user.id)['stats']['total_anomalies'] == 10
+    assert redis_client.exists(cache_key)
+
+    store_anomalies(log_file.id, [{'entry_id': entries[0].id, 'anomaly_type': 'pattern', 'reason': 'SQL injection',
+                                   'confidence': 0.9, 'severity': 'critical', 'model_used': 'pattern_matching'}],
+                    ['injection'])
+
+    assert not redis_client.exists(cache_key)
+    assert service.get_owned_stats(log_file.id, user.id)['stats']['total_anomalies'] == 11
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.models import LogEntry, Anomaly
+from app.services.dedup import clone_results
+from app.services.score_cache import DetectorScoreCache, ENTRIES
+
+LINES = [f'10.0.0.{index} - - [15/Jan/2024:10:30:4{index} +0000] "GET /{index} HTTP/1.1" 200 1 "-" "curl"'
+         for index in range(4)]
+
+
+@pytest.fixture
+def source(make_log, database):
+    log_file = make_log(LINES, status='ready')
+    entries = [LogEntry(log_id=log_file.id, timestamp=datetime(2024, 1, 15, 10, 30, 40 + index),
+                        src_ip=f'10.0.0.{index}', url=f'/{index}', status_code=200,
+                        raw_log=line, line_number=index + 1)
+               for index, line in enumerate(LINES)]
+    database.session.add_all(entries)
+    database.session.flush()
+    database.session.add(Anomaly(log_id=log_file.id, entry_id=entries[2].id, anomaly_type='behavioral',
+                                 severity='low', confidence=0.7, reason='Behavioral anomaly'))
+    database.session.commit()
+
+    scores = DetectorScoreCache(log_file.id)
+    scores.save(ENTRIES, {'entry_id': np.array([entry.id for entry in entries]), 'status': np.full(4, 200),
+                          'method': np.zeros(4, dtype=np.int32), 'methods': np.array(['GET'])})
+    scores.save('behavioral', {'score': np.array([0.1, 0.2, -0.4, 0.3]), 'features': np.full((4, 4), 0.5)})
+    return log_file
+
+
+def _entries(log_file):
+    return LogEntry.query.filter_by(log_id=log_file.id).order_by(LogEntry.id).all()
+
+
+def test_clone_gets_new_ids_in_source_order(source, make_log):
+    target = make_log(LINES, status='processing')
+
+    assert clone_results(source, target) == 4
+
+    copied = _entries(target)
+    assert [entry.line_number for entry in copied] == [1, 2, 3, 4]
+    assert not {entry.id for entry in copied} & {entry.id for entry in _entries(source)}
+
+    anomaly = Anomaly.query.filter_by(log_id=target.id).one()
+    assert anomaly.entry_id == copied[2].id
+
+
+def test_clone_gets_remapped_detector_scores(source, make_log, app):
+    target = make_log(LINES, status='processing')
+    clone_results(source, target)
+
+    scores = DetectorScoreCache(target.id)
+    base = scores.load(ENTRIES)
+    assert base['entry_id'].tolist() == [entry.id for entry in _entries(target)]
+    assert base['status'].tolist() == [200] * 4
+    assert scores.load('behavioral')['score'].tolist() == [0.1, 0.2, -0.4, 0.3]
+
+    # Re-tuning the clone flags the same line as the original
+    anomalies, _, missing = scores.select(['behavioral'], {'behavioral_contamination': 0.25})
+    source_anomalies, _, _ = DetectorScoreCache(source.id).select(['behavioral'], {'behavioral_contamination': 0.25})
+    assert not missing
+    lines = {entry.id: entry.line_number for entry in _entries(source) + _entries(target)}
+    assert [lines[a['entry_id']] for a in anomalies] == [lines[a['entry_id']] for a in source_anomalies]
+
+
+def test_scores_with_entries_missing_from_the_map_are_not_copied(tmp_path):
+    source, target = DetectorScoreCache('a', str(tmp_path)), DetectorScoreCache('b', str(tmp_path))
+    source.save(ENTRIES, {'entry_id': np.array([1, 2, 5])})
+    target.save(ENTRIES, {'entry_id': np.array([9])})
+
+    assert not source.copy_to(target, np.array([1, 2, 3]), np.array([11, 12, 13]))
+    assert target.load(ENTRIES) is None
+
+    assert source.copy_to(target, np.array([1, 2, 5]), np.array([11, 12, 15]))
+    assert target.load(ENTRIES)['entry_id'].tolist() == [11, 12, 15]
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.collapse import collapse_duplicates, entry_weight, resolve_collapse_mode
+
+START = datetime(2024, 1, 15, 10, 0, 0)
+
+
+def _entry(seconds, url='/a', line_number=None, **fields):
+    return {'timestamp': START + timedelta(seconds=seconds), 'src_ip': '10.0.0.1', 'method': 'GET',
+            'url': url, 'status_code': 200, 'line_number': line_number, **fields}
+
+
+def _summary(entries):
+    return [(entry['url'], entry['line_number'], entry_weight(entry)) for entry in entries]
+
+
+def test_consecutive_merges_runs_only():
+    entries = [_entry(0, '/a', 1), _entry(1, '/a', 2), _entry(2, '/b', 3), _entry(3, '/a', 4), _entry(4, '/a', 5)]
+
+    collapsed = collapse_duplicates(entries, 'consecutive', window_seconds=60)
+
+    assert _summary(collapsed) == [('/a', 1, 2), ('/b', 3, 1), ('/a', 4, 2)]
+    assert collapsed[0]['timestamp'] == START
+    assert collapsed[0]['last_timestamp'] == START + timedelta(seconds=1)
+
+
+def test_window_merges_interleaved_duplicates():
+    entries = [_entry(0, '/a', 1), _entry(1, '/b', 2), _entry(2, '/a', 3), _entry(3, '/b', 4), _entry(4, '/a', 5)]
+
+    collapsed = collapse_duplicates(entries, 'window', window_seconds=60)
+
+    assert _summary(collapsed) == [('/a', 1, 3), ('/b', 2, 2)]
+    assert collapsed[0]['last_timestamp'] == START + timedelta(seconds=4)
+
+
+@pytest.mark.parametrize('mode', ['consecutive', 'window'])
+def test_merged_entry_never_spans_more_than_the_window(mode):
+    entries = [_entry(seconds, '/a', line) for line, seconds in enumerate((0, 30, 60, 61, 90, 121), start=1)]
+
+    collapsed = collapse_duplicates(entries, mode, window_seconds=60)
+
+    # A new entry starts at the first line more than 60s after the one it would join
+    assert _summary(collapsed) == [('/a', 1, 3), ('/a', 4, 3)]
+    assert collapsed[1]['last_timestamp'] == START + timedelta(seconds=121)
+    assert sum(entry_weight(entry) for entry in collapsed) == len(entries)
+
+
+def test_parsed_fields_are_part_of_the_key():
+    entries = [_entry(0, line_number=1, parsed_fields={'a': 1, 'b': 2}),
+               _entry(1, line_number=2, parsed_fields={'b': 2, 'a': 1}),
+               _entry(2, line_number=3, parsed_fields={'a': 2})]
+
+    assert _summary(collapse_duplicates(entries, 'consecutive', window_seconds=60)) == [('/a', 1, 2), ('/a', 3, 1)]
+
+
+def test_off_keeps_every_line():
+    entries = [_entry(0, line_number=1), _entry(1, line_number=2)]
+    assert collapse_duplicates(entries, 'off') == entries
+    assert 'repeat_count' not in entries[0]
+
+
+def test_resolve_collapse_mode(monkeypatch):
+    monkeypatch.setenv('INGEST_COLLAPSE', 'Window')
+    assert resolve_collapse_mode() == 'window'
+    assert resolve_collapse_mode('consecutive') == 'consecutive'
+    with pytest.raises(ValueError):
+        resolve_collapse_mode('sometimes')
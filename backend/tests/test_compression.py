@@ -0,0 +1,65 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify
+
+from app.services.compression import base_etag, encoded_etag, init_compression
+from app.services.response_cache import _etag_matches, _not_modified
+
+ETAG = 'a' * 64
+
+
+@pytest.fixture
+def compressed_app():
+    app = Flask(__name__)
+    init_compression(app)
+
+    @app.route('/payload')
+    def payload():
+        response = jsonify(items=['x' * 40] * 100)
+        response.set_etag(ETAG)
+        return response
+
+    return app
+
+
+@pytest.mark.parametrize('accept, encoding', [('gzip', 'gzip'), ('identity', 'identity')])
+def test_compressed_responses_keep_strong_etag_per_encoding(compressed_app, accept, encoding):
+    response = compressed_app.test_client().get('/payload', headers={'Accept-Encoding': accept})
+
+    etag, weak = response.get_etag()
+    assert not weak
+    assert etag == encoded_etag(ETAG, encoding)
+    assert response.headers.get('Content-Encoding', 'identity') == encoding
+    assert 'Accept-Encoding' in response.vary
+    if encoding == 'gzip':
+        assert gzip.decompress(response.get_data())
+
+
+def test_base_etag_strips_encoding():
+    assert base_etag(f'{ETAG}-br') == ETAG
+    assert base_etag(f'{ETAG}-gzip') == ETAG
+    assert base_etag(ETAG) == ETAG
+
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    (f'"{ETAG}-gzip"', True),
+    (f'"{ETAG}-br"', True),
+    (f'"{ETAG}"', True),
+    (f'W/"{ETAG}-gzip"', True),
+    ('*', True),
+    (f'"{"b" * 64}-gzip"', False),
+])
+def test_cached_etag_matches_any_encoding(if_none_match, matches):
+    app = Flask(__name__)
+    with app.test_request_context(headers={'If-None-Match': if_none_match}):
+        assert _etag_matches(ETAG) is matches
+
+
+def test_not_modified_carries_the_encoded_etag():
+    app = Flask(__name__)
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = _not_modified(ETAG, b'x' * 4096)
+
+    assert response.status_code == 304
+    assert response.get_etag() == (f'{ETAG}-gzip', False)
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.parser import DelimitedLogFormat
+
+HEADER = 'time,login,cip,reqmethod,eurl,respcode,respsize,ua,action'
+ROW = '"Mon Jan 15 10:30:{second:02d} 2024",user{index}@example.com,10.0.0.{index},GET,"example.com/api/{index}",200,{index},"Mozilla/5.0",Allowed'
+
+
+class RecordingProgress:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **fields):
+        self.updates.append(fields)
+
+
+def _rows(count):
+    return [ROW.format(second=index % 60, index=index) for index in range(count)]
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(lines):
+        path = tmp_path / 'export.csv'
+        path.write_text(''.join(f'{line}\n' for line in lines))
+        return str(path)
+    return write
+
+
+def test_maps_header_columns(write_csv):
+    entries = DelimitedLogFormat().parse_file(write_csv([HEADER] + _rows(2)))
+
+    assert entries[1] == {
+        'timestamp': datetime(2024, 1, 15, 10, 30, 1), 'src_ip': '10.0.0.1', 'method': 'GET',
+        'url': 'example.com/api/1', 'user_agent': 'Mozilla/5.0', 'dest_host': 'example.com',
+        'status_code': 200, 'response_size': 1, 'parsed_fields': {'login': 'user1@example.com', 'action': 'Allowed'},
+        'raw_log': _rows(2)[1], 'line_number': 3
+    }
+
+
+def test_chunks_parse_like_one_pass_and_report_progress(write_csv):
+    path = write_csv(['', HEADER] + _rows(25))
+    whole = DelimitedLogFormat().parse_file(path)
+
+    parser = DelimitedLogFormat()
+    parser.CHUNK_ROWS = 10
+    progress = RecordingProgress()
+    chunked = parser.parse_file(path, progress)
+
+    assert chunked == whole
+    assert [entry['line_number'] for entry in chunked] == list(range(3, 28))
+    assert [update['entries_parsed'] for update in progress.updates] == [10, 20, 25]
+    assert progress.updates[-1]['progress'] == 50
+
+
+def test_rows_after_a_malformed_row_get_rebuilt_lines(write_csv):
+    rows = _rows(30)
+    parser = DelimitedLogFormat()
+    parser.CHUNK_ROWS = 10
+    entries = parser.parse_file(write_csv([HEADER] + rows[:15] + ['"unterminated,quote'] + rows[15:]))
+
+    # Chunks before the malformed row keep their lines as written
+    assert [entry['raw_log'] for entry in entries[:10]] == rows[:10]
+    assert [entry['line_number'] for entry in entries[:10]] == list(range(2, 12))
+    # Later rows are rebuilt from their fields
+    assert entries[-1]['raw_log'].startswith('Mon Jan 15 10:30:29 2024,user29@example.com,10.0.0.29,GET,')
+    assert entries[-1]['src_ip'] == '10.0.0.29'
+
+
+def test_drops_rows_without_timestamp(write_csv):
+    entries = DelimitedLogFormat().parse_file(write_csv([HEADER, 'yesterday,a,10.0.0.1,GET,x,200,1,ua,Allowed'] + _rows(3)))
+    assert [entry['line_number'] for entry in entries] == [3, 4, 5]
+
+
+def test_unmappable_file_is_rejected(write_csv):
+    with pytest.raises(ValueError):
+        DelimitedLogFormat().parse_file(write_csv(['just some text', 'and more']))
@@ -0,0 +1,59 @@
+import threading
+
+from app.models import User, UserAgent
+from app.services import dimensions
+
+
+def test_concurrent_ingests_get_the_same_ids(app, database):
+    values = [f'agent-{index}' for index in range(50)]
+    workers = 8
+    barrier = threading.Barrier(workers)
+    results, errors = [], []
+
+    def intern(offset):
+        # Every worker interns the same values in a different order, starting together
+        with app.app_context():
+            try:
+                barrier.wait()
+                results.append(dimensions.intern_values('user_agent', values[offset:] + values[:offset]))
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=intern, args=(offset * 5,)) for offset in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert all(result == results[0] for result in results)
+    assert sorted(results[0]) == sorted(values)
+    stored = dict(database.session.execute(database.select(UserAgent.value, UserAgent.id)).all())
+    assert stored == results[0]
+
+
+def test_interning_leaves_the_callers_transaction_alone(database):
+    database.session.add(User(email='pending@example.com', username='pending', password_hash='x'))
+    database.session.flush()
+
+    ids = dimensions.intern_values('method', ['GET', 'PROPFIND'])
+    database.session.rollback()
+
+    assert User.query.filter_by(email='pending@example.com').first() is None
+    # The interned rows were committed on their own, so cached ids stay valid
+    assert dimensions.lookup_values('method', ids.values()) == {value_id: value for value, value_id in ids.items()}
+
+
+def test_encode_and_decode_round_trip(database):
+    entries = [{'dest_host': 'example.com', 'method': 'GET', 'user_agent': None, 'referer': 'https://ref/'},
+               {'dest_host': 'example.com', 'method': 'POST', 'user_agent': 'curl/8', 'referer': None}]
+
+    dimensions.encode_dimensions(entries)
+    assert entries[0]['dest_host_id'] == entries[1]['dest_host_id']
+    assert entries[0]['user_agent_id'] is None
+
+    decoded = [{f'{name}_id': entry[f'{name}_id'] for name in dimensions.DIMENSION_MODELS} for entry in entries]
+    # Decode from the database; the database fixture resets the cache afterwards
+    dimensions._cache = dimensions._DictionaryCache(10)
+    dimensions.decode_dimensions(decoded)
+    assert decoded == [{name: entry[name] for name in dimensions.DIMENSION_MODELS} for entry in entries]
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import LogEntry
+from app.services.dimensions import encode_dimensions
+from app.services.raw_store import block_store_path, index_raw_lines, write_block_store
+
+LINES = [
+    '10.0.0.1 - - [15/Jan/2024:10:30:45 +0000] "GET /cart HTTP/1.1" 200 512 "-" "curl-needle/7.0"',
+    '10.0.0.2 - - [15/Jan/2024:10:30:46 +0000] "POST /login HTTP/1.1" 401 64 "-" "Mozilla/5.0"',
+]
+
+
+def _entries(lines):
+    entries = []
+    for line_number, line in enumerate(lines, start=1):
+        ip, rest = line.split(' ', 1)
+        method, url = rest.split('"')[1].split()[:2]
+        entries.append({
+            'timestamp': datetime(2024, 1, 15, 10, 30, 44 + line_number), 'src_ip': ip,
+            'dest_host': 'shop.example.com', 'method': method, 'url': url, 'status_code': 200,
+            'user_agent': line.rsplit('"', 2)[1], 'raw_log': line, 'line_number': line_number
+        })
+    return entries
+
+
+def _store(database, log_file, entries):
+    encode_dimensions(entries)
+    database.session.add_all(
+        LogEntry(log_id=log_file.id, **{key: value for key, value in entry.items()
+                                        if key not in ('dest_host', 'method', 'user_agent')})
+        for entry in entries
+    )
+    database.session.commit()
+
+
+@pytest.fixture
+def inline_log(make_log, database):
+    log_file = make_log(LINES, status='ready')
+    _store(database, log_file, _entries(LINES))
+    return log_file
+
+
+@pytest.fixture
+def offsets_log(make_log, database):
+    log_file = make_log(LINES, status='ready')
+    entries = _entries(LINES)
+    index_raw_lines(log_file.file_path, entries)
+    assert all(entry['raw_log'] is None for entry in entries)
+
+    store_path = block_store_path(str(log_file.id))
+    write_block_store(log_file.file_path, store_path)
+    log_file.file_path = store_path
+    _store(database, log_file, entries)
+    return log_file
+
+
+def _search(client, headers, log_file, **params):
+    return client.get(f'/api/logs/{log_file.id}/entries', headers=headers, query_string=params)
+
+
+def test_search_matches_raw_line_kept_inline(client, auth_headers, inline_log):
+    response = _search(client, auth_headers, inline_log, search='needle')
+
+    assert response.status_code == 200
+    assert [entry['url'] for entry in response.json['entries']] == ['/cart']
+
+
+def test_search_in_fields_skips_raw_line(client, auth_headers, inline_log):
+    response = _search(client, auth_headers, inline_log, search='needle', search_in='fields')
+
+    assert response.status_code == 200
+    assert response.json['entries'] == []
+
+
+def test_raw_line_search_is_rejected_for_offsets(client, auth_headers, offsets_log):
+    response = _search(client, auth_headers, offsets_log, search='needle')
+
+    assert response.status_code == 400
+    assert 'search_in=fields' in response.json['message']
+
+
+def test_field_search_works_for_offsets(client, auth_headers, offsets_log):
+    response = _search(client, auth_headers, offsets_log, search='login', search_in='fields')
+
+    assert response.status_code == 200
+    entries = response.json['entries']
+    assert [entry['url'] for entry in entries] == ['/login']
+    assert entries[0]['raw_log'] == LINES[1]
+
+
+def test_export_rejects_raw_line_search_for_offsets(client, auth_headers, offsets_log):
+    response = client.get(f'/api/logs/{offsets_log.id}/entries/export', headers=auth_headers,
+                          query_string={'search': 'needle'})
+
+    assert response.status_code == 400
+
+
+def test_unknown_search_scope(client, auth_headers, inline_log):
+    response = _search(client, auth_headers, inline_log, search='cart', search_in='everything')
+
+    assert response.status_code == 400
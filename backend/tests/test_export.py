@@ -0,0 +1,85 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from app.models import LogEntry
+from app.services.export import ExportService, export_response
+
+
+@pytest.fixture
+def exported_log(make_log, database):
+    log_file = make_log([], status='ready')
+    database.session.add_all(
+        LogEntry(log_id=log_file.id, timestamp=datetime(2024, 1, 15, 10, 30, index), src_ip='10.0.0.1',
+                 url=f'/items?id={index},"quoted"', status_code=200, raw_log=f'line {index}',
+                 parsed_fields={'index': index}, line_number=index + 1)
+        for index in range(5)
+    )
+    database.session.commit()
+    return log_file
+
+
+def _statement(log_file):
+    return (LogEntry.query.with_entities(LogEntry.line_number, LogEntry.timestamp, LogEntry.url, LogEntry.parsed_fields)
+            .filter(LogEntry.log_id == log_file.id).order_by(LogEntry.id).statement)
+
+
+COLUMNS = ['line_number', 'timestamp', 'url', 'parsed_fields']
+
+
+def test_ndjson_streams_one_object_per_row_in_chunks(exported_log):
+    chunks = list(ExportService(chunk_rows=2).stream(_statement(exported_log), COLUMNS, 'ndjson'))
+
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+    assert rows[1] == {'line_number': 2, 'timestamp': '2024-01-15T10:30:01', 'url': '/items?id=1,"quoted"',
+                       'parsed_fields': '{"index": 1}'}
+    assert [row['line_number'] for row in rows] == [1, 2, 3, 4, 5]
+
+
+def test_csv_has_a_header_and_quotes_cells(exported_log):
+    body = b''.join(ExportService(chunk_rows=2).stream(_statement(exported_log), COLUMNS, 'csv')).decode()
+
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows[0] == COLUMNS
+    assert rows[1] == ['1', '2024-01-15T10:30:00', '/items?id=0,"quoted"', '{"index": 0}']
+    assert len(rows) == 6
+
+
+def test_gzip_stream_decompresses_to_the_plain_export(exported_log):
+    service = ExportService(chunk_rows=2)
+    plain = b''.join(service.stream(_statement(exported_log), COLUMNS, 'csv'))
+    compressed = b''.join(service.stream(_statement(exported_log), COLUMNS, 'csv', compress=True))
+
+    assert gzip.decompress(compressed) == plain
+
+
+def test_transform_sees_each_partition(exported_log):
+    sizes = []
+
+    def transform(rows):
+        sizes.append(len(rows))
+        return [(row[0] * 10,) + tuple(row[1:]) for row in rows]
+
+    body = b''.join(ExportService(chunk_rows=2).stream(_statement(exported_log), COLUMNS, 'ndjson', transform=transform))
+
+    assert sizes == [2, 2, 1]
+    assert [json.loads(line)['line_number'] for line in body.decode().splitlines()] == [10, 20, 30, 40, 50]
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        next(ExportService().stream(None, COLUMNS, 'xml'))
+
+
+def test_export_response_names_the_download():
+    with Flask(__name__).test_request_context():
+        response = export_response(iter([b'x']), 'log-entries', 'ndjson', compress=True)
+
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="log-entries.ndjson.gz"'
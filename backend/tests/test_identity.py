@@ -0,0 +1,75 @@
+import uuid
+
+import pytest
+from flask import g
+
+from app.models import LogFile
+from app.services import identity
+from app.services.identity import LocalTTLCache, get_owned_log, load_jwt_user
+
+
+@pytest.fixture(autouse=True)
+def local_cache(monkeypatch):
+    cache = LocalTTLCache(maxsize=100, ttl=60)
+    monkeypatch.setattr(identity, '_local_cache', cache)
+    return cache
+
+
+def test_local_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(identity.time, 'monotonic', lambda: now[0])
+    cache = LocalTTLCache(maxsize=2, ttl=5)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # 'b' was the least recently used
+    assert cache.get('b') is identity._MISSING
+
+    now[0] += 6
+    assert cache.get('a') is identity._MISSING
+
+
+def _count_log_queries(monkeypatch):
+    loads = []
+    query = LogFile.query.__class__
+
+    original = query.first
+    monkeypatch.setattr(query, 'first', lambda self: loads.append(1) or original(self))
+    return loads
+
+
+def test_processed_logs_are_cached_and_processing_ones_are_not(make_log, user, monkeypatch):
+    ready = make_log([], status='ready')
+    processing = make_log([], status='processing')
+    loads = _count_log_queries(monkeypatch)
+
+    for _ in range(2):
+        assert get_owned_log(ready.id, user.id).status == 'ready'
+        assert get_owned_log(processing.id, user.id).status == 'processing'
+        # pytest-flask keeps one request context per test; start a new request
+        g.pop('identity_cache', None)
+
+    assert len(loads) == 3
+    assert get_owned_log(ready.id, 'someone-else') is None
+
+
+def test_committed_updates_invalidate_within_the_same_request(make_log, user, database):
+    log_file = make_log([], status='ready')
+
+    assert get_owned_log(log_file.id, user.id).status == 'ready'
+    log_file.status = 'processing'
+    database.session.commit()
+    assert get_owned_log(log_file.id, user.id).status == 'processing'
+
+
+def test_deactivated_users_are_rejected(user, database):
+    claims = {'sub': str(user.id)}
+    assert load_jwt_user({}, claims)['username'] == 'analyst'
+
+    user.is_active = False
+    database.session.commit()
+
+    assert load_jwt_user({}, claims) is None
+    assert load_jwt_user({}, {'sub': str(uuid.uuid4())}) is None
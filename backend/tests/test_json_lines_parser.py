@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from app.services.parser import JsonLinesLogFormat
+
+GCP_LINE = ('{"timestamp":"2024-01-15T10:30:45Z","httpRequest":{"requestMethod":"GET",'
+            '"requestUrl":"https://example.com/api?q=1","status":200,"remoteIp":"192.168.1.100:5123",'
+            '"responseSize":"1024"},"severity":"INFO"}')
+APP_LINE = '{"ts":1705314645123,"client":{"ip":"10.0.0.1"},"path":"/x","code":"404"}'
+
+
+def test_maps_well_known_nested_keys():
+    entry = JsonLinesLogFormat(field_map={}).parse_line(GCP_LINE)
+
+    assert entry == {
+        'timestamp': datetime(2024, 1, 15, 10, 30, 45), 'method': 'GET', 'url': 'https://example.com/api?q=1',
+        'src_ip': '192.168.1.100', 'dest_host': 'example.com', 'status_code': 200, 'response_size': 1024,
+        'parsed_fields': {'severity': 'INFO'}
+    }
+
+
+def test_field_map_picks_other_keys():
+    parser = JsonLinesLogFormat(field_map={'url': 'path', 'status_code': 'code'})
+
+    entry = parser.parse_line(APP_LINE)
+
+    # Epoch milliseconds, no host for a relative URL
+    assert entry['timestamp'] == datetime(2024, 1, 15, 10, 30, 45, 123000)
+    assert (entry['src_ip'], entry['url'], entry['status_code']) == ('10.0.0.1', '/x', 404)
+    assert 'dest_host' not in entry
+    assert entry['parsed_fields'] is None
+
+
+def test_bad_lines_in_a_batch_only_drop_themselves():
+    lines = [GCP_LINE, 'not json', '[1, 2]', '{"message": "no timestamp"}',
+             '{"time":"15/Jan/2024:10:30:45 +0100","status":99999}']
+
+    entries = JsonLinesLogFormat(field_map={}).parse_lines(lines)
+
+    assert len(entries) == len(lines)
+    assert entries[0]['url'] == 'https://example.com/api?q=1'
+    assert entries[1:4] == [None, None, None]
+    # Converted to naive UTC; out of range status codes are dropped
+    assert entries[4]['timestamp'] == datetime(2024, 1, 15, 9, 30, 45)
+    assert entries[4]['status_code'] is None
+
+
+def test_detect():
+    parser = JsonLinesLogFormat(field_map={})
+    assert parser.detect([GCP_LINE, APP_LINE, ''])
+    assert not parser.detect(['192.168.1.100 - - [15/Jan/2024:10:30:45 +0000] "GET / HTTP/1.1" 200 1', GCP_LINE])
+    assert not parser.detect(['{"message": "no timestamp"}'])
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.log_format_compiler import compile_log_format, parse_format_directives
+from app.services.parser import CompiledLogFormat
+
+TIMED = ('$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent '
+         '"$http_referer" "$http_user_agent" $request_time $upstream_response_time $host')
+TIMED_LINE = ('10.0.0.1 - - [15/Jan/2024:10:30:45 +0100] "GET /a HTTP/1.1" 200 512 "-" '
+              '"Mozilla/5.0 (X11; \\"quoted\\")" 0.120 0.010, 0.020 : 0.005 shop.example.com')
+VHOST_TIMED = '%v %h %l %u %t "%r" %>s %b "%{Referer}i" "%{User-Agent}i" %D'
+VHOST_LINE = 'www.example.com 10.0.0.2 - bob [15/Jan/2024:10:30:45 +0000] "POST /login HTTP/1.1" 401 - "https://ref/" "curl/8" 1500'
+
+
+def test_nginx_format_slices_lines_into_typed_fields():
+    layout = compile_log_format(TIMED)
+
+    assert layout.sliceable
+    assert layout.to_entry(layout.split(TIMED_LINE)) == {
+        'src_ip': '10.0.0.1', 'timestamp': datetime(2024, 1, 15, 9, 30, 45), 'method': 'GET', 'url': '/a',
+        'status_code': 200, 'response_size': 512, 'user_agent': 'Mozilla/5.0 (X11; \\"quoted\\")',
+        'dest_host': 'shop.example.com',
+        'parsed_fields': {'remote_user': None, 'protocol': 'HTTP/1.1', 'request_time': 0.12,
+                          'upstream_response_time': pytest.approx(0.035)}
+    }
+
+
+def test_apache_format_maps_directives():
+    layout = compile_log_format(VHOST_TIMED, 'apache')
+
+    assert layout.to_entry(layout.split(VHOST_LINE)) == {
+        'dest_host': 'www.example.com', 'src_ip': '10.0.0.2', 'timestamp': datetime(2024, 1, 15, 10, 30, 45),
+        'method': 'POST', 'url': '/login', 'status_code': 401, 'response_size': 0,
+        'referer': 'https://ref/', 'user_agent': 'curl/8',
+        'parsed_fields': {'ident': None, 'remote_user': 'bob', 'protocol': 'HTTP/1.1', 'request_time': 0.0015}
+    }
+
+
+@pytest.mark.parametrize('format_string, line', [
+    (TIMED, TIMED_LINE),
+    ('$remote_addr [$time_local] "$request" $status "$http_user_agent" $http_referer',
+     '10.0.0.3 [15/Jan/2024:10:30:45 +0000] "GET /b HTTP/1.1" 404 "agent with spaces" https://ref/x'),
+])
+def test_slicing_agrees_with_the_regex(format_string, line):
+    layout = compile_log_format(format_string)
+    assert layout.sliceable
+    assert layout.split(line) == list(layout.regex.match(line).groups())
+
+
+def test_ambiguous_layouts_fall_back_to_the_regex():
+    layout = compile_log_format('[$time_local] $http_user_agent $http_referer $status')
+
+    assert not layout.sliceable
+    values = layout.split('[15/Jan/2024:10:30:45 +0000] curl/8 https://ref/ 200')
+    assert values == ['15/Jan/2024:10:30:45 +0000', 'curl/8', 'https://ref/', '200']
+
+
+def test_lines_of_another_layout_are_rejected():
+    parser = CompiledLogFormat('timed', TIMED)
+
+    assert parser.detect([TIMED_LINE, TIMED_LINE])
+    assert parser.parse_line('10.0.0.1 - - [15/Jan/2024:10:30:45 +0000] "GET / HTTP/1.1" 200 512') is None
+    assert not parser.detect([VHOST_LINE])
+
+
+def test_formats_need_a_timestamp():
+    with pytest.raises(ValueError):
+        compile_log_format('$remote_addr $status')
+    with pytest.raises(ValueError):
+        compile_log_format('%h %t', 'iis')
+
+
+def test_directives_are_read_from_server_config():
+    config = '''
+    http {
+        log_format timed '$remote_addr [$time_local] '
+                         '"$request" $status';
+    }
+    LogFormat "%h %t \\"%r\\" %>s" short
+    '''
+
+    assert parse_format_directives(config) == [
+        ('timed', 'nginx', '$remote_addr [$time_local] "$request" $status'),
+        ('short', 'apache', '%h %t "%r" %>s'),
+    ]
@@ -0,0 +1,78 @@
+import logging
+
+from sqlalchemy import create_engine, text
+
+from app.services import cache, metrics
+from app.services.metrics import INGEST_METRICS_KEY, PRIORITY_SEPARATOR, QueueCollector, record_job_profile
+from app.services.scheduler import IngestScheduler
+
+
+def _families():
+    return {family.name: family for family in QueueCollector().collect()}
+
+
+def _values(family):
+    return {tuple(sample.labels.values()): sample.value for sample in family.samples}
+
+
+def test_job_profiles_feed_the_ingest_counters(redis_client):
+    profile = {'task': 'process', 'stages': [
+        {'name': 'parse', 'rows_in': None, 'rows_out': 1000, 'wall_ms': 500.0},
+        {'name': 'detection', 'rows_in': 1000, 'rows_out': None, 'wall_ms': 250.0},
+    ]}
+    record_job_profile(profile)
+    record_job_profile(profile, error='boom')
+
+    families = _families()
+    assert _values(families['logsight_ingest_jobs']) == {('process', 'ok'): 1, ('process', 'error'): 1}
+    assert _values(families['logsight_ingest_rows']) == {('process', 'parse'): 2000, ('process', 'detection'): 2000}
+    assert _values(families['logsight_ingest_stage_seconds']) == {('process', 'parse'): 1.0, ('process', 'detection'): 0.5}
+
+
+def test_queue_depth_adds_up_every_priority_list(redis_client):
+    queue = IngestScheduler.QUEUES[IngestScheduler.FAST_LANE]
+    redis_client.rpush(queue, 'a', 'b')
+    redis_client.rpush(f'{queue}{PRIORITY_SEPARATOR}3', 'c')
+    redis_client.zadd(IngestScheduler.INFLIGHT_KEY.format(lane=IngestScheduler.HEAVY_LANE), {'job': 1})
+    redis_client.set(IngestScheduler.BACKLOG_KEY, 4)
+
+    families = _families()
+    assert _values(families['logsight_metrics_redis_up']) == {(): 1}
+    assert _values(families['logsight_celery_queue_depth'])[(queue,)] == 3
+    assert _values(families['logsight_ingest_inflight'])[(IngestScheduler.HEAVY_LANE,)] == 1
+    assert _values(families['logsight_ingest_backlog']) == {(): 4}
+    assert not redis_client.exists(INGEST_METRICS_KEY)
+
+
+def test_scrapes_survive_a_redis_outage(monkeypatch):
+    class Unavailable:
+        def __getattr__(self, name):
+            raise ConnectionError('Redis is down')
+
+    monkeypatch.setattr(cache, '_redis_client', Unavailable())
+
+    record_job_profile({'task': 'process', 'stages': []})
+    assert list(_families()) == ['logsight_metrics_redis_up']
+    assert _values(_families()['logsight_metrics_redis_up']) == {(): 0}
+
+
+def test_slow_queries_are_counted_and_logged_without_parameters(monkeypatch, caplog):
+    metrics._install_listeners()
+    monkeypatch.setattr(metrics, '_slow_query_ms', 0)
+    before = metrics.SLOW_QUERIES.labels('background')._value.get()
+
+    with caplog.at_level(logging.WARNING, logger='app.services.metrics'):
+        with create_engine('sqlite://').connect() as connection:
+            connection.execute(text('SELECT   :secret'), {'secret': 'hunter2'})
+
+    assert metrics.SLOW_QUERIES.labels('background')._value.get() == before + 1
+    assert 'background): SELECT ?' in caplog.text
+    assert 'hunter2' not in caplog.text
+
+
+def test_responses_report_their_sql_time(client, auth_headers):
+    response = client.get('/api/logs/', headers=auth_headers)
+
+    assert response.status_code == 200
+    assert 'queries", app;dur=' in response.headers['Server-Timing']
+    assert b'logsight_http_request_db_queries' in client.get('/metrics').data
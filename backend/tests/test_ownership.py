@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.models import User, LogEntry, Anomaly
+
+LINE = '10.0.0.1 - - [15/Jan/2024:10:30:45 +0000] "GET /cart HTTP/1.1" 200 512 "-" "curl/7.0"'
+
+
+@pytest.fixture
+def owned_log(make_log, database):
+    log_file = make_log([LINE], status='ready')
+    entry = LogEntry(log_id=log_file.id, timestamp=datetime(2024, 1, 15, 10, 30, 45),
+                     src_ip='10.0.0.1', url='/cart', status_code=200, raw_log=LINE, line_number=1)
+    database.session.add(entry)
+    database.session.flush()
+    database.session.add(Anomaly(log_id=log_file.id, entry_id=entry.id, anomaly_type='rare_path',
+                                 severity='low', confidence=0.6, reason='Rare path'))
+    database.session.commit()
+    return log_file
+
+
+@pytest.fixture
+def other_headers(database):
+    other = User(email='other@example.com', username='other')
+    other.set_password('secret')
+    database.session.add(other)
+    database.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=str(other.id))}'}
+
+
+@pytest.mark.parametrize('path', ['/api/logs/{id}/entries', '/api/anomalies/{id}', '/api/anomalies/{id}/summary'])
+def test_other_users_get_not_found(client, owned_log, other_headers, path):
+    response = client.get(path.format(id=owned_log.id), headers=other_headers)
+    assert response.status_code == 404
+
+
+def test_owner_gets_entries_with_log_row(client, owned_log, auth_headers):
+    response = client.get(f'/api/logs/{owned_log.id}/entries', headers=auth_headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [entry['raw_log'] for entry in body['entries']] == [LINE]
+    assert body['log_file']['id'] == str(owned_log.id)
+
+
+def test_owner_gets_empty_entries_page(client, owned_log, auth_headers):
+    response = client.get(f'/api/logs/{owned_log.id}/entries', headers=auth_headers, query_string={'page': 5})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['entries'] == []
+    assert body['log_file']['id'] == str(owned_log.id)
+
+
+def test_owner_gets_anomalies_and_summary(client, owned_log, auth_headers):
+    response = client.get(f'/api/anomalies/{owned_log.id}', headers=auth_headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['anomalies']) == 1
+    assert body['stats']['total_anomalies'] == 1
+    assert 'user_id' not in body['stats']
+
+    response = client.get(f'/api/anomalies/{owned_log.id}/summary', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['by_type'] == {'rare_path': 1}
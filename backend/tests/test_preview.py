@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from app.models import LogFile, LogEntry, Anomaly
+from app.services.parser import LogParserService
+from benchmarks.generator import LogGenerator
+
+
+LINES = [line for _, line in LogGenerator('apache', 3).lines(5000)]
+
+
+def test_sample_keeps_original_line_numbers(tmp_path):
+    path = tmp_path / 'sample.log'
+    path.write_text('\n'.join(f'line {number}' for number in range(1, 1001)))
+
+    sample_path, _, line_numbers = LogParserService._sample_file(str(path), 100, 7)
+    try:
+        with open(sample_path) as f:
+            sampled = f.read().splitlines()
+    finally:
+        os.remove(sample_path)
+
+    assert len(sampled) == len(line_numbers) > 0
+    assert line_numbers[0] == 1
+    assert sampled == [f'line {number}' for number in line_numbers]
+
+
+@pytest.fixture
+def previewed_log(make_log, database, monkeypatch):
+    monkeypatch.setenv('PREVIEW_SAMPLE_LINES', '500')
+    monkeypatch.setenv('PREVIEW_SAMPLE_BLOCKS', '10')
+    log_file = make_log(LINES, status='uploaded')
+    LogParserService().preview_log_file(str(log_file.id))
+    assert database.session.get(LogFile, log_file.id).status == 'preview'
+    return log_file
+
+
+def _results(log_file):
+    return (
+        {entry.id for entry in LogEntry.query.filter_by(log_id=log_file.id)},
+        {anomaly.id for anomaly in Anomaly.query.filter_by(log_id=log_file.id)}
+    )
+
+
+def test_preview_entries_keep_original_line_numbers(previewed_log):
+    entries = LogEntry.query.filter_by(log_id=previewed_log.id).all()
+
+    assert entries
+    assert all(entry.raw_log == LINES[entry.line_number - 1] for entry in entries)
+
+
+def test_failed_exact_pass_keeps_preview(previewed_log, database, monkeypatch):
+    preview = _results(previewed_log)
+    service = LogParserService()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('detector crashed')
+    monkeypatch.setattr(service.anomaly_service, 'detect_anomalies', fail)
+
+    with pytest.raises(RuntimeError):
+        service.process_log_file(str(previewed_log.id))
+
+    log_file = database.session.get(LogFile, previewed_log.id)
+    assert log_file.status == 'error'
+    assert 'preview' in log_file.summary
+    assert _results(previewed_log) == preview
+
+
+def test_exact_pass_replaces_preview(previewed_log, database):
+    preview_entries, _ = _results(previewed_log)
+
+    LogParserService().process_log_file(str(previewed_log.id))
+
+    log_file = database.session.get(LogFile, previewed_log.id)
+    entries, anomalies = _results(previewed_log)
+    assert log_file.status == 'ready'
+    assert 'preview' not in log_file.summary
+    assert len(entries) == log_file.total_entries == 5000
+    assert not entries & preview_entries
+    assert anomalies
+    assert Anomaly.query.filter(Anomaly.log_id == previewed_log.id, Anomaly.entry_id.notin_(entries)).count() == 0
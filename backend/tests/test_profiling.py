@@ -0,0 +1,60 @@
+import os
+import pstats
+from types import SimpleNamespace
+
+from app.services.profiling import JobProfiler, profile_stage, save_profile
+
+
+def test_nested_stages_form_a_tree_with_memory_peaks(tmp_path):
+    profiler = JobProfiler('log', memory='tracemalloc', profile_folder=str(tmp_path)).start()
+
+    with profiler.stage('detection', rows_in=10) as detection:
+        with profiler.stage('volume'):
+            block = bytearray(8 * 1024 * 1024)
+            del block
+        detection['rows_out'] = 3
+    profile = profiler.stop()
+
+    assert [(stage['name'], stage['parent']) for stage in profile['stages']] == [('detection', None), ('volume', 'detection')]
+    detection, volume = profile['stages']
+    assert (detection['rows_in'], detection['rows_out']) == (10, 3)
+    assert volume['peak_mb'] >= 8
+    # A parent's peak includes its children's
+    assert detection['peak_mb'] >= volume['peak_mb']
+    assert detection['wall_ms'] >= volume['wall_ms']
+
+
+def test_memory_off_skips_peaks_and_stop_is_idempotent(tmp_path):
+    profiler = JobProfiler('log', task='reanalyze', memory='off', profile_folder=str(tmp_path)).start()
+    with profiler.stage('load'):
+        pass
+
+    profile = profiler.stop()
+    assert 'peak_mb' not in profile['stages'][0]
+    assert profile['task'] == 'reanalyze' and profile['cprofile'] is None
+    assert profiler.stop() is profile
+
+
+def test_cprofile_dump_is_written_to_the_profile_folder(tmp_path):
+    profiler = JobProfiler('log', cprofile=True, memory='off', profile_folder=str(tmp_path)).start()
+    sorted(range(10000), key=lambda value: -value)
+    profile = profiler.stop()
+
+    path = os.path.join(tmp_path, profile['cprofile'])
+    assert profile['cprofile'].startswith('log-process-')
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_profile_stage_without_a_profiler_is_a_no_op():
+    with profile_stage(None, 'parse', rows_in=5) as record:
+        record['rows_out'] = 5
+
+
+def test_save_profile_keeps_the_latest_profile_per_task():
+    log_file = SimpleNamespace(profile={'preview': {'task': 'preview', 'stages': []}})
+
+    save_profile(log_file, {'task': 'process', 'stages': []})
+    save_profile(log_file, {'task': 'process', 'stages': []}, error='boom')
+
+    assert set(log_file.profile) == {'preview', 'process'}
+    assert log_file.profile['process']['error'] == 'boom'
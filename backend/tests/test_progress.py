@@ -0,0 +1,69 @@
+import json
+import threading
+import time
+
+from app.services import cache
+from app.services.progress import ProgressPublisher, get_progress_snapshot, progress_event_stream
+
+
+def _event(message):
+    assert message.startswith('event: progress\ndata: ')
+    return json.loads(message[len('event: progress\ndata: '):])
+
+
+def test_stages_are_stored_as_the_latest_snapshot(redis_client):
+    publisher = ProgressPublisher('l1', min_interval=60)
+    publisher.stage('parsing', 10, lines_parsed=0)
+    publisher.update(lines_parsed=500)
+
+    # Counter updates within min_interval are held back unless forced
+    assert get_progress_snapshot('l1')['lines_parsed'] == 0
+    publisher.update(force=True, lines_parsed=900)
+    snapshot = get_progress_snapshot('l1')
+    assert (snapshot['stage'], snapshot['progress'], snapshot['lines_parsed']) == ('parsing', 10, 900)
+
+    # A new stage starts from a clean state
+    publisher.stage('detecting', 80)
+    assert 'lines_parsed' not in get_progress_snapshot('l1')
+
+
+def test_stream_ends_right_away_for_finished_logs(redis_client):
+    events = list(progress_event_stream('l1', {'log_id': 'l1', 'stage': 'ready', 'progress': 100}))
+    assert [_event(event)['stage'] for event in events] == ['ready']
+
+
+def test_stream_forwards_published_events_until_a_terminal_stage(redis_client):
+    stream = progress_event_stream('l1', {'log_id': 'l1', 'stage': 'queued', 'progress': 0})
+    assert _event(next(stream))['stage'] == 'queued'
+
+    def publish():
+        time.sleep(0.2)
+        publisher = ProgressPublisher('l1', min_interval=0)
+        publisher.stage('parsing', 10)
+        publisher.stage('ready', 100)
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    events = [_event(event) for event in stream if not event.startswith(':')]
+    thread.join()
+
+    assert [event['stage'] for event in events] == ['parsing', 'ready']
+
+
+def test_stream_catches_a_finish_that_happened_before_subscribing(redis_client):
+    stream = progress_event_stream('l1', {'log_id': 'l1', 'stage': 'parsing', 'progress': 10})
+    next(stream)
+    ProgressPublisher('l1').stage('error', 100, error='bad file')
+
+    assert [_event(event)['stage'] for event in stream] == ['error']
+
+
+def test_publishing_never_raises(monkeypatch):
+    class Unavailable:
+        def __getattr__(self, name):
+            raise ConnectionError('Redis is down')
+
+    monkeypatch.setattr(cache, '_redis_client', Unavailable())
+
+    ProgressPublisher('l1').stage('parsing', 10)
+    assert get_progress_snapshot('l1') is None
@@ -0,0 +1,78 @@
+import pytest
+
+from app.services import raw_store
+from app.services.raw_store import BlockStore, index_raw_lines, resolve_raw_logs, write_block_store
+
+LINES = [f'10.0.0.{index % 7} - - [15/Jan/2024:10:30:{index % 60:02d} +0000] "GET /item/{index} HTTP/1.1" 200 {index}'
+         for index in range(40)]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'access.log'
+    # Mixed line endings and a blank line shift offsets like real uploads do
+    path.write_bytes(b''.join(
+        line.encode() + (b'\r\n' if index % 3 == 0 else b'\n') + (b'\n' if index == 10 else b'')
+        for index, line in enumerate(LINES)
+    ))
+    return path
+
+
+@pytest.fixture
+def store(source, tmp_path):
+    path = tmp_path / 'access.blocks'
+    write_block_store(str(source), str(path), block_bytes=64)
+    return BlockStore(str(path))
+
+
+def _entries():
+    return [{'raw_log': line, 'line_number': index + 1 + (index > 10)} for index, line in enumerate(LINES)]
+
+
+def test_blocks_hold_the_original(source, store):
+    original = source.read_bytes()
+    assert store.raw_size == len(original)
+    assert store.block_count == -(-len(original) // 64)
+    assert b''.join(store.iter_blocks()) == original
+
+
+@pytest.mark.parametrize('offset, length', [(0, 64), (60, 10), (63, 130), (10, 0), (500, 10_000)])
+def test_reads_span_block_boundaries(source, store, offset, length):
+    assert store.read(offset, length) == source.read_bytes()[offset:offset + length]
+
+
+def test_indexed_lines_read_back_from_the_store(source, store):
+    entries = _entries()
+
+    assert index_raw_lines(str(source), entries) == len(LINES)
+
+    assert all(entry['raw_log'] is None for entry in entries)
+    assert [store.read(entry['raw_offset'], entry['raw_length']).decode() for entry in entries] == LINES
+
+
+def test_lines_that_differ_from_the_file_stay_inline(source):
+    entries = _entries()
+    entries[3]['raw_log'] = 'rebuilt,from,fields'
+    entries[5]['line_number'] = None
+
+    assert index_raw_lines(str(source), entries) == len(LINES) - 2
+    assert entries[3]['raw_log'] == 'rebuilt,from,fields' and 'raw_offset' not in entries[3]
+    assert entries[5]['raw_log'] == LINES[5] and 'raw_offset' not in entries[5]
+
+
+def test_resolve_raw_logs_fills_in_lines(source, store, monkeypatch):
+    entries = _entries()
+    index_raw_lines(str(source), entries)
+    monkeypatch.setattr(raw_store, 'block_store_path', lambda log_id: store.path)
+    payload = [{'id': index, 'log_id': 'log', **entry} for index, entry in enumerate(reversed(entries))]
+    payload.append({'id': 99, 'log_id': 'log', 'raw_log': 'kept inline', 'raw_offset': None, 'raw_length': None})
+
+    resolve_raw_logs(payload)
+
+    assert [entry['raw_log'] for entry in payload] == LINES[::-1] + ['kept inline']
+    assert not any({'log_id', 'raw_offset', 'raw_length'} & entry.keys() for entry in payload)
+
+
+def test_rejects_other_files(source):
+    with pytest.raises(ValueError):
+        BlockStore(str(source))
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+from app.models import Anomaly, LogEntry
+from app.services.anomaly_store import store_anomalies
+from app.services.detection_config import DEFAULT_THRESHOLDS, DETECTORS, resolve_detection_config
+
+
+def test_defaults_fill_in_around_overrides():
+    detectors, thresholds = resolve_detection_config(None, {'temporal_z_score': '3', 'scanning_404_count': 20.0})
+
+    assert detectors == list(DETECTORS)
+    assert thresholds == {**DEFAULT_THRESHOLDS, 'temporal_z_score': 3.0, 'scanning_404_count': 20}
+    assert isinstance(thresholds['scanning_404_count'], int)
+
+
+@pytest.mark.parametrize('detectors, thresholds', [
+    (['volume', 'clustering'], None),
+    (None, {'z_score': 3}),
+    (None, {'temporal_z_score': 'high'}),
+    (None, {'error_rate': -0.1}),
+    (None, {'volume_contamination': 0.9}),
+])
+def test_invalid_config_is_rejected(detectors, thresholds):
+    with pytest.raises(ValueError):
+        resolve_detection_config(detectors, thresholds)
+
+
+def _anomaly(entry_id, anomaly_type, model_used, reason):
+    return {'entry_id': entry_id, 'anomaly_type': anomaly_type, 'model_used': model_used, 'reason': reason,
+            'confidence': 0.9, 'severity': 'high'}
+
+
+@pytest.fixture
+def analyzed_log(make_log, database):
+    log_file = make_log([], status='ready', pipeline_key='pipeline')
+    entry = LogEntry(log_id=log_file.id, timestamp=datetime(2024, 1, 15, 10, 30), src_ip='10.0.0.1', line_number=1)
+    database.session.add(entry)
+    database.session.commit()
+    store_anomalies(log_file.id, [
+        _anomaly(entry.id, 'volume', 'isolation_forest', 'old volume'),
+        _anomaly(entry.id, 'pattern', 'pattern_analysis', 'old scan'),
+        _anomaly(entry.id, 'pattern', 'pattern_matching', 'old injection'),
+    ])
+    return log_file, entry
+
+
+def test_rerun_replaces_only_the_selected_detectors(analyzed_log, database):
+    log_file, entry = analyzed_log
+
+    store_anomalies(log_file.id, [_anomaly(entry.id, 'pattern', 'pattern_analysis', 'new scan')], ['scanning', 'volume'])
+
+    reasons = sorted(reason for reason, in database.session.query(Anomaly.reason).filter_by(log_id=log_file.id))
+    assert reasons == ['new scan', 'old injection']
+    # Re-tuned results no longer match a plain processing run
+    database.session.refresh(log_file)
+    assert log_file.pipeline_key is None
+
+
+def test_reanalyze_validates_before_queueing(client, analyzed_log, auth_headers, database):
+    log_file, _ = analyzed_log
+    path = f'/api/logs/{log_file.id}/reanalyze'
+
+    response = client.post(path, json={'detectors': ['clustering']}, headers=auth_headers)
+    assert response.status_code == 400
+
+    log_file.status = 'processing'
+    database.session.commit()
+    response = client.post(path, json={}, headers=auth_headers)
+    assert response.status_code == 409
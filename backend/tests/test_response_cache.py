@@ -0,0 +1,86 @@
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+
+from app.services import cache
+from app.services.response_cache import bump_log_version, cached_response, mark_cacheable
+
+
+@pytest.fixture
+def cached_app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'response-cache-test-secret-of-32-bytes'
+    JWTManager(app)
+    app.calls = []
+    app.log_status = 'ready'
+
+    @app.route('/logs/<log_id>')
+    @jwt_required()
+    @cached_response
+    def log_view(log_id):
+        app.calls.append(log_id)
+        mark_cacheable(app.log_status)
+        return {'log_id': log_id, 'render': len(app.calls)}
+
+    return app
+
+
+@pytest.fixture
+def get(cached_app):
+    client = cached_app.test_client()
+    with cached_app.app_context():
+        tokens = {user: create_access_token(identity=user) for user in ('alice', 'bob')}
+
+    def get(path='/logs/l1', user='alice', **headers):
+        return client.get(path, headers={'Authorization': f'Bearer {tokens[user]}', **headers})
+    return get
+
+
+def test_ready_logs_are_served_from_cache_and_revalidated(cached_app, get, redis_client):
+    first = get()
+    second = get()
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_data() == second.get_data()
+    assert cached_app.calls == ['l1']
+
+    etag, weak = first.get_etag()
+    assert not weak
+    not_modified = get(**{'If-None-Match': f'"{etag}"'})
+    assert not_modified.status_code == 304
+    assert not_modified.get_etag() == (etag, False)
+
+
+def test_bumping_the_log_version_invalidates(cached_app, get, redis_client):
+    etag = get().get_etag()[0]
+
+    bump_log_version('l1')
+    response = get(**{'If-None-Match': f'"{etag}"'})
+
+    assert response.status_code == 200
+    assert response.get_json()['render'] == 2
+
+
+def test_logs_still_processing_are_not_cached(cached_app, get, redis_client):
+    cached_app.log_status = 'processing'
+    get()
+    get()
+    assert cached_app.calls == ['l1', 'l1']
+
+
+def test_entries_are_per_user(cached_app, get, redis_client):
+    get(user='alice')
+    get(user='bob')
+    assert cached_app.calls == ['l1', 'l1']
+
+
+def test_redis_outage_falls_back_to_the_view(cached_app, get, monkeypatch):
+    class Unavailable:
+        def __getattr__(self, name):
+            raise ConnectionError('Redis is down')
+
+    monkeypatch.setattr(cache, '_redis_client', Unavailable())
+
+    assert get().status_code == 200
+    assert get().status_code == 200
+    assert cached_app.calls == ['l1', 'l1']
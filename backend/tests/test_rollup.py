@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.rollup import RollupService
+
+
+def _entry(minute, second=0, **fields):
+    return {'timestamp': datetime(2024, 1, 15, 10, minute, second), 'status_code': 200, 'method': 'GET',
+            'dest_host': 'shop.example.com', 'response_size': 100, **fields}
+
+
+def _rows(entries):
+    return {(row['bucket'].minute, row['dimension'], row['value']): (row['request_count'], row['bytes_total'])
+            for row in RollupService().build_rollups(entries)}
+
+
+def test_rollups_count_requests_and_bytes_per_minute_and_dimension():
+    rows = _rows([
+        _entry(0, 5), _entry(0, 59, status_code=404, method='POST'),
+        _entry(1, 0, status_code=None, method=None, dest_host=None, response_size=None),
+    ])
+
+    assert rows == {
+        (0, 'total', ''): (2, 200), (0, 'status_class', '2xx'): (1, 100), (0, 'status_class', '4xx'): (1, 100),
+        (0, 'method', 'GET'): (1, 100), (0, 'method', 'POST'): (1, 100), (0, 'host', 'shop.example.com'): (2, 200),
+        (1, 'total', ''): (1, 0), (1, 'status_class', 'unknown'): (1, 0), (1, 'method', 'unknown'): (1, 0),
+        (1, 'host', 'unknown'): (1, 0),
+    }
+
+
+def test_collapsed_entries_count_every_line():
+    rows = _rows([_entry(0, repeat_count=5, last_timestamp=datetime(2024, 1, 15, 10, 3))])
+
+    # All lines land in the minute of the first one
+    assert rows[(0, 'total', '')] == (5, 500)
+    assert {minute for minute, _, _ in rows} == {0}
+
+
+@pytest.mark.parametrize('options', [{'dimension': 'country'}, {'interval': '2m'}])
+def test_series_rejects_unknown_options(options):
+    with pytest.raises(ValueError):
+        RollupService().get_series('log', **options)
+
+
+def test_series_merges_minutes_into_buckets_and_folds_the_tail(make_log, database):
+    log_file = make_log([], status='ready')
+    hosts = ['a.example.com'] * 6 + ['b.example.com'] * 4 + ['c.example.com'] * 2
+    RollupService().store_rollups(log_file.id, [_entry(minute, dest_host=host) for minute, host in enumerate(hosts)])
+
+    series = RollupService().get_series(log_file.id, dimension='host', interval='5m', top=2)
+
+    assert [point['request_count'] for point in series['series']] == [5, 5, 2]
+    assert [point['values'] for point in series['series']] == [
+        {'a.example.com': 5}, {'a.example.com': 1, 'b.example.com': 4}, {'other': 2}
+    ]
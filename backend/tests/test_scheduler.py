@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from app import tasks
+from app.services.scheduler import IngestScheduler, AdmissionError
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    """Jobs handed to Celery, as (log_id, queue)"""
+    sent = []
+    monkeypatch.setattr(tasks.run_ingest_job, 'apply_async',
+                        lambda args, queue, priority: sent.append((args[0]['log_id'], queue)))
+    return sent
+
+
+@pytest.fixture
+def make_scheduler(redis_client, monkeypatch):
+    def make(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        return IngestScheduler()
+    return make
+
+
+def test_users_take_turns_for_a_lane_slot(make_scheduler, dispatched):
+    scheduler = make_scheduler(INGEST_FAST_SLOTS=1)
+    for log_id in ('a1', 'a2', 'a3'):
+        scheduler.submit(log_id, 'alice', MB)
+    for log_id in ('b1', 'b2'):
+        scheduler.submit(log_id, 'bob', MB)
+
+    for log_id in ('a1', 'a2', 'b1', 'a3'):
+        scheduler.complete(IngestScheduler.FAST_LANE, log_id)
+
+    assert [log_id for log_id, _ in dispatched] == ['a1', 'a2', 'b1', 'a3', 'b2']
+
+
+def test_large_files_use_the_heavy_lane(make_scheduler, dispatched):
+    scheduler = make_scheduler(INGEST_HEAVY_THRESHOLD_BYTES=10 * MB, INGEST_HEAVY_SLOTS=1, INGEST_FAST_SLOTS=1)
+
+    assert scheduler.submit('big', 'alice', 50 * MB) == IngestScheduler.HEAVY_LANE
+    assert scheduler.submit('big-preview', 'alice', 50 * MB, task='preview') == IngestScheduler.FAST_LANE
+    assert scheduler.submit('big-2', 'bob', 50 * MB) == IngestScheduler.HEAVY_LANE
+
+    # A busy heavy lane doesn't hold back small files
+    assert dispatched == [('big', 'ingest-heavy'), ('big-preview', 'ingest-fast')]
+
+
+def test_admission_limits_the_backlog(make_scheduler, dispatched):
+    scheduler = make_scheduler(INGEST_FAST_SLOTS=1, INGEST_MAX_USER_BACKLOG=2, INGEST_MAX_BACKLOG=3,
+                               INGEST_RETRY_AFTER=7)
+    for log_id in ('a1', 'a2', 'a3'):
+        scheduler.check_admission('alice')
+        scheduler.submit(log_id, 'alice', MB)
+
+    # a1 runs, a2 and a3 wait
+    with pytest.raises(AdmissionError) as error:
+        scheduler.check_admission('alice')
+    assert error.value.retry_after == 7
+
+    scheduler.check_admission('bob')
+    scheduler.submit('b1', 'bob', MB)
+    with pytest.raises(AdmissionError):
+        scheduler.check_admission('carol')
+
+    # Dispatching a waiting job makes room again
+    scheduler.complete(IngestScheduler.FAST_LANE, 'a1')
+    scheduler.check_admission('carol')
+
+
+def test_slots_of_jobs_that_never_reported_back_are_reclaimed(make_scheduler, redis_client, dispatched):
+    scheduler = make_scheduler(INGEST_FAST_SLOTS=1, INGEST_JOB_TIMEOUT=60)
+    redis_client.zadd(IngestScheduler.INFLIGHT_KEY.format(lane='fast'), {'lost': time.time() - 120})
+
+    scheduler.submit('a1', 'alice', MB)
+
+    assert dispatched == [('a1', 'ingest-fast')]
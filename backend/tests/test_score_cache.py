@@ -0,0 +1,93 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import anomaly as anomaly_module
+from app.services.anomaly import AnomalyDetectionService
+from app.services.detection_config import THRESHOLD_DETECTORS, resolve_detection_config
+from app.services.score_cache import DetectorScoreCache
+
+START = datetime(2024, 1, 15, 8, 0, 0)
+# Dimension id -> value, ids are shared by all dimensions here
+VALUES = {1: 'GET', 2: 'POST', 3: 'DELETE', 4: 'Mozilla/5.0', 5: 'curl/8', 6: 'shop.example.com'}
+
+
+def _rows():
+    """Entries in id order: ordinary traffic, a scanner, an erroring client and a burst"""
+    rng = random.Random(7)
+    rows = []
+
+    def add(seconds, ip, url, status, method=1, agent=4, repeat=1):
+        rows.append((len(rows) + 1, START + timedelta(seconds=seconds), ip, url, status,
+                     rng.randint(200, 5000), repeat, 6, method, agent, None))
+
+    for index in range(600):
+        add(rng.randint(0, 4 * 3600), f'10.0.0.{rng.randint(1, 20)}', f'/page/{rng.randint(1, 30)}',
+            rng.choice((200, 200, 200, 304, 404)), method=rng.choice((1, 1, 1, 2)), repeat=rng.choice((1, 1, 3)))
+    for index in range(25):
+        add(3600 + index * 5, '203.0.113.9', f'/admin/{index}.php', 404, agent=5)
+    for index in range(12):
+        add(7200 + index * 60, '198.51.100.4', '/api/orders', rng.choice((500, 503, 403)), method=2)
+    for index in range(150):
+        add(9000 + index, '192.0.2.77', '/search?q=' + 'x' * rng.randint(1, 200), 200, method=rng.choice((1, 3)))
+    return rows
+
+
+@pytest.fixture
+def run_detection(tmp_path, monkeypatch):
+    """Full detection of the entries above; returns the anomalies it would store"""
+    rows = _rows()
+    monkeypatch.setattr(anomaly_module, 'lookup_values', lambda name, ids: {i: VALUES[i] for i in ids})
+    monkeypatch.setattr(anomaly_module, 'DetectorScoreCache',
+                        lambda log_id: DetectorScoreCache(log_id, str(tmp_path)))
+
+    def run(thresholds=None):
+        service = AnomalyDetectionService()
+        stored = []
+        monkeypatch.setattr(service, '_load_entries', lambda log_id: service._entries_to_dataframe(rows))
+        monkeypatch.setattr(service, '_store_anomalies', lambda log_id, anomalies, detectors: stored.extend(anomalies))
+        service.detect_anomalies('log', detectors=list(THRESHOLD_DETECTORS), thresholds=thresholds)
+        return stored
+    return run
+
+
+def _by_detector(anomalies):
+    grouped = {}
+    for anomaly in anomalies:
+        grouped.setdefault((anomaly['anomaly_type'], anomaly['model_used']), []).append(anomaly)
+    return grouped
+
+
+@pytest.mark.parametrize('thresholds', [
+    {},
+    {'volume_contamination': 0.2, 'behavioral_contamination': 0.01, 'temporal_z_score': 1.0,
+     'scanning_404_count': 20, 'error_rate': 0.9, 'error_min_requests': 2},
+])
+def test_retuning_from_cache_matches_a_full_rerun(run_detection, tmp_path, thresholds):
+    run_detection()
+    _, resolved = resolve_detection_config(list(THRESHOLD_DETECTORS), thresholds)
+
+    retuned, counts, missing = DetectorScoreCache('log', str(tmp_path)).select(list(THRESHOLD_DETECTORS), resolved)
+
+    assert not missing
+    assert _by_detector(retuned) == _by_detector(run_detection(thresholds))
+    assert sum(counts.values()) == len(retuned)
+
+
+def test_selectors_flag_the_injected_behaviour(run_detection):
+    anomalies = run_detection()
+    flagged = {(anomaly['anomaly_type'], anomaly['reason'].split(' from ')[-1].split(' ')[0]) for anomaly in anomalies}
+
+    assert ('pattern', '203.0.113.9') in flagged    # 25 404s on distinct URLs
+    assert ('pattern', '198.51.100.4') in flagged   # only errors
+    assert any(anomaly['anomaly_type'] == 'volume' and '192.0.2.77' in anomaly['reason'] for anomaly in anomalies)
+
+
+def test_raising_a_threshold_unflags_the_scanner(run_detection, tmp_path):
+    run_detection()
+    _, resolved = resolve_detection_config(['scanning'], {'scanning_404_count': 30})
+
+    anomalies, counts, _ = DetectorScoreCache('log', str(tmp_path)).select(['scanning'], resolved)
+
+    assert counts == {'scanning': 0} and anomalies == []
@@ -0,0 +1,78 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app import db
+from app.models import Anomaly, LogEntry
+from app.services.dimensions import encode_dimensions
+from app.services.serialization import (
+    ANOMALY_COLUMNS, anomaly_rows_payload, dumps, entry_columns, entry_rows_payload, project,
+    serialize_anomalies_with_entries
+)
+
+
+def test_dumps_matches_isoformat_and_stringifies_unknown_types():
+    moment = datetime(2024, 1, 15, 10, 30, 45, 120000)
+
+    assert json.loads(dumps({'at': moment, 1: Decimal('1.5')})) == {'at': moment.isoformat(), '1': '1.5'}
+
+
+def test_project_keeps_exactly_the_model_keys():
+    assert project({'id': 1, 'user_id': 'u'}, {'id': None, 'status': None}) == {'id': 1, 'status': None}
+    assert project(None, {'id': None}) is None
+
+
+@pytest.fixture
+def analyzed_entries(make_log, database):
+    log_file = make_log([], status='ready')
+    entries = [
+        {'timestamp': datetime(2024, 1, 15, 10, 30, second), 'src_ip': '10.0.0.1', 'url': f'/items/{second}',
+         'status_code': 200, 'response_size': 512, 'method': 'GET', 'dest_host': 'shop.example.com',
+         'user_agent': 'curl/8', 'referer': None, 'raw_log': f'line {second}', 'parsed_fields': {'second': second},
+         'line_number': second + 1}
+        for second in range(3)
+    ]
+    encode_dimensions(entries)
+    rows = [LogEntry(log_id=log_file.id, **{key: value for key, value in entry.items()
+                                            if key not in ('method', 'dest_host', 'user_agent', 'referer')})
+            for entry in entries]
+    database.session.add_all(rows)
+    database.session.flush()
+    database.session.add_all(
+        Anomaly(log_id=log_file.id, entry_id=row.id, anomaly_type='pattern', reason=f'reason {index}',
+                confidence=0.5 + index / 10, severity='high', model_used='pattern_matching',
+                detected_at=datetime(2024, 1, 16))
+        for index, row in enumerate(rows[:2])
+    )
+    database.session.commit()
+    return log_file
+
+
+def _json(payload):
+    return json.loads(dumps(payload))
+
+
+def test_entry_rows_match_the_orm_serialization(analyzed_entries):
+    rows = db.session.query(*entry_columns(include_raw=True)).filter(LogEntry.log_id == analyzed_entries.id)\
+        .order_by(LogEntry.id).all()
+    expected = [entry.to_dict(include_parsed=False)
+                for entry in LogEntry.query.filter_by(log_id=analyzed_entries.id).order_by(LogEntry.id)]
+
+    payload = _json(entry_rows_payload(rows))
+
+    for entry, orm_entry in zip(payload, expected):
+        # List rows leave out the detail-only columns
+        assert entry == {key: value for key, value in orm_entry.items() if key in entry}
+        assert set(orm_entry) - set(entry) <= {'referer', 'line_number'}
+    assert [len(entry['anomalies']) for entry in payload] == [1, 1, 0]
+
+
+def test_anomaly_rows_match_the_orm_serialization(analyzed_entries):
+    anomalies = Anomaly.query.filter_by(log_id=analyzed_entries.id).order_by(Anomaly.id).all()
+    rows = db.session.query(*ANOMALY_COLUMNS).filter(Anomaly.log_id == analyzed_entries.id).order_by(Anomaly.id).all()
+
+    assert _json(anomaly_rows_payload(rows)) == _json(serialize_anomalies_with_entries(anomalies))
+    assert _json(anomaly_rows_payload(rows, include_raw=False)) == \
+        _json(serialize_anomalies_with_entries(anomalies, include_raw=False))
@@ -32,7 +32,7 @@ export interface LogFile {
   filename: string;
   file_size: number;
   content_type: string;
-  status: 'uploaded' | 'processing' | 'ready' | 'error';
+  status: 'uploaded' | 'processing' | 'preview' | 'ready' | 'error';
   processing_progress: number;
   log_format: string;
   total_entries: number;